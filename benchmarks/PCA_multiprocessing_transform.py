@@ -37,7 +37,7 @@ with UnitTimer():
 
 with UnitTimer():
     for i in range(8):
-        x = pca.transform_mpi(X, keep_order=True, ncpu=1, n_components=2)
+        x = pca.transform_mpi(X, ncpu=1, n_components=2)
 print("Output shape:", x.shape)
 
 colors = ['r' if i == 0 else ('b' if i == 1 else 'g')
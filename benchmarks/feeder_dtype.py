@@ -0,0 +1,59 @@
+# ===========================================================================
+# One epoch of Feeder over 400 files of features (500, 120),
+# batch_size=256, ncpu=1
+#                                  before              after
+#  float32 data, dtype=None    :   0.34s (float64)     0.15s (float32)
+#  float32 data, dtype=float32 :   0.19s               0.16s
+#  float64 data, dtype=float32 :   0.21s               0.17s
+#  Dataset.copy(dtype='float32')   -                   0.21s (once)
+#  converted data, dtype=None  :   -                   0.15s (float32)
+# Before, dtype=None made `astype(None)` upcast every file to float64.
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from odin import fuel as F
+from odin.utils import UnitTimer
+
+NB_FILES = 400
+NB_FRAMES = 500
+NB_DIMS = 120
+
+path = tempfile.mkdtemp()
+rng = np.random.RandomState(5218)
+for name, dtype in (('ds32', 'float32'), ('ds64', 'float64')):
+  ds = F.Dataset(os.path.join(path, name))
+  ds['X'] = rng.rand(NB_FILES * NB_FRAMES, NB_DIMS).astype(dtype)
+  np.savetxt(os.path.join(ds.path, 'indices.csv'),
+             [['file%d' % i, i * NB_FRAMES, (i + 1) * NB_FRAMES]
+              for i in range(NB_FILES)],
+             fmt='%s', delimiter=' ')
+  ds.flush()
+  ds.close()
+
+def epoch(name, dtype):
+  ds = F.Dataset(os.path.join(path, name), read_only=True)
+  feeder = F.Feeder(F.IndexedData(ds['X'], ds['indices']),
+                    dtype=dtype, ncpu=1, buffer_size=8)
+  feeder.set_batch(256, seed=None)
+  with UnitTimer(name="%s dtype=%s" % (name, dtype)):
+    for x in feeder:
+      pass
+  x = x[0] if isinstance(x, (tuple, list)) else x
+  print("  returned:", x.dtype)
+  ds.close()
+
+epoch('ds32', None)
+epoch('ds32', 'float32')
+epoch('ds64', 'float32')
+ds = F.Dataset(os.path.join(path, 'ds64'), read_only=True)
+with UnitTimer(name="Dataset.copy(dtype='float32')"):
+  ds.copy(os.path.join(path, 'ds64_32'), dtype='float32').close()
+ds.close()
+epoch('ds64_32', None)
+shutil.rmtree(path)
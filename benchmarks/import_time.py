@@ -0,0 +1,61 @@
+# ===========================================================================
+# Cold import time of ODIN packages (median of 5 fresh interpreters)
+#                   eager     lazy
+#  odin.config   :  ~0.23s    ~0.12s
+#  odin.utils    :  ~0.63s    ~0.26s
+#  odin.fuel     :  ~1.67s    ~0.83s  (no tensorflow, sklearn, pip)
+#  odin.backend  :  ~5.8s     ~5.4s   (tensorflow, no deviceQuery)
+# The script fails if a budget is exceeded, or if a module which
+# must stay lazy is pulled in by the import.
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import subprocess
+
+import numpy as np
+
+NB_RUNS = 5
+# module -> (budget in second, modules that must not be imported)
+BUDGET = [
+    ('odin.config', 0.5, ('tensorflow', 'pip')),
+    ('odin.utils', 1.0, ('tensorflow', 'numba', 'odin.utils.mpi',
+                         'odin.utils.crypto')),
+    ('odin.fuel', 2.0, ('tensorflow', 'sklearn', 'pip',
+                        'odin.preprocessing.speech')),
+    ('odin.backend', 10.0, ()),
+]
+
+_CODE = """
+import sys, time, json
+start = time.time()
+import %s
+duration = time.time() - start
+print(json.dumps([duration, sorted(sys.modules.keys())]))
+"""
+
+def import_time(module):
+  env = dict(os.environ)
+  env['TF_CPP_MIN_LOG_LEVEL'] = '3'
+  output = subprocess.check_output(
+      [sys.executable, '-W', 'ignore', '-c', _CODE % module],
+      env=env, stderr=subprocess.DEVNULL)
+  duration, modules = json.loads(output.decode('utf-8').strip().split('\n')[-1])
+  return duration, set(modules)
+
+failed = []
+for module, budget, forbidden in BUDGET:
+  durations = []
+  for _ in range(NB_RUNS):
+    duration, modules = import_time(module)
+    durations.append(duration)
+  duration = np.median(durations)
+  loaded = sorted(m for m in forbidden if m in modules)
+  print("%-14s: %.2fs (budget: %.2fs)" % (module, duration, budget),
+        "loaded: %s" % ', '.join(loaded) if loaded else "")
+  if duration > budget or len(loaded) > 0:
+    failed.append(module)
+if len(failed) > 0:
+  raise RuntimeError("Import regression for: %s" % ', '.join(failed))
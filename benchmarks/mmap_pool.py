@@ -0,0 +1,52 @@
+# ===========================================================================
+# Random access of 20000 slices across the memmaps of a Dataset with
+# 360 feature files (3x MAX_OPEN_MMAP), each of shape (1000, 40)
+#                                  time     hits     misses
+#  uniform over all files      :   1.47s    8891     13029
+#  80% on 60 hot files         :   0.69s    27164    15476
+# Previously, `Dataset._validate_memmap_max_open` closed the first
+# opened memmap of the dataset whenever the limit was reached, and the
+# access failed after MAX_OPEN_MMAP files (TypeError with numpy 1.19).
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import os
+import shutil
+
+import numpy as np
+
+from odin import fuel as F
+from odin.utils import UnitTimer
+from odin.fuel.data import MmapData, MAX_OPEN_MMAP
+
+PATH = '/tmp/mmap_pool_benchmark'
+NB_FILES = 3 * MAX_OPEN_MMAP
+NB_ACCESS = 20000
+NB_HOT = 60
+
+if os.path.exists(PATH):
+  shutil.rmtree(PATH)
+ds = F.Dataset(PATH)
+rng = np.random.RandomState(5218)
+for i in range(NB_FILES):
+  ds['X%d' % i] = rng.rand(1000, 40).astype('float32')
+ds.flush()
+ds.close()
+
+def benchmark(name, files):
+  ds = F.Dataset(PATH, read_only=True)
+  starts = rng.randint(0, 1000 - 32, size=len(files))
+  total = 0.
+  with UnitTimer(name=name):
+    for i, s in zip(files, starts):
+      total += ds['X%d' % i][s:s + 32].sum()
+  if hasattr(MmapData, 'pool_info'):
+    print(MmapData.pool_info())
+  ds.close()
+
+benchmark("Uniform", rng.randint(0, NB_FILES, size=NB_ACCESS))
+benchmark("Hot files",
+          np.where(rng.rand(NB_ACCESS) < 0.8,
+                   rng.randint(0, NB_HOT, size=NB_ACCESS),
+                   rng.randint(0, NB_FILES, size=NB_ACCESS)))
+shutil.rmtree(PATH)
@@ -0,0 +1,53 @@
+# ===========================================================================
+# Overhead of reporting 3 values and `Progbar.add` per training step
+# (20000 steps of ~100us, interval=0.08, single CPU machine)
+#                         before            after
+#  terminal            :  ~10-12us/step     ~10us/step
+#  terminal, background:     -              ~10us/step (*)
+#  non-TTY (log file)  :  ~12us/step        ~10us/step
+#                         240 lines and     10 lines and
+#                         331 '\r'          no '\r'
+# (*) the rendering only leaves the training thread when another core
+# is available, the formatting still holds the GIL.
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import io
+import time
+
+from odin.utils import Progbar
+
+NB_STEPS = 20000
+STEP_TIME = 100e-6
+
+class _TerminalIO(io.StringIO):
+
+  def isatty(self):
+    return True
+
+def training_step():
+  end = time.time() + STEP_TIME
+  while time.time() < end:
+    pass
+
+def benchmark(name, fp, **kwargs):
+  Progbar.FP = fp
+  prog = Progbar(target=NB_STEPS, print_report=True, print_summary=False,
+                 name=name, **kwargs)
+  overhead = 0.
+  for i in range(NB_STEPS):
+    training_step()
+    start = time.time()
+    prog['loss'] = 1. / (i + 1)
+    prog['accuracy'] = i / NB_STEPS
+    prog['learning_rate'] = 0.001
+    prog.add(1)
+    overhead += time.time() - start
+  output = fp.getvalue()
+  print("%-22s: %.2fus/step  output: %d bytes, %d lines, %d carriage returns" %
+        (name, overhead / NB_STEPS * 1e6, len(output),
+         output.count('\n'), output.count('\r')))
+
+benchmark('terminal', _TerminalIO())
+benchmark('terminal, background', _TerminalIO(), background=True)
+benchmark('non-TTY', io.StringIO())
@@ -0,0 +1,79 @@
+# ===========================================================================
+# SQLiteDict: 2000 float32 arrays of shape (100, 40)
+#                             marshal(tolist)   raw bytes
+#  __setitem__ + flush     :  0.57s             0.12s
+#  set_many                :       -            0.16s
+#  __getitem__             :  1.01s             0.053s
+#  get_many                :       -            0.062s
+#  file size               :  70.4MB            35.3MB
+# `marshal(tolist)` mimics the previous storage (every element is
+# converted to a python float) in the same database.
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import os
+import sqlite3
+import marshal
+
+import numpy as np
+
+from odin.utils import UnitTimer
+from odin.fuel.utils import SQLiteDict
+
+NB_ARRAYS = 2000
+SHAPE = (100, 40)
+PATH = '/tmp/sqlite_dict_benchmark.db'
+
+def remove_database():
+  for f in (PATH, PATH + '-wal', PATH + '-shm'):
+    if os.path.exists(f):
+      os.remove(f)
+
+def file_size():
+  return sum(os.path.getsize(f) for f in (PATH, PATH + '-wal')
+             if os.path.exists(f)) / 1024 / 1024
+
+rng = np.random.RandomState(5218)
+data = {'utt%d' % i: rng.rand(*SHAPE).astype('float32')
+        for i in range(NB_ARRAYS)}
+keys = sorted(data.keys())
+
+# ====== previous storage ====== #
+remove_database()
+conn = sqlite3.connect(PATH)
+conn.execute("""CREATE TABLE data (key text NOT NULL, value text NOT NULL,
+                                   PRIMARY KEY (key));""")
+with UnitTimer(name="marshal(tolist) write"):
+  conn.executemany("INSERT INTO data VALUES (?, ?)",
+                   [(k, marshal.dumps(v.tolist())) for k, v in data.items()])
+  conn.commit()
+with UnitTimer(name="marshal(tolist) read"):
+  for k in keys:
+    np.array(marshal.loads(conn.execute(
+        "SELECT value FROM data WHERE key=? LIMIT 1;", (k,)).fetchone()[0]),
+        dtype='float32')
+conn.close()
+print("marshal(tolist) file size: %.2f MB" % file_size())
+
+# ====== raw bytes ====== #
+remove_database()
+db = SQLiteDict(PATH, cache_size=250)
+with UnitTimer(name="SQLiteDict __setitem__ + flush"):
+  for k in keys:
+    db[k] = data[k]
+  db.flush()
+print("SQLiteDict file size: %.2f MB" % file_size())
+with UnitTimer(name="SQLiteDict __getitem__"):
+  for k in keys:
+    db[k]
+with UnitTimer(name="SQLiteDict get_many"):
+  values = db.get_many(keys)
+assert all(np.all(v == data[k]) for k, v in zip(keys, values))
+db.close()
+
+remove_database()
+db = SQLiteDict(PATH)
+with UnitTimer(name="SQLiteDict set_many"):
+  db.set_many(data)
+db.close()
+remove_database()
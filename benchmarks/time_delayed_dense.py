@@ -0,0 +1,62 @@
+# ===========================================================================
+# TimeDelayedDense: scan over context windows vs projecting every frame once
+# CPU (1 thread), batch 16, 40 features, Dense(512, 512), context 5, max-pool
+#  length  |       scan                |     unrolled
+#    100   | 0.149s  alloc: 40MB       | 0.039s  alloc: 21MB
+#    500   | 0.770s  alloc: 208MB      | 0.173s  alloc: 109MB
+#   2000   | 2.848s  alloc: 835MB      | 0.836s  alloc: 437MB
+# (the largest single tensor is the same for both)
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import os
+os.environ['ODIN'] = 'float32,cpu=1,thread=1,gpu=0'
+
+import numpy as np
+import tensorflow as tf
+
+from odin import backend as K, nnet as N
+from odin.utils import UnitTimer
+
+np.random.seed(5218)
+BATCH_SIZE = 16
+FEAT_DIM = 40
+N_ITER = 5
+
+def allocated_memory(outputs, feed_dict):
+  """ Total bytes allocated by all ops and the largest single
+  allocation, reported by the step stats (the CPU allocator
+  does not track its peak) """
+  meta = tf.RunMetadata()
+  K.get_session().run(outputs, feed_dict=feed_dict,
+                      options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE),
+                      run_metadata=meta)
+  total = 0
+  largest = 0
+  for dev in meta.step_stats.dev_stats:
+    for node in dev.node_stats:
+      for mem in node.memory:
+        total += mem.total_bytes
+        largest = max(largest, mem.peak_bytes)
+  return total, largest
+
+for seq_len in (100, 500, 2000):
+  X = K.placeholder(shape=(None, seq_len, FEAT_DIM), name='X%d' % seq_len)
+  x = np.random.rand(BATCH_SIZE, seq_len, FEAT_DIM).astype('float32')
+  op = N.TimeDelayedDense(n_new_features=(512, 512), n_time_context=5,
+                          time_pool='max', activation=K.relu)
+  y_unrolled = op(X)
+  op.use_scan = True
+  y_scan = op._apply(X)
+  K.initialize_all_variables()
+  feed = {X: x}
+  # warm up
+  K.eval([y_unrolled, y_scan], feed_dict=feed)
+  print("Sequence length: %d" % seq_len)
+  for name, y in (('scan', y_scan), ('unrolled', y_unrolled)):
+    with UnitTimer(factor=N_ITER, name='  %-8s' % name):
+      for i in range(N_ITER):
+        K.eval(y, feed_dict=feed)
+    total, largest = allocated_memory(y, feed)
+    print('    allocated: %.2f MB  largest: %.2f MB' %
+          (total / 1024. / 1024., largest / 1024. / 1024.))
@@ -0,0 +1,62 @@
+# ===========================================================================
+# GMM energy-based VAD: sklearn GaussianMixture vs closed-form 1-D EM
+# 200 utterances (~300 - 9000 frames):
+#  sklearn  : ~3.5s
+#  vad_energy (loop): ~0.45s
+#  vad_energy_batch : ~0.53s
+# 2000 short utterances (~100 - 450 frames):
+#  sklearn  : ~8.2s
+#  vad_energy (loop): ~1.9s
+#  vad_energy_batch : ~0.42s
+# ===========================================================================
+from __future__ import print_function, division, absolute_import
+
+import warnings
+
+import numpy as np
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.mixture import GaussianMixture
+
+from odin.utils import UnitTimer
+from odin.preprocessing.signal import vad_energy, vad_energy_batch
+
+np.random.seed(5218)
+
+def vad_energy_sklearn(log_energy, distrib_nb=3, nb_train_it=25, alpha=0.8):
+  log_energy = (log_energy - np.mean(log_energy)) / np.std(log_energy)
+  log_energy = log_energy[:, np.newaxis]
+  world = GaussianMixture(
+      n_components=distrib_nb, covariance_type='diag',
+      init_params='kmeans', max_iter=nb_train_it,
+      weights_init=np.ones(distrib_nb) / distrib_nb,
+      means_init=(-2 + 4.0 * np.arange(distrib_nb) / (distrib_nb - 1))[:, np.newaxis],
+      precisions_init=np.ones((distrib_nb, 1)))
+  with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=ConvergenceWarning)
+    world.fit(log_energy)
+  threshold = world.means_.max() - \
+      alpha * np.sqrt(1.0 / world.precisions_[world.means_.argmax(), 0])
+  return log_energy.ravel() > threshold, threshold
+
+def create_energies(n, min_length, max_length):
+  return [np.concatenate([np.random.randn(np.random.randint(min_length, max_length)) * s + m
+                          for m, s in ((0, 1), (5, 2), (12, 1.5))])
+          for _ in range(n)]
+
+for n, min_length, max_length in ((200, 100, 3000),
+                                  (2000, 30, 150)):
+  energies = create_energies(n, min_length, max_length)
+  print("#Utterances: %d  #Frames: %d" %
+        (n, sum(len(e) for e in energies)))
+  print("sklearn:")
+  with UnitTimer():
+    y1 = [vad_energy_sklearn(e) for e in energies]
+  print("vad_energy:")
+  with UnitTimer():
+    y2 = [vad_energy(e) for e in energies]
+  print("vad_energy_batch:")
+  with UnitTimer():
+    y3 = vad_energy_batch(energies)
+  # the thresholds must be identical
+  for (_, t1), (_, t2), (_, t3) in zip(y1, y2, y3):
+    assert np.isclose(t1, t2) and np.isclose(t1, t3)
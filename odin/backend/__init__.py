@@ -7,9 +7,10 @@ from contextlib import contextmanager
 from six.moves import cPickle, builtins
 
 from odin.utils import is_string, is_path, as_tuple
-from odin.config import (auto_config, get_floatX, get_session,
-                         get_rng, randint)
+from odin.config import (auto_config, apply_tf_seed, get_floatX,
+                         get_session, get_rng, randint)
 auto_config()
+apply_tf_seed()
 floatX = get_floatX()
 # ==================== import utilities modules ==================== #
 from odin.backend.helpers import *
@@ -235,33 +236,133 @@ def eval(x, feed_dict=None,
 # ===========================================================================
 _saver = {}
 
+def _get_saver(var_list):
+  """ Return cached `tf.train.Saver` for given set of variables,
+  creating new Saver for every checkpoint adds new Ops to the graph """
+  name = '|'.join(sorted([v.name for v in var_list]))
+  key = (var_list[0].graph, name)
+  if key not in _saver:
+    _saver[key] = tf.train.Saver(var_list=var_list,
+        restore_sequentially=False, allow_empty=False)
+  return _saver[key]
+
+def _get_var_meta(var_list):
+  """ Return meta-info for recreate variable: (name, dtype, shape) """
+  return [(v.name.split(':')[0], v.dtype.base_dtype.name, v.shape.as_list())
+          for v in var_list]
+
+def _save_collections(path, collections, var_meta):
+  with open(path + '.collections', 'wb') as f:
+    cPickle.dump([collections, var_meta], f,
+                 protocol=cPickle.HIGHEST_PROTOCOL)
+
 def save_variables(var_list, path, session=None):
   """ This function only apply for trainable parameters """
   if session is None:
     session = get_session()
   var_list = [v for v in set(as_tuple(var_list)) if is_variable(v)]
-  name = '|'.join(sorted([v.name for v in var_list]))
-  if name in _saver:
-    saver = _saver[name]
-  else:
-    saver = tf.train.Saver(var_list=var_list, restore_sequentially=False,
-        allow_empty=False)
+  saver = _get_saver(var_list)
   # ====== save the variables ====== #
   checkpoint = saver.save(session, path, global_step=None,
       write_meta_graph=False, write_state=False)
   # ====== save meta-info for recreate variable ====== #
-  var_meta = []
-  for v in var_list:
-    name = v.name.split(':')[0]
-    dtype = v.dtype.base_dtype.name
-    shape = v.shape.as_list()
-    var_meta.append((name, dtype, shape))
+  var_meta = _get_var_meta(var_list)
   # ====== save the collections ====== #
   collections = {var.name: role.get_roles(var, return_string=True)
                  for var in var_list}
-  with open(path + '.collections', 'wb') as f:
-    cPickle.dump([collections, var_meta], f,
-                 protocol=cPickle.HIGHEST_PROTOCOL)
+  _save_collections(path, collections, var_meta)
+  return checkpoint
+
+# ===========================================================================
+# Variables snapshot
+# ===========================================================================
+class VariablesSnapshot(object):
+  """ Values of variables copied to host memory by single `session.run`,
+  the snapshot can be written to a checkpoint (compatible with
+  `restore_variables`) in background thread by `write_snapshot`, or
+  assigned back to the variables by `restore_snapshot`. """
+
+  def __init__(self, var_list, values, var_meta, collections):
+    self.var_list = var_list
+    self.values = values
+    self.var_meta = var_meta
+    self.collections = collections
+
+  @property
+  def nbytes(self):
+    return sum(v.nbytes for v in self.values)
+
+def snapshot_variables(var_list, session=None):
+  if session is None:
+    session = get_session()
+  var_list = sorted([v for v in set(as_tuple(var_list)) if is_variable(v)],
+                    key=lambda v: v.name)
+  values = session.run(var_list)
+  collections = {var.name: role.get_roles(var, return_string=True)
+                 for var in var_list}
+  return VariablesSnapshot(var_list=var_list, values=values,
+                           var_meta=_get_var_meta(var_list),
+                           collections=collections)
+
+_snapshot_assign = {}
+
+def restore_snapshot(snapshot, session=None):
+  """ Assign the values stored in `VariablesSnapshot` back to
+  its variables, the assign Ops are cached for each set of variables """
+  if session is None:
+    session = get_session()
+  var_list = snapshot.var_list
+  key = (var_list[0].graph, '|'.join(v.name for v in var_list))
+  if key not in _snapshot_assign:
+    with var_list[0].graph.as_default():
+      placeholders = [tf.placeholder(dtype=v.dtype.base_dtype, shape=v.shape)
+                      for v in var_list]
+      assign_ops = [tf.assign(v, p) for v, p in zip(var_list, placeholders)]
+    _snapshot_assign[key] = (placeholders, assign_ops)
+  placeholders, assign_ops = _snapshot_assign[key]
+  session.run(assign_ops,
+              feed_dict={p: v for p, v in zip(placeholders, snapshot.values)})
+
+class _SnapshotWriter(object):
+  """ Private graph and session for writing `VariablesSnapshot` to
+  tensorflow checkpoint, hence, writing never touch the training
+  graph and session """
+
+  def __init__(self, var_meta):
+    self.graph = tf.Graph()
+    with self.graph.as_default():
+      self.placeholders = []
+      assign_ops = []
+      variables = {}
+      for name, dtype, shape in var_meta:
+        p = tf.placeholder(dtype=dtype, shape=shape)
+        v = tf.Variable(tf.zeros(shape=shape, dtype=dtype), trainable=False)
+        self.placeholders.append(p)
+        assign_ops.append(tf.assign(v, p))
+        variables[name] = v
+      self.assign_ops = assign_ops
+      self.saver = tf.train.Saver(var_list=variables,
+          restore_sequentially=False, allow_empty=False)
+    self.session = tf.Session(graph=self.graph,
+                              config=tf.ConfigProto(device_count={'GPU': 0}))
+
+  def write(self, values, path):
+    self.session.run(self.assign_ops,
+        feed_dict={p: v for p, v in zip(self.placeholders, values)})
+    return self.saver.save(self.session, path, global_step=None,
+        write_meta_graph=False, write_state=False)
+
+_snapshot_writer = {}
+
+def write_snapshot(snapshot, path):
+  """ Write `VariablesSnapshot` to `path`, the output can be loaded
+  by `restore_variables`. This function is safe to be called from
+  a background thread. """
+  key = str(snapshot.var_meta)
+  if key not in _snapshot_writer:
+    _snapshot_writer[key] = _SnapshotWriter(snapshot.var_meta)
+  checkpoint = _snapshot_writer[key].write(snapshot.values, path)
+  _save_collections(path, snapshot.collections, snapshot.var_meta)
   return checkpoint
 
 def restore_variables(path, session=None):
@@ -283,12 +384,7 @@ def restore_variables(path, session=None):
       var_list.append(tf.get_variable(
           shape=shape, name=name, dtype=dtype))
   # ====== restore the variables ====== #
-  name = '|'.join(sorted([v.name for v in var_list]))
-  if name in _saver:
-    saver = _saver[name]
-  else:
-    saver = tf.train.Saver(var_list=var_list, restore_sequentially=False,
-        allow_empty=False)
+  saver = _get_saver(var_list)
   saver.restore(session, path)
   # ====== restore the collections ====== #
   for v in var_list:
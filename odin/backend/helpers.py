@@ -6,6 +6,7 @@ import warnings
 from six import string_types
 from contextlib import contextmanager
 from collections import OrderedDict, defaultdict, Mapping
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 
@@ -553,6 +554,13 @@ class Function(object):
   call the function with `show_progress=True` when `batch_size`
   is specified to show the progress.
 
+  When `batch_size` is specified, the outputs are preallocated from the
+  shape of the first mini-batches and filled batch-by-batch, the call
+  also accepts `prefetch=True` to slice (i.e. read from disk) the next
+  mini-batch in a background thread. The call accepts `out` (preallocated
+  arrays, or paths to new `MmapData` for out-of-core inference, one for
+  each output) with or without `batch_size`.
+
   """
 
   def __init__(self, inputs, outputs, updates=[], defaults={},
@@ -600,6 +608,19 @@ class Function(object):
     # ====== cached shape ====== #
     self._input_shape = [tuple(i.shape.as_list()) for i in self.inputs]
     self._output_shape = [tuple(i.shape.as_list()) for i in self.outputs]
+    # ndim -> axes that have a defined size in any placeholder of that
+    # ndim, only these axes matter for matching the given inputs
+    constrained_axes = defaultdict(set)
+    for shape in self._input_shape:
+      constrained_axes[len(shape)].update(
+          axis for axis, size in enumerate(shape)
+          if size is not None and size > 0)
+    self._constrained_axes = {ndim: tuple(sorted(axes))
+                              for ndim, axes in constrained_axes.items()}
+    # input signature -> indices of the given inputs fed to `self.inputs`
+    self._feed_plans = {}
+    # (session, training, feed_list, input_positions, feed_values, callable)
+    self._callable = None
 
   @property
   def input_shape(self):
@@ -609,115 +630,269 @@ class Function(object):
   def output_shape(self):
     return self._output_shape if self._return_list else self._output_shape[0]
 
-  def __call__(self, *inputs, **kwargs):
-    show_progress = kwargs.pop('show_progress', False)
-    # dictionary as inputs
-    if len(kwargs) == len(self.inputs_name):
-      inputs = [kwargs[i] for i in self.inputs_name]
-    # ====== delete un-matchede inputs ====== #
-    inputs_new = []
-    tmp = list(inputs)
-    shapes = list(self._input_shape)
-    # this process iteratively remove inputs with mismatch shape
-    # to current given input
-    for s in shapes:
-      for i in tuple(tmp):
-        if len(i.shape) != len(s) or \
-        any(a is not None and a > 0 and a != b
-                for a, b in zip(s, i.shape)): # different ndim, or shape
-          tmp.remove(i)
-        else:
-          inputs_new.append(i)
-          tmp.remove(i)
+  def _get_feed_plan(self, inputs):
+    """ Return the indices of given `inputs` which are fed to `self.inputs`
+    (inputs with mismatch shape are skipped), the plan is cached for each
+    input signature, i.e. the ndim and the size of constrained axes.
+    """
+    signature = tuple(
+        (len(i.shape),) +
+        tuple(i.shape[axis]
+              for axis in self._constrained_axes.get(len(i.shape), ()))
+        for i in inputs)
+    plan = self._feed_plans.get(signature, None)
+    if plan is not None:
+      return plan
+    # this process iteratively skip inputs with mismatch shape
+    # to current placeholder
+    plan = []
+    idx = 0
+    for s in self._input_shape:
+      while idx < len(inputs):
+        i = inputs[idx]
+        idx += 1
+        if len(i.shape) == len(s) and \
+        all(a is None or a <= 0 or a == b for a, b in zip(s, i.shape)):
+          plan.append(idx - 1)
           break
-    if len(inputs_new) != len(self.inputs):
+    if len(plan) != len(self.inputs):
       raise ValueError("Given inputs have shape: %s, cannot match the shape of "
                        "defined inputs: %s" %
                        ('; '.join([str(i.shape) for i in inputs]),
                         '; '.join([str(i) for i in self.input_shape])))
-    if not self._strict:
-      inputs = inputs_new
-    # ====== create feed_dict ====== #
-    feed_dict = {}
-    inputs = flatten_list(inputs, level=None)
-    for tensor, value in zip(self.inputs, inputs):
-      feed_dict[tensor] = value
+    if self._strict:
+      plan = list(range(len(self.inputs)))
+    plan = tuple(plan)
+    # no unbounded growth for ever changing signatures
+    if len(self._feed_plans) >= 128:
+      self._feed_plans.clear()
+    self._feed_plans[signature] = plan
+    return plan
+
+  def _get_callable(self, session):
+    """ Return the feed list, the position of each input within the
+    feed list, the default feed values and the compiled callable
+    (`Session.make_callable`) for given `session` """
+    if self._callable is not None and self._callable[0] is session and \
+    self._callable[1] == self.training:
+      return self._callable[2:]
+    feed_dict = OrderedDict((tensor, None) for tensor in self.inputs)
     feed_dict.update(self.defaults)
     # check if modifying training mode
-    if self.training is None:
-      pass
-    elif self.training:
-      feed_dict.update({is_training(): True})
-    else:
-      feed_dict.update({is_training(): False})
+    if self.training is not None:
+      feed_dict[is_training(session.graph)] = bool(self.training)
+    feed_list = list(feed_dict.keys())
+    feed_values = list(feed_dict.values())
+    # the defaults override the given inputs
+    input_positions = [feed_list.index(tensor)
+                       if tensor not in self.defaults else None
+                       for tensor in self.inputs]
+    fetches = self.outputs + [self.updates_ops]
+    try:
+      func = session.make_callable(fetches, feed_list=feed_list)
+    except (TypeError, ValueError):
+      func = lambda *values: session.run(
+          fetches, feed_dict=dict(zip(feed_list, values)))
+    self._callable = (session, self.training,
+                      feed_list, input_positions, feed_values, func)
+    return self._callable[2:]
+
+  def _run_minibatches(self, func, feed_values, batch_positions, n_samples,
+                       out=None, prefetch=False, show_progress=False):
+    """ Run `func` on each mini-batch and write the results into output
+    arrays allocated from the shape and dtype of the first mini-batch.
+    The batch axis is the axis scales with the size of all mini-batches,
+    the results are kept until this axis is unambiguous.
+    """
+    n_output = len(self.outputs)
+    batches = list(batching(batch_size=int(self.batch_size), n=n_samples))
+    out = self._check_out(out, n_output)
+    # ====== (optional) prefetch next mini-batch ====== #
+    def get_minibatch(s, e):
+      feed_minibatch = list(feed_values)
+      for i in batch_positions:
+        x = feed_values[i][s:e]
+        # force reading memmap data in the prefetching thread
+        feed_minibatch[i] = np.array(x) if prefetch else x
+      return feed_minibatch
+    if prefetch:
+      pool = ThreadPool(processes=1)
+      next_feed = pool.apply_async(get_minibatch, batches[0])
+    # (optional) showing progress
+    if show_progress:
+      prog = Progbar(target=n_samples,
+                     print_report=False, print_summary=False,
+                     name='')
+    # ====== processing ====== #
+    outputs = None
+    pending = []
+    try:
+      for batch_idx, (s, e) in enumerate(batches):
+        if prefetch:
+          feed_minibatch = next_feed.get()
+          if batch_idx + 1 < len(batches):
+            next_feed = pool.apply_async(get_minibatch, batches[batch_idx + 1])
+        else:
+          feed_minibatch = get_minibatch(s, e)
+        updated = func(*feed_minibatch)[:n_output]
+        if outputs is None:
+          pending.append((batch_idx, s, e, updated))
+          axes = self._find_batch_axes(
+              pending, out, n_samples,
+              is_last=batch_idx + 1 == len(batches))
+          if axes is not None:
+            outputs, indices = self._allocate_outputs(
+                pending[0][-1], axes, out=out, n_samples=n_samples,
+                n_batches=len(batches))
+            for i, s_, e_, vals in pending:
+              for o, idx, val in zip(outputs, indices, vals):
+                o[idx(i, s_, e_)] = val
+            pending = []
+        else:
+          for o, idx, val in zip(outputs, indices, updated):
+            o[idx(batch_idx, s, e)] = val
+        if show_progress:
+          prog.add(e - s)
+    finally:
+      if prefetch:
+        pool.close()
+        pool.join()
+    for o in outputs:
+      if hasattr(o, 'flush'):
+        o.flush()
+    return outputs if self._return_list else outputs[0]
+
+  def _check_out(self, out, n_output):
+    if out is None:
+      return [None] * n_output
+    out = as_list(out) if self._return_list else [out]
+    if len(out) != n_output:
+      raise ValueError("Function has %d outputs, but given %d `out`" %
+                       (n_output, len(out)))
+    return out
+
+  def _find_batch_axes(self, pending, out, n_samples, is_last):
+    """ Return the batch axis of each output (None for scalar outputs),
+    i.e. the axis has the size of every mini-batch so far, or None if
+    it is still ambiguous and more mini-batches are needed.
+
+    The static shape of the output decides the axis right away if only
+    one of the matching axes is undefined (e.g. `(None, 512)` with
+    `batch_size=512`), otherwise, if all mini-batches have the same
+    size and the axis is still ambiguous, the first candidate is
+    selected as `np.concatenate` on the results would do.
+    """
+    axes = []
+    for i, arr in enumerate(out):
+      o = np.asarray(pending[0][-1][i])
+      if o.ndim == 0: # returned scalars
+        axes.append(None)
+        continue
+      candidates = [axis for axis in range(o.ndim)
+                    if all(np.shape(vals[i])[axis] == e - s
+                           for _, s, e, vals in pending)]
+      # the batch axis must be undefined in the static shape
+      static_shape = self._output_shape[i]
+      if len(static_shape) == o.ndim:
+        undefined = [axis for axis in candidates
+                     if static_shape[axis] is None]
+        if len(undefined) > 0:
+          candidates = undefined
+      # given output array also tells the batch axis
+      if arr is not None and not is_string(arr):
+        candidates = [axis for axis in candidates
+                      if len(arr.shape) == o.ndim and
+                      arr.shape[axis] == n_samples]
+      if len(candidates) == 0:
+        raise ValueError("Cannot find the batch axis of output with "
+                         "shape %s for mini-batch of size %d" %
+                         (str(o.shape), pending[-1][2] - pending[-1][1]))
+      if len(candidates) > 1 and not is_last:
+        return None
+      axes.append(candidates[0])
+    return axes
+
+  def _allocate_outputs(self, first_outputs, axes, out, n_samples, n_batches):
+    """ Return the output arrays (given `out`, new `MmapData` if `out` is
+    a path, or new `numpy.ndarray`) and the indexing function
+    `(batch_idx, start, end) -> index` for each output """
+    outputs = []
+    indices = []
+    for o, axis, arr in zip(first_outputs, axes, out):
+      o = np.asarray(o)
+      if axis is None: # returned scalars
+        shape = (n_batches,)
+        indices.append(lambda batch_idx, s, e: batch_idx)
+      else: # returned array
+        shape = o.shape[:axis] + (n_samples,) + o.shape[axis + 1:]
+        indices.append(
+            lambda batch_idx, s, e, axis=axis:
+            (slice(None),) * axis + (slice(s, e),))
+      outputs.append(self._create_output(arr, shape, o.dtype))
+    return outputs, indices
+
+  def _create_output(self, arr, shape, dtype):
+    from odin.fuel.data import MmapData
+    if arr is None:
+      arr = np.empty(shape=shape, dtype=dtype)
+    elif is_string(arr): # out-of-core outputs
+      arr = MmapData(path=arr, dtype=dtype, shape=shape)
+    if tuple(arr.shape) != tuple(shape):
+      raise ValueError("Output has shape %s, but given `out` has shape %s" %
+                       (str(shape), str(arr.shape)))
+    return arr
+
+  def __call__(self, *inputs, **kwargs):
+    show_progress = kwargs.pop('show_progress', False)
+    out = kwargs.pop('out', None)
+    prefetch = kwargs.pop('prefetch', False)
+    # dictionary as inputs
+    if len(kwargs) == len(self.inputs_name):
+      inputs = [kwargs[i] for i in self.inputs_name]
+    plan = self._get_feed_plan(inputs)
+    # ====== create feed values ====== #
     session = get_session()
+    feed_list, input_positions, feed_values, func = \
+        self._get_callable(session)
+    feed_values = list(feed_values)
+    for idx, position in zip(plan, input_positions):
+      if position is not None:
+        feed_values[position] = inputs[idx]
+    n_output = len(self.outputs)
     outputs = None
     # ====== mini-batches ====== #
     if self.batch_size is not None:
-      batch_vars = ([i for i in feed_dict.keys() if is_tensor(i)]
-                    if len(self.batch_vars) == 0 else self.batch_vars)
-      batch_vars = [i for i in batch_vars
-                    if i in feed_dict and hasattr(feed_dict[i], 'shape')]
-      n_samples = list(set(feed_dict[i].shape[0] for i in batch_vars))
+      batch_vars = (set(i for i in feed_list if is_tensor(i))
+                    if len(self.batch_vars) == 0 else set(self.batch_vars))
+      batch_positions = [i for i, (tensor, value) in
+                         enumerate(zip(feed_list, feed_values))
+                         if tensor in batch_vars and hasattr(value, 'shape')]
+      n_samples = list(set(feed_values[i].shape[0] for i in batch_positions))
       assert len(n_samples) == 1, \
       "Data have multiple batching dimension: %s" % str(n_samples)
       n_samples = n_samples[0]
       # only continue if we have more samples than `batch_size`
-      if n_samples > self.batch_size:
-        n_output = len(self.outputs)
-        outputs = []
-        all_batches = []
-        # (optional) showing progress
-        if show_progress:
-          prog = Progbar(target=n_samples,
-                         print_report=False, print_summary=False,
-                         name='')
-        for s, e in batching(batch_size=int(self.batch_size),
-                             n=n_samples):
-          if show_progress:
-            prog.add(e - s)
-          all_batches.append(e - s)
-          feed_dict_minibatch = OrderedDict([(k, v[s:e])
-                                             if k in batch_vars else (k, v)
-                                             for k, v in feed_dict.items()])
-          updated = session.run(self.outputs + [self.updates_ops],
-                                feed_dict=feed_dict_minibatch)
-          updated = updated[:n_output]
-          if not self._return_list:
-            updated = updated[0]
-          outputs.append(updated)
-        ## concatenate all outputs
-        if not self._return_list:
-          o_ndim = outputs[0].ndim
-          if o_ndim == 0: # returned scalars
-            outputs = np.array(outputs)
-          else: # returned array
-            for o_axis in range(o_ndim):
-              all_n = [o.shape[o_axis] for o in outputs]
-              if all_n == all_batches:
-                break
-            outputs = np.concatenate(outputs, axis=o_axis)
-        ## returning a list of outputs
-        else:
-          new_outputs = []
-          for output_idx in range(len(outputs[0])):
-            o = [x[output_idx] for x in outputs]
-            o_ndim = o[0].ndim
-            if o_ndim == 0: # returned scalars
-              o = np.array(o)
-            else: # returned array
-              for o_axis in range(o[0].ndim):
-                all_n = [val.shape[o_axis] for val in o]
-                if all_n == all_batches:
-                  break
-              o = np.concatenate(o, axis=o_axis)
-            new_outputs.append(o)
-          outputs = new_outputs
+      # (or the outputs must be written to given `out`), empty inputs
+      # are run as single batch
+      if n_samples > self.batch_size or (out is not None and n_samples > 0):
+        outputs = self._run_minibatches(func, feed_values, batch_positions,
+                                        n_samples, out=out, prefetch=prefetch,
+                                        show_progress=show_progress)
     # ====== single batch ====== #
     if outputs is None:
-      updated = session.run(self.outputs + [self.updates_ops],
-                            feed_dict=feed_dict)
-      outputs = updated[:len(self.outputs)]
+      updated = func(*feed_values)
+      outputs = updated[:n_output]
+      # write into the given output arrays
+      if out is not None:
+        new_outputs = []
+        for o, arr in zip(outputs, self._check_out(out, n_output)):
+          o = np.asarray(o)
+          arr = self._create_output(arr, o.shape, o.dtype)
+          arr[...] = o
+          if hasattr(arr, 'flush'):
+            arr.flush()
+          new_outputs.append(arr)
+        outputs = new_outputs
       if not self._return_list:
         outputs = outputs[0]
     # ====== return final output ====== #
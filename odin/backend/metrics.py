@@ -135,6 +135,38 @@ def detection_matrix(y_true, y_pred):
 # ===========================================================================
 # Speech task metrics
 # ===========================================================================
+def _detection_counts(y_true, y_score, thresholds, nb_classes, strict):
+  """ Return
+    counts : [n_thresholds, nb_classes, n_columns]
+        `counts[t, i, j]` is the number of trials of class `i` which have
+        `y_score[:, j]` above `thresholds[t]` (`>` if `strict` else `>=`)
+    nb_trials : [nb_classes]
+        number of trials of each class
+
+  The trials are grouped by class using a single stable sort of the
+  labels, then each class block is thresholded at once for all
+  thresholds and all columns.
+  """
+  y_true = np.asarray(y_true).ravel().astype('int64')
+  y_score = np.asarray(y_score)
+  # same precision as comparing the scores to a scalar threshold
+  thresholds = np.asarray(
+      thresholds,
+      dtype=y_score.dtype if np.issubdtype(y_score.dtype, np.floating) else None
+  ).reshape(-1, 1, 1)
+  nb_trials = np.bincount(y_true, minlength=nb_classes)
+  bounds = np.concatenate([[0], np.cumsum(nb_trials)])
+  y_score = y_score[np.argsort(y_true, kind='mergesort')]
+  counts = np.zeros(shape=(thresholds.shape[0], nb_classes, y_score.shape[1]),
+                    dtype='int64')
+  for i in range(nb_classes):
+    block = y_score[bounds[i]:bounds[i + 1]][None, :, :]
+    if block.shape[1] == 0:
+      continue
+    decision = block > thresholds if strict else block >= thresholds
+    counts[:, i, :] = np.count_nonzero(decision, axis=1)
+  return counts, nb_trials
+
 def compute_Cavg(y_llr, y_true, cluster_idx=None,
                  Ptrue=0.5, Cfa=1., Cmiss=1.,
                  probability_input=False):
@@ -207,21 +239,24 @@ def compute_Cavg(y_llr, y_true, cluster_idx=None,
   y_llr = np.asarray(y_llr)
   # threshold
   thresh = np.log(Cfa / Cmiss) - np.log(Ptrue / (1 - Ptrue))
+  nb_classes = y_llr.shape[-1]
+  # [nb_classes, nb_classes] number of trials of class `i` accepted
+  # as language `j`
+  accept, nb_trials = _detection_counts(y_true, y_llr, thresh,
+                                        nb_classes=nb_classes, strict=False)
+  accept = accept[0]
+  # miss on the diagonal, false alarm elsewhere
+  errors = accept.astype('float32')
+  errors[np.diag_indices(nb_classes)] = nb_trials - np.diag(accept)
+  # prevent divide by 0, which give NaN return
+  errors /= np.maximum(nb_trials.astype('float32'), 1.)[:, None]
   cluster_cost = np.zeros(len(cluster_idx))
   for k, cluster in enumerate(cluster_idx):
+    cluster = np.asarray(cluster, dtype='int64')
     L = len(cluster) # number of languages in a cluster
-    fa = 0
-    fr = 0
-    for lang_i in cluster:
-      N = np.sum(y_true == lang_i, dtype='float32') # number of samples for lang_i
-      N = max(N, 1.) # prevent divide by 0, which give NaN return
-      for lang_j in cluster:
-        if lang_i == lang_j:
-          err = np.sum(y_llr[y_true == lang_i, lang_i] < thresh) / N
-          fr += err
-        else:
-          err = np.sum(y_llr[y_true == lang_i, lang_j] >= thresh) / N
-          fa += err
+    P = errors[cluster[:, None], cluster[None, :]]
+    fr = np.trace(P)
+    fa = np.sum(P) - fr
     # Calculate procentage
     cluster_cost[k] = 100 * (Cmiss * Ptrue * fr + Cfa * (1 - Ptrue) * fa / (L - 1)) / L
   total_cost = np.mean(cluster_cost)
@@ -290,28 +325,19 @@ def compute_Cnorm(y_true, y_score,
   beta = np.clip(beta, a_min=np.finfo(float).eps, a_max=np.inf)
   # ====== Cavg ====== #
   global_cm_array = np.zeros(shape=(nb_threshold, nb_classes, nb_classes))
-  # Apply threshold on the scores and compute the confusion matrix
+  # Apply all thresholds on the scores and compute the confusion matrices
   for scores, labels in zip(y_score, y_true):
-    actual_TP_per_class = np.lib.arraysetops.unique(
-        ar=labels, return_counts=True)[1]
     if probability_input: # special case input is probability values
       scores = to_llr(scores)
-    for theta_ix, theta in enumerate(np.log(beta)):
-      thresholded_scores = (scores > theta).astype(int)
-      # compute confusion matrix, this is different from
-      # general implementation of confusion matrix above
-      cm = np.zeros(shape=(nb_classes, nb_classes), dtype=np.int64)
-      for i, (trial, target) in enumerate(zip(thresholded_scores, labels)):
-        cm[target, :] += trial
-      # miss and fa
-      predic_TP_per_class = cm.diagonal()
-      # Compute the number of miss per class
-      nb_miss_per_class = actual_TP_per_class - predic_TP_per_class
-      cm_miss_fa = cm
-      cm_miss_fa[np.diag_indices_from(cm)] = nb_miss_per_class
-      cm_probabilities = cm_miss_fa / actual_TP_per_class[:, None]
-      # update global
-      global_cm_array[theta_ix] += cm_probabilities
+    # [nb_threshold, nb_classes, nb_classes], this is different from
+    # general implementation of confusion matrix above
+    cm, actual_TP_per_class = _detection_counts(
+        labels, scores, np.log(beta), nb_classes=nb_classes, strict=True)
+    # Compute the number of miss per class on the diagonal
+    diag = np.arange(nb_classes)
+    cm[:, diag, diag] = actual_TP_per_class[None, :] - cm[:, diag, diag]
+    # update global
+    global_cm_array += cm / actual_TP_per_class[None, :, None]
   # normalize by partitions
   global_cm_array /= nb_partitions
   # Extract probabilities of false negatives from confusion matrix
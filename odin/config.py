@@ -15,7 +15,6 @@ from __future__ import division, absolute_import
 import os
 import re
 import sys
-import pip
 import shutil
 import tempfile
 import subprocess
@@ -51,6 +50,7 @@ def _warning(text):
   print(_ctext('[WARNING]', 'red'), text)
 
 def _check_package_available(name):
+  import pip
   for i in pip.get_installed_distributions():
     if name.lower() == i.key.lower():
       return True
@@ -96,8 +96,8 @@ def _query_gpu_info():
     from tensorflow.python.client import device_lib
     local_device_protos = device_lib.list_local_devices()
     dev['ngpu'] = 0
-    for i, name in (x.name for x in local_device_protos
-        if x.device_type == 'GPU'):
+    for i, name in enumerate(x.name for x in local_device_protos
+                             if x.device_type == 'GPU'):
       dev['dev%d' % i] = [name, None, None]
       dev['ngpu'] += 1
   # remove temp-dir
@@ -122,6 +122,47 @@ CONFIG = None
 EPS = None
 _SESSION = {}
 _RNG_GENERATOR = None
+_TF_SEED = None
+# the GPU query spawns `deviceQuery` (or initializes tensorflow devices),
+# so it is postponed until the device information is first needed
+_GPU_QUERY_PENDING = False
+
+def _print_log(tag, value, nested=False):
+  if nested:
+    s = _ctext('  * ', 'MAGENTA')
+  else:
+    s = '[Auto-Config] '
+  s += _ctext(tag, 'yellow') + ' : '
+  s += _ctext(value, 'cyan') + '\n'
+  sys.stderr.write(s)
+
+def _resolve_devices():
+  """ Run the pending GPU query of `auto_config` and update `CONFIG` """
+  global _GPU_QUERY_PENDING
+  __validate_config()
+  if not _GPU_QUERY_PENDING:
+    return
+  _GPU_QUERY_PENDING = False
+  dev = CONFIG['device_info']
+  dev.update(_query_gpu_info())
+  CONFIG['ngpu'] = dev['ngpu']
+  _print_log('#GPU', dev['ngpu'])
+  for i in range(dev['ngpu']):
+    _print_log('GPU-dev%d' % i, dev['dev%d' % i], nested=True)
+  # no GPU found, only hide the devices for the processes started later
+  if dev['ngpu'] == 0:
+    os.environ['CUDA_VISIBLE_DEVICES'] = ""
+
+def apply_tf_seed():
+  """ Set the graph-level seed of tensorflow default graph from the
+  configured seed, `auto_config` only does it when tensorflow is
+  already imported (`odin.backend` calls this after importing it).
+  """
+  __validate_config()
+  with warnings.catch_warnings():
+    warnings.filterwarnings(action='ignore', category=ImportWarning)
+    import tensorflow as tf
+  tf.set_random_seed(seed=_TF_SEED)
 
 def set_session(session):
   global _SESSION
@@ -129,6 +170,7 @@ def set_session(session):
 
 def get_session_config():
   import tensorflow as tf
+  _resolve_devices()
   session_args = {
       'intra_op_parallelism_threads': CONFIG['nthread'],
       'inter_op_parallelism_threads': CONFIG['ncpu'],
@@ -188,6 +230,8 @@ def auto_config(config=None):
   '''
   global CONFIG
   global _RNG_GENERATOR
+  global _TF_SEED
+  global _GPU_QUERY_PENDING
   global EPS
   if CONFIG is not None:
     warnings.warn('You should not auto_config twice, old configuration already '
@@ -275,33 +319,20 @@ def auto_config(config=None):
     debug = config['debug']
   # epsilon
   EPS = np.finfo(np.dtype(floatX)).eps
-  # devices
-  dev = {}
-  if ngpu > 0:
-    dev.update(_query_gpu_info())
-  else:
-    dev['ngpu'] = 0
+  # devices, the GPU query is deferred to `_resolve_devices`
+  dev = {'ngpu': 0}
+  _GPU_QUERY_PENDING = ngpu > 0
   dev['ncpu'] = ncpu
   dev['nthread'] = nthread
 
   # ====== Log the configuration ====== #
-  def print_log(tag, value, nested=False):
-    if nested:
-      s = _ctext('  * ', 'MAGENTA')
-    else:
-      s = '[Auto-Config] '
-    s += _ctext(tag, 'yellow') + ' : '
-    s += _ctext(value, 'cyan') + '\n'
-    sys.stderr.write(s)
+  print_log = _print_log
   print_log('#CPU', 'auto' if dev['ncpu'] == 0 else dev['ncpu'])
   print_log('#CPU-native', str(cpu_count()))
   print_log('#Thread/core',
       'auto' if dev['nthread'] == 0 else dev['nthread'],
       nested=True)
-  print_log('#GPU', dev['ngpu'])
-  if dev['ngpu'] > 0:
-    for i in range(dev['ngpu']):
-      print_log('GPU-dev%d' % i, dev['dev%d' % i], nested=True)
+  print_log('#GPU', 'query on first use' if _GPU_QUERY_PENDING else 0)
   print_log('FloatX', floatX)
   print_log('Epsilon', epsilon)
   print_log('CNMEM', cnmem)
@@ -309,7 +340,9 @@ def auto_config(config=None):
   print_log('Debug', debug)
   print_log('Log-level', log_level)
   # ==================== create theano flags ==================== #
-  if dev['ngpu'] == 0:
+  # only hide the GPUs when explicitly asked for `gpu=0`, otherwise
+  # `_resolve_devices` decides after the query
+  if ngpu == 0:
     os.environ['CUDA_VISIBLE_DEVICES'] = ""
   # ====== Return global objects ====== #
   CONFIG = AttributeDict()
@@ -325,12 +358,11 @@ def auto_config(config=None):
       'debug': debug
   })
   _RNG_GENERATOR = np.random.RandomState(seed=seed)
-  with warnings.catch_warnings():
-    warnings.filterwarnings(action='ignore', category=ImportWarning)
-    import tensorflow as tf
-  tf.set_random_seed(seed=_RNG_GENERATOR.randint(0, 10e8))
+  _TF_SEED = _RNG_GENERATOR.randint(0, 10e8)
   # tensorflow log level
   os.environ['TF_CPP_MIN_LOG_LEVEL'] = log_level
+  if 'tensorflow' in sys.modules:
+    apply_tf_seed()
   return CONFIG
 
 # ===========================================================================
@@ -368,7 +400,7 @@ def get_ncpu_native():
 
 def get_ngpu():
   """ Return number of GPU """
-  __validate_config()
+  _resolve_devices()
   return CONFIG['ngpu']
 
 def get_nthread():
@@ -380,7 +412,7 @@ def get_nb_processors():
   """ In case using CPU, return number of cores
   If GPU is used, return number of graphics card.
   """
-  __validate_config()
+  _resolve_devices()
   return CONFIG['device_info']['n']
 
 def get_device_info():
@@ -391,7 +423,7 @@ def get_device_info():
    ...
   }
   """
-  __validate_config()
+  _resolve_devices()
   return CONFIG['device_info']
 
 def get_floatX():
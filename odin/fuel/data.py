@@ -765,6 +765,60 @@ def _aligned_memmap_offset(dtype):
   n = np.ceil(header_size / type_size)
   return int(n * type_size)
 
+class _MmapHandlePool(object):
+  """ Least-recently-used pool of opened (file, memmap) handles keyed by
+  path, at most `max_open` handles are opened at the same time.
+
+  Evicted handles are flushed and their file closed, the mapping itself
+  is released as soon as no array is viewing it, and it is transparently
+  reopened by `get` on the next access.
+  """
+
+  def __init__(self, max_open):
+    self.max_open = int(max_open)
+    self._handles = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def __len__(self):
+    return len(self._handles)
+
+  def __contains__(self, path):
+    return path in self._handles
+
+  def get(self, path, opener):
+    handle = self._handles.get(path, None)
+    if handle is not None:
+      self.hits += 1
+      self._handles.move_to_end(path)
+      return handle
+    self.misses += 1
+    return self.put(path, opener())
+
+  def put(self, path, handle):
+    self.release(path)
+    while len(self._handles) >= max(self.max_open, 1):
+      self.evictions += 1
+      self.release(next(iter(self._handles)))
+    self._handles[path] = handle
+    return handle
+
+  def release(self, path):
+    handle = self._handles.pop(path, None)
+    if handle is not None:
+      f, data = handle
+      if data.mode != 'r':
+        data.flush()
+      if f is not None:
+        f.close()
+
+  @property
+  def info(self):
+    return {'opened': len(self._handles), 'max_open': self.max_open,
+            'hits': self.hits, 'misses': self.misses,
+            'evictions': self.evictions}
+
 class MmapData(Data):
 
   """Create a memory-map to an array stored in a *binary* file on disk.
@@ -790,9 +844,13 @@ class MmapData(Data):
 
   Note
   ----
-  This class always read MmapData with mode=r+
+  This class always read MmapData with mode=r+.
+  The opened memmaps of all MmapData are shared in a least-recently-used
+  pool of `MAX_OPEN_MMAP` handles, evicted memmaps are reopened
+  on access (see `MmapData.pool_info`).
   """
   _INSTANCES = OrderedDict()
+  _POOL = _MmapHandlePool(MAX_OPEN_MMAP)
   HEADER = b'mmapdata'
   MAXIMUM_HEADER_SIZE = 486
 
@@ -822,6 +880,23 @@ class MmapData(Data):
     f.close()
     return dtype, shape
 
+  @staticmethod
+  def open_memmap(path, read_only=True):
+    """ Return a plain `numpy.memmap` to the array stored in given
+    MmapData file, without registering a new MmapData instance
+    (i.e. it is cheap to call in worker processes) """
+    dtype, shape = MmapData.read_header(path, read_only=read_only,
+                                        return_file=False)
+    return np.memmap(path, dtype=dtype, shape=shape,
+                     mode='r' if read_only else 'r+',
+                     offset=_aligned_memmap_offset(dtype))
+
+  @staticmethod
+  def pool_info():
+    """ Return a dictionary of the number of opened memmaps, and the
+    hits, misses and evictions of the shared handle pool """
+    return MmapData._POOL.info
+
   def __new__(clazz, *args, **kwargs):
     path = kwargs.get('path', None)
     if path is None:
@@ -833,10 +908,6 @@ class MmapData(Data):
     # Found old instance
     if path in MmapData._INSTANCES:
       return MmapData._INSTANCES[path]
-    # new MmapData
-    # ====== increase memmap count ====== #
-    if len(MmapData._INSTANCES) + 1 > MAX_OPEN_MMAP:
-      raise ValueError('Only allowed to open maximum of {} memmap file'.format(MAX_OPEN_MMAP))
     # ====== create new instance ====== #
     new_instance = super(MmapData, clazz).__new__(clazz)
     MmapData._INSTANCES[path] = new_instance
@@ -877,14 +948,36 @@ class MmapData(Data):
       f.write(size.encode())
       f.write(_)
     # ====== assign attributes ====== #
-    self._file = f
     self._path = path
     data = np.memmap(f, dtype=dtype, shape=shape,
                      mode = 'r' if read_only else 'r+',
                      offset=_aligned_memmap_offset(dtype))
+    MmapData._POOL.put(path, (f, data))
     # finally call super initialize
     super(MmapData, self).__init__(data=data, read_only=read_only)
 
+  def _open_handle(self):
+    dtype, shape, f = MmapData.read_header(self._path,
+                                           read_only=self.read_only,
+                                           return_file=True)
+    data = np.memmap(f, dtype=dtype, shape=shape,
+                     mode='r' if self.read_only else 'r+',
+                     offset=_aligned_memmap_offset(dtype))
+    return f, data
+
+  @property
+  def _data(self):
+    return (MmapData._POOL.get(self._path, self._open_handle)[1],)
+
+  @_data.setter
+  def _data(self, data):
+    # the handle is registered in the pool
+    pass
+
+  @property
+  def _file(self):
+    return MmapData._POOL.get(self._path, self._open_handle)[0]
+
   @property
   def data_info(self):
     return self._path
@@ -898,16 +991,11 @@ class MmapData(Data):
     return (self._path,)
 
   def _restore_data(self, info):
-    # info here is the path
-    dtype, shape, f = MmapData.read_header(info, mode='r+',
-                                           return_file=True)
-    self._file = f
-    self._data = np.memmap(f, dtype=dtype, shape=shape, mode='r+',
-                           offset=_aligned_memmap_offset(dtype))
+    # info here is the path, the memmap is opened on access
     self._path = info
 
   def flush(self):
-    if self.read_only:
+    if self.read_only or self._path not in MmapData._POOL:
       return
     self._data[0].flush()
 
@@ -915,13 +1003,8 @@ class MmapData(Data):
     # Check if exist global instance
     if self.data_info in MmapData._INSTANCES:
       del MmapData._INSTANCES[self.data_info]
-      # flush in read-write mode
-      if not self.read_only:
-        self.flush()
-      # close mmap and file
-      self._data[0]._mmap.close()
-      del self._data
-      self._file.close()
+      # flush in read-write mode, and close the file
+      MmapData._POOL.release(self._path)
 
   # ==================== properties ==================== #
   def __str__(self):
@@ -954,12 +1037,10 @@ class MmapData(Data):
     f.write(meta)
     f.flush()
     # extend the memmap
-    mmap._mmap.close()
-    del self._data
-    mmap = np.memmap(self.data_info, dtype=dtype, shape=shape,
-                     mode='r+',
-                     offset=_aligned_memmap_offset(dtype))
-    self._data = (mmap,)
+    del mmap
+    MmapData._POOL.release(self._path)
+    f, mmap = self._open_handle()
+    MmapData._POOL.put(self._path, (f, mmap))
     return self
 
 # ===========================================================================
@@ -1126,18 +1207,64 @@ class Hdf5Data(Data):
 # ===========================================================================
 # data iterator
 # ===========================================================================
-def _approximate_continuos_by_discrete(distribution):
-  '''original distribution: [ 0.47619048  0.38095238  0.14285714]
-     best approximated: [ 5.  4.  2.]
-  '''
-  if len(distribution) == 1:
-    return distribution
-
-  inv_distribution = 1 - distribution
-  x = np.round(1 / inv_distribution)
-  x = np.where(distribution == 0, 0, x)
-  return x.astype(int)
+def _epoch_schedule(lengths, n, batch_size, sequential, shuffle_level,
+                    rng):
+  """ Schedule of one epoch as two integer arrays: the index of the source
+  and the row within the source of every sample, and the (start, end)
+  of every batch in the schedule.
 
+  Parameters
+  ----------
+  lengths : ndarray
+      the length of the range [start, end) of each source
+  n : ndarray
+      the number of samples drawn from each source, the range of a source
+      is repeated if `n` is larger than its length (i.e. over-sampling)
+  rng : {None, numpy.random.RandomState}
+      if None, no shuffling, sources are interleaved deterministically
+  """
+  lengths = np.asarray(lengths, dtype='int64')
+  n = np.where(lengths > 0, n, 0).astype('int64')
+  n_sources = len(n)
+  total = int(n.sum())
+  src = np.repeat(np.arange(n_sources), n)
+  # k-th sample of its source
+  k = np.arange(total) - np.repeat(np.cumsum(n) - n, n)
+  row = k % np.maximum(lengths, 1)[src]
+  # ====== shuffle within each pass over a source ====== #
+  if rng is not None and shuffle_level > 0 and total > 0:
+    n_pass = k // np.maximum(lengths, 1)[src]
+    if shuffle_level >= 2: # full permutation
+      key = rng.rand(total)
+    else: # only shuffle the order of batch blocks
+      block = np.cumsum(row % batch_size == 0) - 1
+      key = rng.rand(block[-1] + 1)[block]
+    order = np.lexsort((row, key, n_pass, src))
+    row = row[order]
+  # ====== order the sources ====== #
+  if sequential:
+    rank = np.arange(n_sources) if rng is None else \
+        rng.permutation(n_sources)
+    order = np.argsort(rank[src], kind='mergesort')
+    # batches never cross the boundary of a source
+    position = k[order]
+  else:
+    # weighted interleave, t-th sample of a source at (t + u) / n
+    u = 0.5 if rng is None else rng.rand(total)
+    order = np.argsort((k + u) / np.maximum(n, 1)[src], kind='mergesort')
+    position = np.arange(total)
+  src = src[order]
+  row = row[order]
+  starts = np.flatnonzero(position % batch_size == 0)
+  batches = np.stack([starts, np.append(starts[1:], total)], axis=1)
+  return src, row, batches
+
+def _read_rows(data, rows):
+  # contiguous rows are read by slicing
+  if len(rows) > 0 and rows[-1] - rows[0] + 1 == len(rows) and \
+  np.all(np.diff(rows) == 1):
+    return data[int(rows[0]):int(rows[-1]) + 1]
+  return data[rows]
 
 class DataIterator(Data):
 
@@ -1145,7 +1272,6 @@ class DataIterator(Data):
   '''
 
   def __init__(self, data):
-    super(DataIterator, self).__init__()
     if not isinstance(data, (tuple, list)):
       data = (data,)
     # ====== validate args ====== #
@@ -1160,10 +1286,17 @@ class DataIterator(Data):
                        'given shape of all data as following: {}'
                        ''.format([i.shape for i in data]))
     # ====== defaults parameters ====== #
-    self._data = data
+    super(DataIterator, self).__init__(data=tuple(data), read_only=True)
     self._sequential = False
     self._distribution = [1.] * len(data)
 
+  @property
+  def data_info(self):
+    return self._data, self._distribution, self._sequential
+
+  def _restore_data(self, info):
+    self._data, self._distribution, self._sequential = info
+
   # ==================== properties ==================== #
   @property
   def shape(self):
@@ -1263,105 +1396,51 @@ class DataIterator(Data):
     return self
 
   # ==================== main logic of batch iterator ==================== #
+  def _schedule(self, rng):
+    """ Return the source index and row of every sample, and the
+    (start, end) of every batch of one epoch """
+    start, end = self._start, self._end
+    shape = [i.shape[0] for i in self._data]
+    offset = np.asarray([_apply_approx(j, start) for j in shape])
+    lengths = np.asarray([_apply_approx(j, end) for j in shape]) - offset
+    # number of sample should be traversed
+    n = np.round(np.asarray(self._distribution) * lengths).astype('int64')
+    src, row, batches = _epoch_schedule(lengths, n, self._batch_size,
+                                        sequential=self._sequential,
+                                        shuffle_level=self._shuffle_level,
+                                        rng=rng)
+    return src, row + offset[src], batches
+
   def __iter__(self):
     def create_iteration():
       seed = self._seed; self._seed = None
-      if seed is not None:
-        rng = np.random.RandomState(seed)
-      else: # deterministic RandomState
-        rng = struct()
-        rng.randint = lambda x: None
-        rng.permutation = lambda x: slice(None, None)
-      # ====== easy access many private variables ====== #
-      sequential = self._sequential
-      start, end = self._start, self._end
-      batch_size = self._batch_size
-      distribution = np.asarray(self._distribution)
-      # shuffle order of data (good for sequential mode)
-      idx = rng.permutation(len(self._data))
-      data = self._data[idx] if isinstance(idx, slice) else [self._data[i] for i in idx]
-      distribution = distribution[idx]
-      shape = [i.shape[0] for i in data]
-      # ====== prepare distribution information ====== #
-      # number of sample should be traversed
-      n = np.asarray([i * (_apply_approx(j, end) - _apply_approx(j, start))
-                      for i, j in zip(distribution, shape)])
-      n = np.round(n).astype(int)
-      # normalize the distribution (base on new sample n of each data)
-      distribution = n / n.sum()
-      distribution = _approximate_continuos_by_discrete(distribution)
-      # somehow heuristic, rescale distribution to get more benifit from cache
-      if distribution.sum() <= len(data):
-        distribution = distribution * 3
-      # distribution now the actual batch size of each data
-      distribution = (batch_size * distribution).astype(int)
-      assert distribution.sum() % batch_size == 0, 'wrong distribution size!'
-      # predefined (start,end) pair of each batch (e.g (0,256), (256,512))
-      idx = list(range(0, batch_size + distribution.sum(), batch_size))
-      idx = list(zip(idx, idx[1:]))
+      rng = None if seed is None else np.random.RandomState(seed)
+      data = self._data
+      src, row, batches = self._schedule(rng)
+      dtype = np.result_type(*[np.dtype(d.dtype) for d in data])
+      trial_shape = data[0].shape[1:]
+      # many batches are read together, so each source is read once
+      # per window, whatever the number of sources
+      window = max(16, len(data))
       # Dummy return to initialize everything
       yield None
-      #####################################
-      # 1. optimized parallel code.
-      if not sequential:
-        # first iterators
-        it = [iter(dat.set_batch(bs, seed=rng.randint(10e8),
-                                 start=start, end=end,
-                                 shuffle_level=self._shuffle_level))
-              for bs, dat in zip(distribution, data)]
-        # iterator
-        while sum(n) > 0:
-          batch = []
-          for i, x in enumerate(it):
-            if n[i] <= 0:
-              continue
-            try:
-              x = next(x)[:n[i]]
-              n[i] -= x.shape[0]
-              batch.append(x)
-            except StopIteration: # one iterator stopped
-              it[i] = iter(data[i].set_batch(distribution[i],
-                  seed=rng.randint(10e8), start=start, end=end,
-                  shuffle_level=self._shuffle_level))
-              x = next(it[i])[:n[i]]
-              n[i] -= x.shape[0]
-              batch.append(x)
-          # got final batch
-          batch = np.vstack(batch)
-          # no idea why random permutation is much faster than shuffle
-          if self._shuffle_level > 0:
-            batch = batch[rng.permutation(batch.shape[0])]
-          # return the iterations
-          for i, j in idx[:int(ceil(batch.shape[0] / batch_size))]:
-            yield batch[i:j]
-      #####################################
-      # 2. optimized sequential code.
-      else:
-        # first iterators
-        batch_size = distribution.sum()
-        it = [iter(dat.set_batch(batch_size, seed=rng.randint(10e8),
-                                 start=start, end=end,
-                                 shuffle_level=self._shuffle_level))
-              for dat in data]
-        current_data = 0
-        # iterator
-        while sum(n) > 0:
-          if n[current_data] <= 0:
-            current_data += 1
-          try:
-            x = next(it[current_data])[:n[current_data]]
-            n[current_data] -= x.shape[0]
-          except StopIteration: # one iterator stopped
-            it[current_data] = iter(data[current_data].set_batch(batch_size, seed=rng.randint(10e8),
-                                start=start, end=end,
-                                shuffle_level=self._shuffle_level))
-            x = next(it[current_data])[:n[current_data]]
-            n[current_data] -= x.shape[0]
-          # shuffle x
-          if self._shuffle_level > 0:
-            x = x[rng.permutation(x.shape[0])]
-          for i, j in idx[:int(ceil(x.shape[0] / self._batch_size))]:
-            yield x[i:j]
+      for b in range(0, len(batches), window):
+        window_batches = batches[b:b + window]
+        i, j = window_batches[0, 0], window_batches[-1, 1]
+        window_src = src[i:j]
+        window_row = row[i:j]
+        # group the samples by their source
+        order = np.argsort(window_src, kind='mergesort')
+        groups = np.split(order,
+                          np.flatnonzero(np.diff(window_src[order])) + 1)
+        if len(groups) == 1:
+          x = _read_rows(data[window_src[0]], window_row)
+        else:
+          x = np.empty((j - i,) + trial_shape, dtype=dtype)
+          for g in groups:
+            x[g] = _read_rows(data[window_src[g[0]]], window_row[g])
+        for start, end in window_batches:
+          yield x[start - i:end - i]
     # ====== create and return the iteration ====== #
     it = create_iteration()
     next(it)
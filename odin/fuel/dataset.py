@@ -13,7 +13,7 @@ from odin.utils import (get_file, Progbar, is_string,
                         ctext, as_tuple, eprint, wprint,
                         is_callable, flatten_list, UnitTimer)
 from odin.fuel.data import (MmapData, Hdf5Data, open_hdf5, get_all_hdf_dataset,
-                            MAX_OPEN_MMAP, Data, as_data)
+                            MAX_BUFFER_SIZE, Data, as_data)
 from odin.fuel.utils import MmapDict, SQLiteDict, NoSQL
 from odin.fuel.recipe_base import FeederRecipe, RecipeList
 
@@ -54,6 +54,19 @@ def copy_dataset2(origin, destination,
 # ===========================================================================
 # Helper
 # ===========================================================================
+def _convert_mmap(X, path, dtype):
+  """ Write the MmapData `X` to `path` with given `dtype`, one chunk
+  of `MAX_BUFFER_SIZE` bytes at a time """
+  if os.path.exists(path):
+    os.remove(path)
+  Y = MmapData(path=path, dtype=dtype, shape=X.shape, read_only=False)
+  row_size = max(1, int(np.prod(X.shape[1:])) * np.dtype(dtype).itemsize)
+  step = max(1, MAX_BUFFER_SIZE // row_size)
+  for start in range(0, X.shape[0], step):
+    Y[start:start + step] = X[start:start + step]
+  Y.flush()
+  Y.close()
+
 def _infer_separator(path):
   all_sep = ('\t', ' ', ';', ',')
   with open(path, 'r') as f:
@@ -100,6 +113,9 @@ def _parse_data_descriptor(path, read_only):
   # ====== text file .txt ====== #
   if file_ext in ('.txt',):
     return [(file_name, ('txt', 'unknown', None, path))]
+  # ====== json file (e.g. FeatureProcessor profile) ====== #
+  if file_ext in ('.json',):
+    return [(file_name, ('json', 'unknown', None, path))]
   # ====== check if is csv file ====== #
   if file_ext in ('.csv', '.tsv'):
     sep = _infer_separator(path)
@@ -603,13 +619,27 @@ class Dataset(object):
   # ==================== Data management ==================== #
   def copy(self, destination,
            indices_filter=None, data_filter=None,
-           override=False):
+           override=False, dtype=None):
     """ Copy the dataset to a new folder and closed
     the old dataset
 
+    Parameters
+    ----------
+    dtype : {None, str, numpy.dtype, dict}
+        if given, all MmapData (or the MmapData named by the keys of
+        given dictionary) are converted to given dtype in the new
+        dataset, hence, the conversion is done once on disk rather
+        than by the `Feeder` for every loaded file.
     """
     from distutils.dir_util import copy_tree
     read_only = self.read_only
+    # desired dtype for each MmapData
+    if isinstance(dtype, Mapping):
+      dtype = {str(name): np.dtype(dt) for name, dt in dtype.items()}
+      get_dtype = lambda name: dtype.get(name, None)
+    else:
+      dtype = None if dtype is None else np.dtype(dtype)
+      get_dtype = lambda name: dtype
     # indices
     if indices_filter is not None and \
     not is_callable(indices_filter) and \
@@ -714,7 +744,9 @@ class Dataset(object):
           # copy MmapData
           elif isinstance(X, MmapData):
             Y = MmapData(path=os.path.join(destination, data_name),
-                         dtype=X.dtype, shape=(0,) + X.shape[1:],
+                         dtype=X.dtype if get_dtype(data_name) is None else
+                         get_dtype(data_name),
+                         shape=(0,) + X.shape[1:],
                          read_only=False)
             prog = Progbar(target=nb_samples,
                            print_report=True, print_summary=True,
@@ -748,6 +780,18 @@ class Dataset(object):
           start += size
         new_indices.flush(save_all=True)
         new_indices.close()
+    # ====== convert the copied MmapData ====== #
+    if indices_filter is None:
+      for name in list(self.keys()):
+        new_dtype = get_dtype(name)
+        new_path = os.path.join(destination, name)
+        if new_dtype is None or not os.path.isfile(new_path):
+          continue
+        X = self[name]
+        if isinstance(X, MmapData) and np.dtype(X.dtype) != new_dtype:
+          print("Converting '%s' from %s to %s ..." %
+                (ctext(new_path, 'yellow'), X.dtype, new_dtype))
+          _convert_mmap(X, new_path, new_dtype)
     # ====== copy others files ====== #
     for f in other_files:
       org_path = os.path.join(self.path, f)
@@ -758,10 +802,11 @@ class Dataset(object):
         else: # single file
           shutil.copy2(org_path, dst_path)
     # ====== readme ====== #
-    readme_name = os.path.basename(self._readme_path)
-    dst_path = os.path.join(destination, readme_name)
-    if not os.path.exists(dst_path):
-      shutil.copy2(self._readme_path, dst_path)
+    if self._readme_path is not None:
+      readme_name = os.path.basename(self._readme_path)
+      dst_path = os.path.join(destination, readme_name)
+      if not os.path.exists(dst_path):
+        shutil.copy2(self._readme_path, dst_path)
     return Dataset(destination, read_only=read_only)
 
   def flush(self):
@@ -801,15 +846,6 @@ class Dataset(object):
       del self._data_map[name]
 
   # ==================== Some info ==================== #
-  def _validate_memmap_max_open(self, name):
-    # ====== check if MmapData excess limit, close 1 files ====== #
-    if len(MmapData._INSTANCES) + 1 >= MAX_OPEN_MMAP:
-      for i, (_dtype, _shape, _data, _path) in self._data_map.items():
-        if isinstance(_data, MmapData) and i != name:
-          self.close(name=i)
-          self._data_map[i] = (_dtype, _shape, _path)
-          break
-
   def __contains__(self, key):
     return key in self._data_map
 
@@ -842,7 +878,6 @@ class Dataset(object):
       dtype is not 'unknown' and shape is not 'unknown':
         data = MmapData(path, read_only=self.read_only)
         self._data_map[key] = (data.dtype, data.shape, data, path)
-        self._validate_memmap_max_open(key)
       return path if data is None else data
     raise ValueError('Only accept key type is string.')
 
@@ -897,8 +932,6 @@ class Dataset(object):
       # store new key
       self._data_map[key] = (data.dtype, data.shape, data, path)
       data[:shape[0]] = value
-      # check maximum opened memmap
-      self._validate_memmap_max_open(key)
     # ====== other types ====== #
     else:
       if os.path.exists(path):
@@ -25,6 +25,7 @@ DEALINGS IN THE SOFTWARE.
 from __future__ import print_function, division, absolute_import
 
 import os
+import warnings
 from six.moves import zip, zip_longest, range, cPickle
 from collections import Mapping
 
@@ -98,6 +99,39 @@ def _batch_grouping(batch, batch_size, rng, batch_filter):
         if _ is not None:
           yield _ if isinstance(_, (tuple, list)) else (ret,)
 
+def _bucket_grouping(batch, batch_size, rng, batch_filter):
+  """ Return: [(data1, data2, ..., lengths), ...]
+      NOTE: each element in batch is one sequence, sequences with
+      similar length are grouped into the same batch, then zero-padded
+      to the longest sequence of the batch
+  """
+  if len(batch) == 0:
+    yield None
+    return
+  # ====== shuffle the file, so ties are in random order ====== #
+  if rng is not None:
+    rng.shuffle(batch)
+  lengths = np.array([X[0].shape[0] for name, X in batch], dtype='int32')
+  order = np.argsort(lengths, kind='mergesort')
+  buckets = [order[start:end]
+             for start, end in batching(n=len(order), batch_size=batch_size)]
+  if rng is not None:
+    rng.shuffle(buckets)
+  # ====== padding each bucket ====== #
+  for ids in buckets:
+    ret = []
+    for X in zip(*[batch[i][1] for i in ids]):
+      padded = np.zeros(shape=(len(X), max(x.shape[0] for x in X)) +
+                        X[0].shape[1:], dtype=X[0].dtype)
+      for i, x in enumerate(X):
+        padded[i, :x.shape[0]] = x
+      ret.append(padded)
+    ret.append(lengths[ids])
+    _ = batch_filter(ret)
+    # always return tuple or list
+    if _ is not None:
+      yield _ if isinstance(_, (tuple, list)) else (_,)
+
 def _file_grouping(batch, batch_size, rng, batch_filter):
   """ Return: [(name, index, data1, data2, ...), ...]
       NOTE: each element in batch is one file
@@ -278,14 +312,25 @@ class Feeder(Data):
       if indices is dictionary, it must in the form: {name: (start, end)}
   dtype: string or numpy.dtype
       all data return from this feeder are converted to given dtype
-      if None, original dtype is kept
+      if None, original dtype is kept.
+      The conversion copies every loaded file, it could be done once
+      on disk by `Dataset.copy(..., dtype=dtype)`
   batch_filter: call-able
       must be a function has take a list of np.ndarray as first arguments
       ([X]) or ([X, y]), you can return None to ignore given batch, return the
       data for accepting the batch
-  batch_mode: 'batch' or 'file' (string type)
+  batch_mode: 'batch', 'file' or 'bucket' (string type)
       'batch' mode return shuffling and return everything in small batches
       'file' mode return [(file_name, order_index_from_0, data...), ...]
+      'bucket' mode treats each file as one sequence, groups `batch_size`
+      files of similar length (within the `buffer_size` files processed
+      together) and return [(padded_data..., lengths), ...], where each
+      data is zero-padded to the longest sequence of the batch along
+      the first axis (i.e. `[batch_size, max_length, ...]`).
+      In this mode, `batch_size` counts files (not samples), and
+      `buffer_size` is increased to `batch_size` if it is smaller;
+      the padding is only reduced if `buffer_size` is several times
+      `batch_size`.
   ncpu: int
       number of CPU used for multiprocessing
   buffer_size: int
@@ -371,9 +416,9 @@ class Feeder(Data):
     self._batch_filter = batch_filter
     # check batch_mode
     batch_mode = str(batch_mode).lower()
-    if batch_mode not in ("batch", 'file'):
-      raise ValueError("Only support `batch_mode`: 'file'; 'batch', but "
-                       "given value: '%s'" % batch_mode)
+    if batch_mode not in ("batch", 'file', 'bucket'):
+      raise ValueError("Only support `batch_mode`: 'file'; 'batch'; 'bucket', "
+                       "but given value: '%s'" % batch_mode)
     self._batch_mode = batch_mode
 
   # ==================== pickling ==================== #
@@ -416,9 +461,9 @@ class Feeder(Data):
     # ====== check batch_mode ====== #
     if batch_mode is not None:
       batch_mode = str(batch_mode).lower()
-      if batch_mode not in ("batch", 'file'):
-        raise ValueError("Only support `batch_mode`: 'file'; 'batch', but "
-                         "given value: '%s'" % batch_mode)
+      if batch_mode not in ("batch", 'file', 'bucket'):
+        raise ValueError("Only support `batch_mode`: 'file'; 'batch'; "
+                         "'bucket', but given value: '%s'" % batch_mode)
       self._batch_mode = batch_mode
     return super(Feeder, self).set_batch(batch_size=batch_size, seed=seed,
                                          start=start, end=end,
@@ -532,18 +577,34 @@ class Feeder(Data):
     batch_size = self._batch_size
     batch_filter = self._batch_filter
     process_func = self._recipes.process
+    # 'bucket' mode groups `batch_size` files within the jobs of
+    # each process, hence, it needs at least `batch_size` files
+    buffer_size = self.buffer_size
+    if self._batch_mode == 'bucket' and buffer_size < batch_size:
+      warnings.warn("'bucket' mode groups `batch_size`=%d files within the "
+                    "`buffer_size`=%d files processed together, `buffer_size`"
+                    " is increased to %d; the padding is only reduced if "
+                    "`buffer_size` is several times `batch_size`." %
+                    (batch_size, buffer_size, batch_size))
+      buffer_size = batch_size
     # ====== prepare data, indices and dtype ====== #
+    # dtype is None if the stored dtype already matches, so `astype`
+    # never copies the files which needn't conversion
     data_indices_dtype = []
     i = 0
     for dat in self._data:
       for d in dat._data:
-        data_indices_dtype.append(
-            (d, dat.indices, self._output_dtype[i]))
+        dtype = self._output_dtype[i]
+        if dtype is not None:
+          dtype = np.dtype(dtype)
+          if dtype == np.dtype(d.dtype):
+            dtype = None
+        data_indices_dtype.append((d, dat.indices, dtype))
         i += 1
 
     # ====== create wrapped functions ====== #
     def map_func(jobs):
-      if self.buffer_size == 1:
+      if buffer_size == 1:
         jobs = [jobs]
       # calculating batch results
       batch = []
@@ -553,7 +614,7 @@ class Feeder(Data):
           start, end = ids[name]
           # data can be list of Data, or just 1 Data
           dat = dat[start:end]
-          if dat.dtype != dtype:
+          if dtype is not None:
             dat = dat.astype(dtype)
           X.append(dat)
         X = process_func(name, X)
@@ -565,11 +626,13 @@ class Feeder(Data):
         X = _batch_grouping(batch, batch_size, rng, batch_filter)
       elif self._batch_mode == 'file':
         X = _file_grouping(batch, batch_size, rng, batch_filter)
+      elif self._batch_mode == 'bucket':
+        X = _bucket_grouping(batch, batch_size, rng, batch_filter)
       return X
 
     # ====== track and return ====== #
     it = MPI(jobs=all_keys, func=map_func, ncpu=self.ncpu,
-             batch=self.buffer_size, hwm=self.hwm,
+             batch=buffer_size, hwm=self.hwm,
              backend=self.mpi_backend)
     self._running_iter.append(it)
     return iter(it)
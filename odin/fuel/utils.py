@@ -25,6 +25,22 @@ def _dump(x):
     x = str(x)
   return marshal.dumps(x)
 
+def _encode_value(x):
+  """ Return (value, dtype, shape) stored by SQLiteDict, ndarray is
+  stored as raw bytes, other objects are marshaled (dtype is None) """
+  if isinstance(x, np.ndarray) and x.dtype.kind != 'O':
+    return (sqlite3.Binary(np.ascontiguousarray(x).tobytes()),
+            x.dtype.str, ','.join(str(i) for i in x.shape))
+  if isinstance(x, np.ndarray): # object array
+    x = x.tolist()
+  return _dump(x), None, None
+
+def _decode_value(value, dtype, shape):
+  if dtype is None:
+    return marshal.loads(value)
+  shape = tuple(int(i) for i in shape.split(',')) if len(shape) > 0 else ()
+  return np.frombuffer(value, dtype=np.dtype(dtype)).reshape(shape).copy()
+
 @add_metaclass(ABCMeta)
 class NoSQL(MutableMapping):
   """ The idea of this is transform everything (even SQL) into
@@ -461,7 +477,7 @@ class TableDict(MutableMapping):
   def table_context(self):
     """Return temporary context that switch the SQLite to given table"""
     curr_tab = self._sqlite.current_table
-    self._sqlite.set_table(self._table_name)
+    self._sqlite.set_table(self._name)
     yield None
     self._sqlite.set_table(curr_tab)
 
@@ -526,6 +542,15 @@ class TableDict(MutableMapping):
       self._sqlite.update(items)
     return self
 
+  def get_many(self, keys):
+    with self.table_context():
+      return self._sqlite.get_many(keys)
+
+  def set_many(self, items):
+    with self.table_context():
+      self._sqlite.set_many(items)
+    return self
+
   def __iter__(self):
     with self.table_context():
       return self._sqlite.__iter__()
@@ -545,7 +570,7 @@ class TableDict(MutableMapping):
   def __cmp__(self, dict):
     if isinstance(dict, TableDict):
       return self._sqlite is dict._sqlite and \
-          self._table_name == dict._table_name
+          self._name == dict._name
     return False
 
   def keys(self):
@@ -598,9 +623,12 @@ class SQLiteDict(NoSQL):
 
   Note
   ----
-  numpy.ndarray will be converted to list before dumped to the database,
-  hence, the speed of serialize and deserialize ndarray is extremely slow.
-  This dict is purely performing in multiprocessing
+  numpy.ndarray is stored as raw bytes with its dtype and shape, other
+  objects are serialized by `marshal`.
+  The database uses write-ahead logging (WAL), hence, many processes
+  (e.g. the workers of `Feeder`) can read while a writer is opened.
+  Use `set_many` and `get_many` for writing and reading many items
+  in a single transaction.
   """
 
   _DEFAULT_TABLE = '_default_'
@@ -612,15 +640,17 @@ class SQLiteDict(NoSQL):
     self._conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
     self._conn.text_factory = str
     self._cursor = self._conn.cursor()
-    # adjust pragma
-    # SQLITE_OPEN_EXCLUSIVE
-    self.connection.execute('PRAGMA main.locking_mode = EXCLUSIVE;')
+    # adjust pragma, WAL allows concurrent readers with one writer
     self.connection.execute("PRAGMA main.synchronous = 0;")
-    self.connection.execute("PRAGMA journal_mode = MEMORY;")
+    if not read_only:
+      self.connection.execute("PRAGMA journal_mode = WAL;")
     self.connection.commit()
+    # mapping: table_name -> selected columns for decoding the value
+    self._value_columns = {}
     # ====== create default table ====== #
     self._current_table = SQLiteDict._DEFAULT_TABLE
-    self.set_table(SQLiteDict._DEFAULT_TABLE)
+    # `self.read_only` is not restored yet when unpickling
+    self._set_table(SQLiteDict._DEFAULT_TABLE, read_only)
 
   def _flush(self, save_all=False):
     curr_tab = self.current_table
@@ -628,12 +658,9 @@ class SQLiteDict(NoSQL):
     for tab in tables:
       self.set_table(tab)
       if len(self.current_cache) > 0:
-        self.cursor.executemany(
-            "INSERT INTO {tb} VALUES (?, ?)".format(tb=tab),
-            [(str(k), _dump(v.tolist()) if isinstance(v, np.ndarray)
-              else _dump(v))
+        self._insert_many(
+            [(str(k),) + _encode_value(v)
              for k, v in self.current_cache.items()])
-        self.connection.commit()
         self.current_cache.clear()
     # restore the last table
     return self.set_table(curr_tab)
@@ -646,17 +673,34 @@ class SQLiteDict(NoSQL):
     return TableDict(self, table_name)
 
   def set_table(self, table_name):
+    return self._set_table(table_name, self.read_only)
+
+  def _set_table(self, table_name, read_only):
     if table_name is None:
       table_name = SQLiteDict._DEFAULT_TABLE
     table_name = str(table_name)
     if not self.is_table_exist(table_name):
       query = """CREATE TABLE {tb} (
                             key text NOT NULL,
-                            value text NOT NULL,
+                            value blob NOT NULL,
+                            dtype text,
+                            shape text,
                             PRIMARY KEY (key)
                         );"""
       self.cursor.execute(query.format(tb=table_name))
       self.connection.commit()
+    # ====== table created by older version (key, value) ====== #
+    if table_name not in self._value_columns:
+      columns = [i[1] for i in self.connection.execute(
+          "PRAGMA table_info({tb});".format(tb=table_name))]
+      if 'dtype' not in columns and not read_only:
+        for col in ('dtype', 'shape'):
+          self.cursor.execute("ALTER TABLE {tb} ADD COLUMN {col} text;".format(
+              tb=table_name, col=col))
+        self.connection.commit()
+        columns += ['dtype', 'shape']
+      self._value_columns[table_name] = 'value, dtype, shape' \
+          if 'dtype' in columns else 'value, NULL, NULL'
     # set the new table
     self._current_table = table_name
     return self
@@ -669,6 +713,16 @@ class SQLiteDict(NoSQL):
   def current_cache(self):
     return self._cache[self.current_table]
 
+  @property
+  def _columns(self):
+    return self._value_columns[self._current_table]
+
+  def _insert_many(self, rows):
+    self.cursor.executemany(
+        """INSERT OR REPLACE INTO {tb} (key, value, dtype, shape)
+           VALUES (?, ?, ?, ?);""".format(tb=self._current_table), rows)
+    self.connection.commit()
+
   def get_all_tables(self):
     query = """SELECT name FROM sqlite_master where type='table';"""
     self.cursor.execute(query)
@@ -685,6 +739,7 @@ class SQLiteDict(NoSQL):
     if table_name == SQLiteDict._DEFAULT_TABLE:
       raise ValueError("Cannot drop default table.")
     self.cursor.execute("""DROP TABLE {tb};""".format(tb=table_name))
+    self._value_columns.pop(table_name, None)
     return self
 
   def is_table_exist(self, table_name):
@@ -732,30 +787,60 @@ class SQLiteDict(NoSQL):
   def __getitem__(self, key):
     # ====== multiple keys select ====== #
     if isinstance(key, (tuple, list, np.ndarray)):
-      query = """SELECT value FROM {tb}
-                       WHERE key IN {keyval};"""
-      keyval = '(' + ', '.join(['"%s"' % str(k) for k in key]) + ')'
-      self.cursor.execute(
-          query.format(tb=self._current_table, keyval=keyval))
-      results = self.cursor.fetchall()
-      # check if any not found keys
-      if len(results) != len(key):
-        raise KeyError("Cannot find all `key`='%s' in the dictionary." % keyval)
-      # load binary data
-      results = [marshal.loads(r[0]) for r in results]
+      return self.get_many(key)
     # ====== single key select ====== #
-    else:
+    key = str(key)
+    if key in self.current_cache:
+      return self.current_cache[key]
+    query = """SELECT {col} FROM {tb} WHERE key=? LIMIT 1;"""
+    results = self.connection.execute(
+        query.format(col=self._columns, tb=self._current_table),
+        (key,)).fetchone()
+    if results is None:
+      raise KeyError("Cannot find `key`='%s' in the dictionary." % key)
+    return _decode_value(*results)
+
+  def get_many(self, keys):
+    """ Return the list of values for given `keys` (in the same order),
+    the database is queried in batches of 999 keys """
+    keys = [str(k) for k in keys]
+    cache = self.current_cache
+    found = {k: cache[k] for k in keys if k in cache}
+    db_keys = list(set(k for k in keys if k not in found))
+    query = """SELECT key, {col} FROM {tb} WHERE key IN ({keyval});"""
+    for start in range(0, len(db_keys), 999):
+      batch = db_keys[start:start + 999]
+      for row in self.connection.execute(
+          query.format(col=self._columns, tb=self._current_table,
+                       keyval=', '.join('?' * len(batch))), batch):
+        found[row[0]] = _decode_value(*row[1:])
+    # check if any not found keys
+    if len(found) != len(set(keys)):
+      missing = [k for k in keys if k not in found]
+      raise KeyError("Cannot find `key`='%s' in the dictionary." %
+                     ', '.join(missing[:8]))
+    return [found[k] for k in keys]
+
+  def set_many(self, items):
+    """ Write all (key, value) pairs to the database in a single
+    transaction, the cache is bypassed
+
+    Parameters
+    ----------
+    items : {Mapping, list of (key, value)}
+    """
+    if self.read_only:
+      raise RuntimeError("Cannot set_many for this Dict in read_only mode.")
+    if isinstance(items, Mapping):
+      items = items.items()
+    cache = self.current_cache
+    rows = []
+    for key, value in items:
       key = str(key)
-      if key in self.current_cache:
-        return self.current_cache[key]
-      query = """SELECT value FROM {tb} WHERE key="{keyval}" LIMIT 1;"""
-      results = self.connection.execute(
-          query.format(tb=self._current_table, keyval=key)).fetchone()
-      # results = self.cursor.fetchone()
-      if results is None:
-        raise KeyError("Cannot find `key`='%s' in the dictionary." % key)
-      results = marshal.loads(results[0])
-    return results
+      cache.pop(key, None)
+      rows.append((key,) + _encode_value(value))
+    self._insert_many(rows)
+    return self
 
   def __contains__(self, key):
     key = str(key)
@@ -763,9 +848,8 @@ class SQLiteDict(NoSQL):
     if key in self.current_cache:
       return True
     # check in database
-    query = """SELECT 1 FROM {tb} WHERE key="{keyval}" LIMIT 1;"""
-    self.cursor.execute(
-        query.format(tb=self._current_table, keyval=key))
+    query = """SELECT 1 FROM {tb} WHERE key=? LIMIT 1;"""
+    self.cursor.execute(query.format(tb=self._current_table), (key,))
     if self.cursor.fetchone() is None:
       return False
     return True
@@ -779,7 +863,7 @@ class SQLiteDict(NoSQL):
   def __delitem__(self, key):
     if self.read_only:
       return
-    query = """DELETE FROM {tb} WHERE {cond};"""
+    query = """DELETE FROM {tb} WHERE key IN ({keyval});"""
     if isinstance(key, (tuple, list, Iterator, np.ndarray)):
       key = [str(k) for k in key]
     else:
@@ -792,9 +876,11 @@ class SQLiteDict(NoSQL):
       else:
         db_key.append(k)
     # ====== remove key from db ====== #
-    self.cursor.execute(
-        query.format(tb=self._current_table,
-                     cond='key IN ("%s")' % ', '.join(db_key)))
+    for start in range(0, len(db_key), 999):
+      batch = db_key[start:start + 999]
+      self.cursor.execute(
+          query.format(tb=self._current_table,
+                       keyval=', '.join('?' * len(batch))), batch)
     self.connection.commit()
 
   def keys(self):
@@ -806,22 +892,24 @@ class SQLiteDict(NoSQL):
 
   def values(self):
     for val in self.cursor.execute(
-        """SELECT value from {tb};""".format(tb=self._current_table)):
-      yield marshal.loads(val[0])
+        """SELECT {col} from {tb};""".format(col=self._columns,
+                                             tb=self._current_table)):
+      yield _decode_value(*val)
     for v in self.current_cache.values():
       yield v
 
   def items(self):
     for item in self.cursor.execute(
-        """SELECT key, value from {tb};""".format(tb=self._current_table)):
-      yield (item[0], marshal.loads(item[1]))
+        """SELECT key, {col} from {tb};""".format(col=self._columns,
+                                                  tb=self._current_table)):
+      yield (item[0], _decode_value(*item[1:]))
     for k, v in self.current_cache.items():
       yield k, v
 
   def update(self, items):
     if self.read_only:
       return
-    query = """UPDATE {tb} SET value=(?) WHERE key=("?");"""
+    query = """UPDATE {tb} SET value=?, dtype=?, shape=? WHERE key=?;"""
     if isinstance(items, Mapping):
       items = items.items()
     # ====== check if update is in cache ====== #
@@ -831,7 +919,7 @@ class SQLiteDict(NoSQL):
       if key in self.current_cache:
         self.current_cache[key] = value
       else:
-        db_update.append((_dump(value), key))
+        db_update.append(_encode_value(value) + (key,))
     # ====== perform DB update ====== #
     self.cursor.executemany(query.format(tb=self._current_table), db_update)
     self.connection.commit()
@@ -35,6 +35,136 @@ except ImportError as e:
 
 edit_distance = Levenshtein_distance
 
+def _levenshtein_kernel(y_true, true_length, y_pred, pred_length, out):
+  """ Single row dynamic programming for each pair of padded sequences,
+  compiled by numba if available """
+  row = np.empty(shape=(y_pred.shape[1] + 1,), dtype=np.int64)
+  for b in range(y_true.shape[0]):
+    n = true_length[b]
+    m = pred_length[b]
+    for j in range(m + 1):
+      row[j] = j
+    for i in range(1, n + 1):
+      diag = row[0] # distance[i - 1, j - 1]
+      row[0] = i
+      for j in range(1, m + 1):
+        up = row[j] # distance[i - 1, j]
+        cost = 0 if y_true[b, i - 1] == y_pred[b, j - 1] else 1
+        row[j] = min(up + 1, row[j - 1] + 1, diag + cost)
+        diag = up
+    out[b] = row[m]
+  return out
+
+def _levenshtein_numpy(y_true, true_length, y_pred, pred_length, out):
+  """ Dynamic programming vectorized over the batch and the prediction
+  axis, only the rows of `y_true` are iterated """
+  n_samples, max_pred = y_pred.shape
+  idx = np.arange(max_pred + 1, dtype=np.int64)
+  row = np.tile(idx, (n_samples, 1)) # distance[0, :]
+  out[true_length == 0] = pred_length[true_length == 0]
+  for i in range(1, y_true.shape[1] + 1):
+    # substitution and deletion: distance[i, 1:] without insertion
+    cost = (y_true[:, i - 1:i] != y_pred).astype(np.int64)
+    new_row = np.empty_like(row)
+    new_row[:, 0] = i
+    new_row[:, 1:] = np.minimum(row[:, 1:] + 1, row[:, :-1] + cost)
+    # insertion: distance[i, j] = min_k(distance[i, k] + j - k)
+    row = np.minimum.accumulate(new_row - idx, axis=1) + idx
+    finished = true_length == i
+    out[finished] = row[finished, pred_length[finished]]
+  return out
+
+try:
+  import numba as nb
+  _levenshtein_batch = nb.jit(nopython=True, nogil=True)(_levenshtein_kernel)
+  _levenshtein_compiled = True
+except ImportError as e:
+  _levenshtein_batch = _levenshtein_numpy
+  _levenshtein_compiled = False
+
+def _pad_labels(sequences, vocabulary):
+  """ Return padded int64 labels and the lengths of given sequences,
+  non-integer tokens (e.g. characters) are mapped by `vocabulary` """
+  lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+  labels = np.full(shape=(len(sequences),
+                          max(1, lengths.max() if len(lengths) > 0 else 0)),
+                   fill_value=-1, dtype=np.int64)
+  for i, seq in enumerate(sequences):
+    if vocabulary is None:
+      labels[i, :len(seq)] = seq
+    else:
+      labels[i, :len(seq)] = [vocabulary.setdefault(token, len(vocabulary))
+                              for token in seq]
+  return labels, lengths
+
+def edit_distance_batch(y_true, y_pred, true_length=None, pred_length=None,
+                        batch_size=2048):
+  """ Levenshtein distances of all pairs of sequences in one call
+
+  Parameters
+  ----------
+  y_true : {list of sequences, ndarray [n_samples, max_length]}
+      list of (variable length) sequences of labels or characters, or
+      padded integer labels
+  y_pred : {list of sequences, ndarray [n_samples, max_length]}
+      the same as `y_true`
+  true_length : {None, ndarray [n_samples]}
+      lengths of the padded `y_true`, if None, the full length is used
+  pred_length : {None, ndarray [n_samples]}
+      lengths of the padded `y_pred`, if None, the full length is used
+  batch_size : int
+      number of pairs processed together by the numpy implementation
+      (when numba is not available), the pairs are sorted by length so
+      each batch contains sequences of similar length
+
+  Returns
+  -------
+  distances : ndarray [n_samples] of int64
+  """
+  if len(y_true) != len(y_pred):
+    raise ValueError("Given %d true sequences, but %d predicted sequences" %
+                     (len(y_true), len(y_pred)))
+  if len(y_true) == 0:
+    return np.zeros(shape=(0,), dtype=np.int64)
+  # ====== padding variable length sequences ====== #
+  is_padded = lambda x: isinstance(x, np.ndarray) and x.ndim == 2 and \
+      x.dtype.kind in 'iub'
+  vocabulary = None
+  if not (is_padded(y_true) and is_padded(y_pred)):
+    is_integer = lambda seq: (not isinstance(seq, str) and
+                              np.asarray(seq).dtype.kind in 'iub')
+    if not all(is_integer(seq) for seq in y_true) or \
+    not all(is_integer(seq) for seq in y_pred):
+      vocabulary = {}
+  if not is_padded(y_true):
+    y_true, true_length = _pad_labels(y_true, vocabulary)
+  if not is_padded(y_pred):
+    y_pred, pred_length = _pad_labels(y_pred, vocabulary)
+  y_true = y_true.astype(np.int64)
+  y_pred = y_pred.astype(np.int64)
+  true_length = (np.full(shape=(y_true.shape[0],), fill_value=y_true.shape[1])
+                 if true_length is None else
+                 np.asarray(true_length)).astype(np.int64)
+  pred_length = (np.full(shape=(y_pred.shape[0],), fill_value=y_pred.shape[1])
+                 if pred_length is None else
+                 np.asarray(pred_length)).astype(np.int64)
+  # ====== compute the distances ====== #
+  distances = np.zeros(shape=(y_true.shape[0],), dtype=np.int64)
+  if _levenshtein_compiled:
+    return _levenshtein_batch(y_true, true_length, y_pred, pred_length,
+                              distances)
+  order = np.argsort(true_length * (pred_length.max() + 1) + pred_length,
+                     kind='mergesort')
+  for start in range(0, len(order), int(batch_size)):
+    ids = order[start:start + int(batch_size)]
+    max_true = max(1, true_length[ids].max())
+    max_pred = max(1, pred_length[ids].max())
+    distances[ids] = _levenshtein_batch(
+        y_true[ids, :max_true], true_length[ids],
+        y_pred[ids, :max_pred], pred_length[ids],
+        np.zeros(shape=(len(ids),), dtype=np.int64))
+  return distances
+
 def LER(y_true, y_pred, return_mean=True):
   ''' This function calculates the Labelling Error Rate (PER) of the decoded
   networks output sequence (out) and a target sequence (tar) with Levenshtein
@@ -58,9 +188,10 @@ def LER(y_true, y_pred, return_mean=True):
   if not hasattr(y_pred[0], '__len__') or isinstance(y_pred[0], str):
     y_pred = [y_pred]
 
-  results = []
-  for ytrue, ypred in zip(y_true, y_pred):
-    results.append(Levenshtein_distance(ytrue, ypred) / len(ytrue))
+  n = min(len(y_true), len(y_pred))
+  distances = edit_distance_batch(y_true[:n], y_pred[:n])
+  lengths = np.array([len(ytrue) for ytrue in y_true[:n]])
+  results = (distances / lengths).tolist()
   if return_mean:
     return np.mean(results)
   return results
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import
 import math
+import warnings
 from numbers import Number
 from six import string_types
 
@@ -16,10 +17,10 @@ from sklearn.utils.validation import check_is_fitted
 from sklearn.utils.extmath import (svd_flip, _incremental_mean_and_var,
                                    randomized_svd)
 
-from odin.fuel import Data
+from odin.fuel import Data, MmapData
 from odin.utils.mpi import MPI
 from odin.ml.base import TransformerMixin, BaseEstimator
-from odin.utils import batching, ctext, flatten_list, Progbar
+from odin.utils import batching, ctext, flatten_list, Progbar, is_string
 
 __all__ = [
     "fast_pca",
@@ -28,8 +29,58 @@ __all__ = [
     "SupervisedPPCA",
 ]
 
+# read-only memmap opened by each worker process, mapping: path -> memmap
+_MMAP_READERS = {}
+
+def _get_mmap_reader(path):
+  if path not in _MMAP_READERS:
+    _MMAP_READERS[path] = MmapData.open_memmap(path, read_only=True)
+  return _MMAP_READERS[path]
+
+def _blocked_reduce(X, func, block_size, ncpu=1, combine=None):
+  """ Return the element-wise sum of `func(X[start:end])` over all
+  row blocks of `X`, `func` must return a tuple of arrays.
+  If given, `combine(a, b)` replaces the sum for merging two results.
+
+  If `ncpu > 1`, the rows are split among multiple processes, each worker
+  reads its rows directly from the memmap file if `X` is `MmapData`.
+  Only `numpy.ndarray` and `MmapData` support multiprocessing,
+  other `Data` (e.g. `Hdf5Data`) are always processed sequentially.
+  """
+  n = X.shape[0]
+  ncpu = 1 if ncpu is None else int(ncpu)
+  if not isinstance(X, (np.ndarray, MmapData)):
+    ncpu = 1
+  ncpu = min(ncpu, int(math.ceil(n / block_size)))
+  source = X.path if isinstance(X, MmapData) and ncpu > 1 else X
+  if combine is None:
+    combine = np.add
+
+  def map_func(job):
+    start, end = job
+    x = _get_mmap_reader(source) if is_string(source) else source
+    results = None
+    for s in range(start, end, block_size):
+      r = func(x[s:min(s + block_size, end)])
+      results = list(r) if results is None else \
+          [combine(i, j) for i, j in zip(results, r)]
+    return results
+  # ====== single process ====== #
+  if ncpu <= 1:
+    return map_func((0, n))
+  # ====== multiprocessing ====== #
+  jobs = [(start, end)
+          for start, end in batching(n=n, batch_size=int(
+              math.ceil(n / (ncpu * 4) / block_size) * block_size))]
+  results = None
+  for r in MPI(jobs, func=map_func, ncpu=ncpu, batch=1, hwm=ncpu * 4,
+               backend='python'):
+    results = r if results is None else \
+        [combine(i, j) for i, j in zip(results, r)]
+  return results
+
 def fast_pca(*x, n_components=None, algo='rpca', y=None,
-             batch_size=1024, return_model=False,
+             batch_size=1024, block_size=None, ncpu=1, return_model=False,
              random_state=5218):
   """ A shortcut for many different PCA algorithms
 
@@ -51,6 +102,11 @@ def fast_pca(*x, n_components=None, algo='rpca', y=None,
     required for labels in case of `sppca`
   batch_size : int (default: 1024)
     batch size, only used for IncrementalPCA
+  block_size : {None, int}
+    number of rows per block for out-of-core randomized SVD,
+    only used for `algo='rpca'` and `MmapData` or `Hdf5Data` inputs
+  ncpu : int (default: 1)
+    number of processes for the out-of-core randomized SVD
   return_model : bool (default: False)
     if True, return the trained PCA model as the FIRST return
   """
@@ -62,7 +118,10 @@ def fast_pca(*x, n_components=None, algo='rpca', y=None,
   if algo in ('sppca', 'plda') and y is None:
     raise RuntimeError("`y` must be not None if `algo='sppca'`")
   x = flatten_list(x, level=None)
-  x = [i[:] if i.__class__.__name__ == 'MmapData' else i
+  # out-of-core randomized SVD streams row blocks directly from disk,
+  # other algorithms require loading the data into memory
+  x = [i if algo == 'rpca' and isinstance(i, Data) and len(i.shape) == 2
+       else (i[:] if isinstance(i, Data) else i)
        for i in x]
   # ====== check input ====== #
   x_train = x[0]
@@ -90,6 +149,7 @@ def fast_pca(*x, n_components=None, algo='rpca', y=None,
     # we copy the implementation of RandomizedPCA because
     # it is significantly faster than PCA(svd_solver='randomize')
     pca = RandomizedPCA(n_components=n_components, iterated_power=2,
+                        block_size=block_size, ncpu=ncpu,
                         random_state=random_state)
     pca.fit(x_train)
   elif algo == 'ipca':
@@ -499,6 +559,16 @@ class RandomizedPCA(BaseEstimator, TransformerMixin):
       improve the predictive accuracy of the downstream estimators by
       making their data respect some hard-wired assumptions.
 
+  block_size : {None, int}
+      If given, or the input is instance of `odin.fuel.Data` (e.g.
+      `MmapData`, `Hdf5Data`), the out-of-core randomized SVD is used,
+      the data is streamed in blocks of `block_size` rows, and only
+      `[n_features, n_components + 10]` matrices are kept in memory.
+      If None, the block size is selected so each block is around 64MB.
+
+  ncpu : int, default=1
+      Number of processes used for the out-of-core randomized SVD.
+
   random_state : int, RandomState instance or None, optional, default=None
       If int, random_state is the seed used by the random number generator;
       If RandomState instance, random_state is the random number generator;
@@ -550,13 +620,23 @@ class RandomizedPCA(BaseEstimator, TransformerMixin):
   """
 
   def __init__(self, n_components=None, copy=True, iterated_power=2,
-               whiten=False, random_state=None):
+               whiten=False, block_size=None, ncpu=1, random_state=None):
     self.n_components = n_components
     self.copy = copy
     self.iterated_power = iterated_power
     self.whiten = whiten
+    self.block_size = block_size
+    self.ncpu = ncpu
     self.random_state = random_state
 
+  def _is_blocked(self, X):
+    return isinstance(X, Data) or self.block_size is not None
+
+  def _get_block_size(self, n_features):
+    if self.block_size is None:
+      return max(1, int(64 * 1024 * 1024 / (8 * n_features)))
+    return int(self.block_size)
+
   def fit(self, X, y=None):
     """Fit the model with X by extracting the first principal components.
 
@@ -573,9 +653,94 @@ class RandomizedPCA(BaseEstimator, TransformerMixin):
     self : object
         Returns the instance itself.
     """
-    self._fit(check_array(X))
+    if self._is_blocked(X):
+      self._fit_blocked(X)
+    else:
+      self._fit(check_array(X))
     return self
 
+  def _fit_blocked(self, X):
+    """Out-of-core randomized SVD, the power iterations are performed
+    on the row space: `Q = orth(A^T A Q)` where `A` is the centered data,
+    hence, `A^T A Q` is accumulated block by block and never the whole
+    `A` nor `A Q` is stored in memory.
+
+    The range finder of `randomized_svd` (i.e. `orth(A Q)`) spans the
+    same subspace as one row space iteration, so `iterated_power + 1`
+    iterations give the same approximation as the in-memory `_fit`.
+    The number of passes over the data is `iterated_power + 4`
+    (mean, iterations, projection, and sign of the components).
+    """
+    random_state = check_random_state(self.random_state)
+    n_samples, n_features = X.shape
+    block_size = self._get_block_size(n_features)
+    ncpu = self.ncpu
+    if self.n_components is None:
+      n_components = n_features
+    else:
+      n_components = self.n_components
+    n_random = min(n_components + 10, n_features)
+    # ====== mean ====== #
+    mean = _blocked_reduce(
+        X, lambda x: (np.sum(x, axis=0, dtype='float64'),),
+        block_size=block_size, ncpu=ncpu)[0] / n_samples
+    # ====== range finder and power iterations ====== #
+    Q = random_state.normal(size=(n_features, n_random))
+    for i in range(self.iterated_power + 1):
+      def power_func(x):
+        x = x.astype('float64') - mean
+        return (np.dot(x.T, np.dot(x, Q)),)
+      Q, _ = linalg.qr(
+          _blocked_reduce(X, power_func, block_size=block_size, ncpu=ncpu)[0],
+          mode='economic')
+
+    # ====== project to the subspace: (A Q)^T (A Q) ====== #
+    def project_func(x):
+      x = x.astype('float64') - mean
+      B = np.dot(x, Q)
+      return np.dot(B.T, B), np.sum(x ** 2)
+    G, total_var = _blocked_reduce(X, project_func,
+                                   block_size=block_size, ncpu=ncpu)
+    eigval, W = linalg.eigh(G)
+    eigval, W = eigval[::-1], W[:, ::-1]
+    S = np.sqrt(np.clip(eigval[:n_components], 0., np.inf))
+    V = np.dot(Q, W[:, :n_components]).T
+
+    # ====== same sign convention as `svd_flip(U, V)` ====== #
+    # the largest absolute value of each column of `U = A V^T / S`
+    # is positive
+    def sign_func(x):
+      U = np.dot(x.astype('float64') - mean, V.T)
+      return (U[np.argmax(np.abs(U), axis=0), np.arange(U.shape[1])],)
+
+    def max_abs(a, b):
+      return np.where(np.abs(b) > np.abs(a), b, a)
+    signs = np.sign(_blocked_reduce(X, sign_func, block_size=block_size,
+                                    ncpu=ncpu, combine=max_abs)[0])
+    signs[signs == 0] = 1.
+    V *= signs[:, np.newaxis]
+    # ====== store the results ====== #
+    self.mean_ = mean
+    self.explained_variance_ = exp_var = (S ** 2) / (n_samples - 1)
+    full_var = total_var / (n_samples - 1)
+    self.explained_variance_ratio_ = exp_var / full_var
+    self.singular_values_ = S
+    if self.whiten:
+      self.components_ = V / S[:, np.newaxis] * math.sqrt(n_samples)
+    else:
+      self.components_ = V
+    return self
+
+  def _transform_blocked(self, X):
+    n_samples, n_features = X.shape
+    block_size = self._get_block_size(n_features)
+    X_new = np.empty(shape=(n_samples, self.components_.shape[0]),
+                     dtype=self.components_.dtype)
+    for start, end in batching(n=n_samples, batch_size=block_size):
+      X_new[start:end] = np.dot(X[start:end] - self.mean_,
+                                self.components_.T)
+    return X_new
+
   def _fit(self, X):
     """Fit the model to the data X.
 
@@ -637,6 +802,8 @@ class RandomizedPCA(BaseEstimator, TransformerMixin):
 
     """
     check_is_fitted(self, 'mean_')
+    if isinstance(X, Data):
+      return self._transform_blocked(X)
 
     X = check_array(X)
     if self.mean_ is not None:
@@ -661,6 +828,8 @@ class RandomizedPCA(BaseEstimator, TransformerMixin):
     X_new : array-like, shape (n_samples, n_components)
 
     """
+    if self._is_blocked(X):
+      return self._fit_blocked(X)._transform_blocked(X)
     X = check_array(X)
     X = self._fit(X)
     return np.dot(X, self.components_.T)
@@ -946,6 +1115,8 @@ class MiniBatchPCA(IncrementalPCA):
         _incremental_mean_and_var(X, last_mean=self.mean_,
                                   last_variance=self.var_,
                                   last_sample_count=self.n_samples_seen_)
+    # newer sklearn returns the sample count of each feature
+    n_total_samples = int(np.max(n_total_samples))
     total_var = np.sum(col_var * n_total_samples)
     if total_var == 0: # if variance == 0, make no sense to continue
       return self
@@ -983,8 +1154,7 @@ class MiniBatchPCA(IncrementalPCA):
       self.noise_variance_ = 0.
     return self
 
-  def transform(self, X, n_components=None):
-    # ====== check number of components ====== #
+  def _get_n_components(self, n_components):
     # specified percentage of explained variance
     if n_components is not None:
       # percentage of variances
@@ -994,12 +1164,19 @@ class MiniBatchPCA(IncrementalPCA):
       # specific number of components
       else:
         n_components = int(n_components)
+    return n_components
+
+  def _get_batch_size(self):
+    if self.batch_size is None:
+      return 12 * len(self.mean_)
+    return self.batch_size
+
+  def transform(self, X, n_components=None):
+    # ====== check number of components ====== #
+    n_components = self._get_n_components(n_components)
     # ====== other info ====== #
     n = X.shape[0]
-    if self.batch_size is None:
-      batch_size = 12 * len(self.mean_)
-    else:
-      batch_size = self.batch_size
+    batch_size = self._get_batch_size()
     # ====== start transforming ====== #
     X_transformed = []
     for start, end in batching(n=n, batch_size=batch_size):
@@ -1014,38 +1191,84 @@ class MiniBatchPCA(IncrementalPCA):
       X = X[:]
     return super(MiniBatchPCA, self).inverse_transform(X=X)
 
-  def transform_mpi(self, X, keep_order=True, ncpu=4,
-                    n_components=None):
-    """ Sample as transform but using multiprocessing """
+  def _transform_mpi_jobs(self, X, ncpu, n_components):
+    """ Return MPI which yields `(start, transformed_chunk)` in arbitrary
+    order """
     n = X.shape[0]
-    if self.batch_size is None:
-      batch_size = 12 * len(self.mean_)
-    else:
-      batch_size = self.batch_size
+    batch_size = self._get_batch_size()
     batch_list = [(i, min(i + batch_size, n))
         for i in range(0, n + batch_size, batch_size) if i < n]
+    # workers read directly from the memmap file, hence, avoid
+    # pickling a copy of the whole input to every process
+    source = X.path if isinstance(X, MmapData) else X
 
     # ====== run MPI jobs ====== #
     def map_func(batch):
       start, end = batch
-      x = super(MiniBatchPCA, self).transform(X=X[start:end])
+      if is_string(source):
+        x = _get_mmap_reader(source)[start:end]
+      else:
+        x = source[start:end]
+      x = super(MiniBatchPCA, self).transform(X=x)
       # doing dim reduction here save a lot of memory for
       # inter-processors transfer
       if n_components is not None:
         x = x[:, :n_components]
       # just need to return the start for ordering
       yield start, x
-    mpi = MPI(batch_list, func=map_func,
-              ncpu=ncpu, batch=1, hwm=ncpu * 12,
-              backend='python')
-    # ====== process the return ====== #
-    X_transformed = []
-    for start, x in mpi:
-      X_transformed.append((start, x))
-    if keep_order:
-      X_transformed = sorted(X_transformed, key=lambda x: x[0])
-    X_transformed = np.concatenate([x[-1] for x in X_transformed], axis=0)
-    return X_transformed
+    return MPI(batch_list, func=map_func,
+               ncpu=ncpu, batch=1, hwm=ncpu * 12,
+               backend='python')
+
+  def transform_mpi(self, X, keep_order=None, ncpu=4,
+                    n_components=None, output=None):
+    """ Sample as transform but using multiprocessing
+
+    Parameters
+    ----------
+    X : {numpy.ndarray, MmapData}
+      input data, if `MmapData` is given, each worker reads its chunk
+      directly from the memmap file.
+    keep_order : None
+      deprecated and ignored, each transformed chunk is always written
+      at the offset of its input, hence, the order is preserved.
+    output : {None, numpy.ndarray, MmapData}
+      preallocated output of shape `[n_samples, n_components]`,
+      if None, a new `numpy.ndarray` is allocated.
+    """
+    if keep_order is not None:
+      warnings.warn("`keep_order` is deprecated and ignored, the order of "
+                    "`X` is always preserved by `transform_mpi`",
+                    DeprecationWarning, stacklevel=2)
+    n_components = self._get_n_components(n_components)
+    n = X.shape[0]
+    n_outputs = self.components_.shape[0] if n_components is None else \
+        min(n_components, self.components_.shape[0])
+    if output is None:
+      output = np.empty(shape=(n, n_outputs), dtype=self.components_.dtype)
+    elif tuple(output.shape) != (n, n_outputs):
+      raise ValueError("`output` must has shape %s, but given: %s" %
+                       (str((n, n_outputs)), str(output.shape)))
+    # ====== write each chunk at its offset ====== #
+    for start, x in self._transform_mpi_jobs(X, ncpu, n_components):
+      output[start:start + x.shape[0]] = x
+    if isinstance(output, Data):
+      output.flush()
+    return output
+
+  def transform_mpi_iter(self, X, ncpu=4, n_components=None):
+    """ Generator version of `transform_mpi`, yield the transformed
+    chunks in the same order as `X` (only the chunks that arrived early
+    are kept in memory) """
+    n_components = self._get_n_components(n_components)
+    next_start = 0
+    pending = {}
+    for start, x in self._transform_mpi_jobs(X, ncpu, n_components):
+      pending[start] = x
+      while next_start in pending:
+        x = pending.pop(next_start)
+        next_start += x.shape[0]
+        yield x
 
   def __str__(self):
     if self.is_fitted:
@@ -1,27 +1,197 @@
 from __future__ import print_function, division, absolute_import
 
+import os
+import glob
+import hashlib
+from collections import OrderedDict
+
 import numpy as np
 from odin.utils.mpi import MPI, cpu_count
 from odin.utils import wprint
-from odin.utils.crypto import md5_checksum
+from odin.utils.cache_utils import get_cache_path
 
-_cached_values = {}
+# in-memory cache, mapping: (params, fingerprint) -> embedding
+_cached_values = OrderedDict()
+# maximum number of embedding kept in memory
+_MAX_CACHED_VALUES = 24
 
 # ===========================================================================
-# auto-select best TSNE
+# Caching
 # ===========================================================================
-def _create_key(kwargs, md5):
+def _create_key(kwargs):
   key = dict(kwargs)
   del key['verbose']
-  key['md5'] = md5
   return str(list(sorted(key.items(), key=lambda x: x[0])))
 
+# every `_FAST_STRIDE`-th row is hashed by the 'fast' fingerprint
+_FAST_STRIDE = 1024
+
+def _fingerprints(x, lengths, mode):
+  """ Return the mapping: n -> fingerprint of `x[:n]` for all `n` in
+  `lengths`, computed in a single pass over `x`.
+
+  'md5' hashes all rows, 'fast' only hashes every 1024-th row and the
+  column sums. The shape, dtype and `n` are always hashed.
+
+  The column sums are accumulated over fixed blocks of 1024 rows (plus
+  the partial last block of each `n`), so the fingerprint of `x[:n]`
+  does not depend on the other `lengths`.
+  """
+  lengths = sorted(set(int(n) for n in lengths if 0 < n <= x.shape[0]))
+  h = hashlib.md5()
+  h.update(str((x.shape[1:], x.dtype.str)).encode())
+  # sum of all complete blocks of `_FAST_STRIDE` rows seen so far
+  col_sum = np.zeros(shape=x.shape[1:], dtype='float64')
+  n_blocks = 0
+  row_bytes = max(1, x[:1].nbytes)
+  chunk = max(1, 512 * 1024 // row_bytes)
+  fingerprints = {}
+  start = 0
+  for n in lengths:
+    if mode == 'md5':
+      for s in range(start, n, chunk):
+        h.update(np.ascontiguousarray(x[s:min(s + chunk, n)]).tobytes())
+    else:
+      first = start + (-start) % _FAST_STRIDE
+      h.update(np.ascontiguousarray(x[first:n:_FAST_STRIDE]).tobytes())
+      while (n_blocks + 1) * _FAST_STRIDE <= n:
+        col_sum += np.sum(x[n_blocks * _FAST_STRIDE:
+                            (n_blocks + 1) * _FAST_STRIDE],
+                          axis=0, dtype='float64')
+        n_blocks += 1
+    start = n
+    final = h.copy()
+    final.update(str(n).encode())
+    if mode != 'md5':
+      final.update((col_sum + np.sum(x[n_blocks * _FAST_STRIDE:n], axis=0,
+                                     dtype='float64')).tobytes())
+    fingerprints[n] = mode + final.hexdigest()
+  return fingerprints
+
+def _memory_cache(key, value=None):
+  if value is None:
+    value = _cached_values.get(key, None)
+    if value is not None:
+      _cached_values.move_to_end(key)
+    return value
+  _cached_values[key] = value
+  while len(_cached_values) > _MAX_CACHED_VALUES:
+    _cached_values.popitem(last=False)
+  return value
+
+
+class _DiskCache(object):
+  """ Each embedding is stored in a separated file
+  `<params_hash>_<n>_<fingerprint>.npy` (`n` is the number of samples),
+  the modification time of the file is used as last access time for LRU
+  eviction.
+
+  Writing is atomic (write to temporary file then rename), hence, it is
+  safe for multiple processes writing at the same time.
+  """
+
+  def __init__(self, path, max_size):
+    self.path = path
+    # in MegaBytes
+    self.max_size = max_size
+    if not os.path.exists(path):
+      os.makedirs(path)
+
+  def _prefix(self, params):
+    return hashlib.md5(params.encode()).hexdigest()[:16]
+
+  def _path(self, params, n, fp):
+    return os.path.join(self.path,
+                        '%s_%d_%s.npy' % (self._prefix(params), n, fp))
+
+  def get(self, params, n, fp):
+    path = self._path(params, n, fp)
+    if not os.path.exists(path):
+      return None
+    try:
+      x = np.load(path)
+    except Exception as e:
+      return None
+    os.utime(path, None)
+    return x
+
+  def put(self, params, n, fp, embedding):
+    path = self._path(params, n, fp)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+      np.save(f, embedding, allow_pickle=False)
+    os.rename(tmp_path, path)
+
+  def cached(self, params):
+    """ Return the mapping: n -> set of fingerprints, of all embeddings
+    cached for `params`, only the file names are read """
+    prefix = self._prefix(params) + '_'
+    cached = {}
+    for name in os.listdir(self.path):
+      if not name.startswith(prefix) or not name.endswith('.npy'):
+        continue
+      n, _, fp = name[len(prefix):-4].partition('_')
+      if n.isdigit() and len(fp) > 0:
+        cached.setdefault(int(n), set()).add(fp)
+    return cached
+
+  def find_prefix(self, params, n_samples, fingerprints, cached=None):
+    """ Return the largest cached embedding which was fitted on
+    `x[:n]` with `n < n_samples`, or None.
+
+    `fingerprints` is the mapping: n -> fingerprint of `x[:n]`
+    (see `_fingerprints`) for the cached `n`.
+    """
+    if cached is None:
+      cached = self.cached(params)
+    for n in sorted(cached.keys(), reverse=True):
+      if n < n_samples and fingerprints.get(n, None) in cached[n]:
+        y = self.get(params, n, fingerprints[n])
+        if y is not None:
+          return y
+    return None
+
+  def evict(self):
+    files = [(os.path.getmtime(f), os.path.getsize(f), f)
+             for f in glob.glob(os.path.join(self.path, '*.npy'))]
+    total = sum(i[1] for i in files)
+    max_size = self.max_size * 1024 * 1024
+    for _, size, f in sorted(files):
+      if total <= max_size:
+        break
+      os.remove(f)
+      total -= size
+
+def _warm_start_init(x, y_old, random_state, batch_size=1024):
+  """ The first `len(y_old)` points keep their embedding, each new
+  point is placed (with a small jitter) at the embedding of its nearest
+  old point """
+  n_old = y_old.shape[0]
+  x_old = x[:n_old].astype('float64')
+  x_new = x[n_old:].astype('float64')
+  x_old_norm = np.sum(x_old ** 2, axis=1)
+  nn = np.empty(shape=(x_new.shape[0],), dtype='int64')
+  for start in range(0, x_new.shape[0], batch_size):
+    x_batch = x_new[start:start + batch_size]
+    d = x_old_norm[None, :] - 2 * np.dot(x_batch, x_old.T)
+    nn[start:start + batch_size] = np.argmin(d, axis=1)
+  rand = random_state if isinstance(random_state, np.random.RandomState) else \
+      np.random.RandomState(seed=random_state)
+  y_new = y_old[nn] + rand.normal(scale=1e-4 * np.std(y_old),
+                                  size=(len(nn), y_old.shape[1]))
+  return np.concatenate([y_old, y_new], axis=0).astype('float32')
+
+# ===========================================================================
+# auto-select best TSNE
+# ===========================================================================
+
 def fast_tsne(*X, n_components=2, n_samples=None, perplexity=30.0,
               early_exaggeration=8.0, learning_rate=200.0, n_iter=1000,
               n_iter_without_progress=300, min_grad_norm=1e-7,
               metric="euclidean", init="random", verbose=0,
               random_state=5218, method='barnes_hut', angle=0.5,
-              n_jobs=4):
+              n_jobs=4, cache_dir='auto', max_cache_size=1024,
+              fingerprint='md5', warm_start=True):
   """
   Parameters
   ----------
@@ -114,6 +284,27 @@ def fast_tsne(*X, n_components=2, n_samples=None, perplexity=30.0,
       This method is not very sensitive to changes in this parameter
       in the range of 0.2 - 0.8. Angle less than 0.2 has quickly increasing
       computation time and angle greater 0.8 has quickly increasing error.
+
+  cache_dir : {None, 'auto', string}
+      path to the folder for the persistent cache of the embeddings,
+      if 'auto', use `odin.utils.get_cache_path()/tsne`, if None, only
+      the in-memory cache is used.
+
+  max_cache_size : int (default: 1024)
+      maximum size of the persistent cache in MegaBytes, the least
+      recently used embeddings are evicted first.
+
+  fingerprint : {'md5', 'fast'}
+      'md5' hashes the whole input array to identify cached embedding,
+      'fast' only hashes the shape, dtype, every 1024-th row and the
+      column sums of the array.
+
+  warm_start : bool (default: True)
+      if True and an embedding is cached for the first `n` rows of the
+      input (e.g. new points were appended), that embedding is used for
+      initialization, and new points are initialized at the embedding
+      of their nearest old point. Only supported by sklearn and
+      MulticoreTSNE.
   """
   assert len(X) > 0, "No input is given!"
   if isinstance(X[0], (tuple, list)):
@@ -124,6 +315,16 @@ def fast_tsne(*X, n_components=2, n_samples=None, perplexity=30.0,
   kwargs = dict(locals())
   del kwargs['X']
   n_samples = kwargs.pop('n_samples', None)
+  for name in ('cache_dir', 'max_cache_size', 'fingerprint', 'warm_start'):
+    del kwargs[name]
+  fingerprint = str(fingerprint).lower()
+  if fingerprint not in ('md5', 'fast'):
+    raise ValueError("`fingerprint` must be 'md5' or 'fast', given: %s" %
+                     fingerprint)
+  if cache_dir == 'auto':
+    cache_dir = os.path.join(get_cache_path(), 'tsne')
+  disk_cache = None if cache_dir is None else \
+      _DiskCache(cache_dir, max_size=max_cache_size)
   # ====== downsampling ====== #
   if n_samples is not None:
     n_samples = int(n_samples)
@@ -173,32 +374,61 @@ def fast_tsne(*X, n_components=2, n_samples=None, perplexity=30.0,
   else:
     del kwargs['n_jobs']
   # ====== getting cached values ====== #
+  params = _create_key(kwargs)
   results = []
   X_new = []
+  use_warm_start = warm_start and disk_cache is not None and \
+      tsne_version != 'cuda'
   for i, x in enumerate(X):
-    md5 = md5_checksum(x)
-    key = _create_key(kwargs, md5)
-    if key in _cached_values:
-      results.append((i, _cached_values[key]))
+    n = x.shape[0]
+    # the fingerprints of all cached prefixes are computed in one pass
+    cached = disk_cache.cached(params) if use_warm_start else {}
+    fingerprints = _fingerprints(x, [n] + list(cached.keys()), fingerprint)
+    fp = fingerprints[n]
+    y = _memory_cache((params, fp))
+    if y is None and disk_cache is not None:
+      y = disk_cache.get(params, n, fp)
+      if y is not None:
+        _memory_cache((params, fp), y)
+    if y is not None:
+      results.append((i, y))
     else:
-      X_new.append((i, md5, x))
+      init = None
+      if use_warm_start:
+        y_old = disk_cache.find_prefix(params, n, fingerprints, cached)
+        if y_old is not None:
+          init = _warm_start_init(x, y_old, random_state)
+      X_new.append((i, fp, x, init))
 
   # ====== perform T-SNE ====== #
+  # the workers only receive the index of the job, and the embedding is
+  # written to the disk cache directly if possible
   def apply_tsne(j):
-    idx, md5, x = j
-    tsne = TSNE(**kwargs)
-    return (idx, md5, tsne.fit_transform(x))
+    idx, fp, x, init = X_new[j]
+    tsne_kwargs = dict(kwargs)
+    if init is not None:
+      tsne_kwargs['init'] = init
+    y = TSNE(**tsne_kwargs).fit_transform(x)
+    if disk_cache is not None:
+      disk_cache.put(params, x.shape[0], fp, y)
+      return (idx, fp, None)
+    return (idx, fp, y)
+
+  def collect(idx, fp, y):
+    if y is None:
+      y = disk_cache.get(params, X[idx].shape[0], fp)
+    results.append((idx, y))
+    _memory_cache((params, fp), y)
   # only 1 X, no need for MPI
   if len(X_new) == 1:
-    idx, md5, x = apply_tsne(X_new[0])
-    results.append((idx, x))
-    _cached_values[_create_key(kwargs, md5)] = x
-  else:
-    mpi = MPI(jobs=X_new, func=apply_tsne, batch=1,
+    collect(*apply_tsne(0))
+  elif len(X_new) > 1:
+    mpi = MPI(jobs=list(range(len(X_new))), func=apply_tsne, batch=1,
               ncpu=min(len(X_new), cpu_count() - 1))
-    for idx, md5, x in mpi:
-      results.append((idx, x))
-      _cached_values[_create_key(kwargs, md5)] = x
+    for idx, fp, y in mpi:
+      collect(idx, fp, y)
+  if disk_cache is not None and len(X_new) > 0:
+    disk_cache.evict()
   # ====== return and clean ====== #
   results = sorted(results, key=lambda a: a[0])
   results = [r[1] for r in results]
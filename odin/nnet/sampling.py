@@ -158,6 +158,22 @@ class StatsPool(NNOp):
     dimension of input_dim each to the output dimension. If counts is
     specified, an additional dimension is added to the output to store log
     counts.
+
+  Parameters
+  ----------
+  axes : {int, list of int}
+      axes for calculating the statistics
+
+  output_mode : {'concat', 'sum', 'mean', 'max'}
+      how the mean and the stddev are merged
+
+  Note
+  ----
+  When applying, the statistics of padded inputs can be restricted to the
+  valid frames by giving either `mask` (1 for valid, 0 for padded frames,
+  broadcastable to the input after appending trailing dimensions, e.g.
+  `[n_samples, n_timestep]`) or `seq_len` (`[n_samples]` lengths of the
+  sequences along the single axis in `axes`).
   """
   _SUPPORT_OUTPUT_MODE = ('concat', 'sum', 'mean', 'max')
 
@@ -172,8 +188,31 @@ class StatsPool(NNOp):
                        (output_mode, StatsPool._SUPPORT_OUTPUT_MODE))
     self.output_mode = output_mode
 
-  def _apply(self, X):
-    mean, var = tf.nn.moments(x=X, axes=self.axes, keep_dims=True)
+  def _apply(self, X, mask=None, seq_len=None):
+    axes = as_tuple(self.axes, t=int)
+    # ====== create mask from sequence length ====== #
+    if seq_len is not None:
+      if mask is not None:
+        raise ValueError("Only one of `mask` or `seq_len` can be given")
+      if len(axes) != 1 or axes[0] % X.shape.ndims == 0:
+        raise ValueError("`seq_len` requires single non-batch axis, "
+                         "but given axes: %s" % str(self.axes))
+      time_axis = axes[0] % X.shape.ndims
+      mask = tf.sequence_mask(seq_len, maxlen=tf.shape(X)[time_axis])
+      mask = tf.reshape(
+          mask, shape=[-1 if i == 0 else (tf.shape(X)[i] if i == time_axis else 1)
+                       for i in range(X.shape.ndims)])
+    # ====== statistics ====== #
+    if mask is None:
+      mean, var = tf.nn.moments(x=X, axes=self.axes, keep_dims=True)
+    else:
+      mask = tf.cast(mask, X.dtype)
+      for _ in range(X.shape.ndims - mask.shape.ndims):
+        mask = tf.expand_dims(mask, axis=-1)
+      # only the valid frames are counted
+      mean, var = tf.nn.weighted_moments(x=X, axes=list(axes),
+                                         frequency_weights=mask,
+                                         keep_dims=True)
     std = tf.sqrt(var)
     if self.output_mode == 'concat':
       X = tf.concat((mean, std), self.axes)
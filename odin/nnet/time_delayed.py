@@ -20,6 +20,8 @@
 # Character-aware neural language models, AAAI'16
 from __future__ import print_function, division, absolute_import
 
+import functools
+
 import numpy as np
 import tensorflow as tf
 from tensorflow.python.ops import init_ops
@@ -64,13 +66,19 @@ class TimeDelayedDense(NNOp):
       which return a 3-D tensor with shape
       [n_sample, n_timestep - n_time_context + 1, n_new_features[-1] * n_time_context]
 
+  use_scan : bool (default: False)
+      if True, `scan` over all context windows and project every window
+      (i.e. each frame is projected `n_time_context` times), otherwise,
+      project all frames once then build the context windows from
+      shifted slices of the projection (same outputs, much faster).
+
   """
 
   def __init__(self, n_new_features, n_time_context,
                time_pool='max', backward=False,
                W_init=init_ops.glorot_uniform_initializer(seed=randint()),
                b_init=init_ops.constant_initializer(0),
-               activation=K.linear, **kwargs):
+               activation=K.linear, use_scan=False, **kwargs):
     super(TimeDelayedDense, self).__init__(**kwargs)
     if n_new_features is None:
       self.n_new_features = []
@@ -95,6 +103,7 @@ class TimeDelayedDense(NNOp):
     "Only support: %s; but given: '%s'" % (str(_allow_time_pool), str(time_pool))
     self.time_pool = time_pool
     self.backward = bool(backward)
+    self.use_scan = bool(use_scan)
 
   def _initialize(self):
     time_dim = self.input_shape[1]
@@ -124,7 +133,9 @@ class TimeDelayedDense(NNOp):
                     feat_dim)
     # ====== traverse backward along time axis ====== #
     if self.backward:
-      X = tf.reverse(X, 1)
+      X = tf.reverse(X, axis=[1])
+    if not self.use_scan:
+      return self._apply_unrolled(X, new_time_dim, new_feat_dim)
     # ====== prepare VALID padding ====== #
     context_indices = tf.range(0, new_time_dim, delta=1,
                                dtype=tf.int32, name="ContextIndices")
@@ -176,6 +187,43 @@ class TimeDelayedDense(NNOp):
     # [n_sample, n_timestep - n_time_context + 1, n_new_features]
     return output
 
+  def _apply_unrolled(self, X, new_time_dim, new_feat_dim):
+    # ====== applying deep dense network once for all frames ====== #
+    feat_dim = X.shape[2].value
+    proj = tf.reshape(X, shape=(-1, feat_dim))
+    for l in range(self.n_layers):
+      proj = K.dot(proj, self.get('W%d' % l))
+      if self.b_init is not None:
+        proj = proj + self.get('b%d' % l)
+      proj = self.activation[l](proj)
+    proj = tf.reshape(proj, shape=(tf.shape(X)[0], tf.shape(X)[1],
+                                   new_feat_dim))
+    # ====== context windows from shifted slices ====== #
+    # the k-th slice contains the k-th frame of every context window
+    n_windows = tf.shape(proj)[1] - self.n_time_context + 1
+    ctx = [proj[:, k:k + n_windows, :] for k in range(self.n_time_context)]
+    # ====== applying pooling ====== #
+    if self.time_pool in ('concat', 'none'):
+      output = tf.concat(ctx, axis=-1)
+    # pooling is accumulated slice by slice, so no tensor larger than
+    # the projection is created
+    elif self.time_pool == 'max':
+      output = functools.reduce(tf.maximum, ctx)
+    elif self.time_pool == 'min':
+      output = functools.reduce(tf.minimum, ctx)
+    elif self.time_pool == 'sum':
+      output = tf.add_n(ctx)
+    elif self.time_pool == 'avg':
+      output = tf.add_n(ctx) / self.n_time_context
+    elif self.time_pool == 'stat':
+      mean = tf.add_n(ctx) / self.n_time_context
+      var = tf.add_n([tf.squared_difference(c, mean) for c in ctx]) / \
+          self.n_time_context
+      output = tf.concat([mean, tf.sqrt(var)], -1)
+    output.set_shape((X.shape[0], new_time_dim, output.shape[-1]))
+    # [n_sample, n_timestep - n_time_context + 1, n_new_features]
+    return output
+
 # ===========================================================================
 # Time-Delayed Convolution
 # ===========================================================================
@@ -248,7 +296,7 @@ class TimeDelayedConv(NNOp):
     # [n_sample, n_timestep, n_features, 1]
     # ====== traverse backward along time axis ====== #
     if self.backward:
-      X = tf.reverse(X, 1)
+      X = tf.reverse(X, axis=[1])
     # ====== apply convolution ====== #
     conved = tf.nn.convolution(input=X, filter=self.get('W'),
         padding="VALID",
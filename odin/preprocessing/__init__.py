@@ -1,10 +1,22 @@
-from odin.preprocessing.base import make_pipeline, set_extractor_debug, Pipeline
-from odin.preprocessing.processor import validate_features, FeatureProcessor, calculate_pca
-from odin.preprocessing import base
-from odin.preprocessing import speech
-from odin.preprocessing import textgrid
-from odin.preprocessing import signal
-from odin.preprocessing import sequence
-# from odin.preprocessing import image
-# from odin.preprocessing import video
-# from odin.preprocessing import text
+from odin.utils import lazy_import
+
+# `speech` (tensorflow) and `base` (sklearn) are expensive to import,
+# `odin.fuel` only needs `odin.preprocessing.signal`, so every
+# submodule is loaded on first access.
+lazy_import(__name__, {
+    'make_pipeline': 'odin.preprocessing.base:make_pipeline',
+    'set_extractor_debug': 'odin.preprocessing.base:set_extractor_debug',
+    'set_extractor_liveness': 'odin.preprocessing.base:set_extractor_liveness',
+    'Pipeline': 'odin.preprocessing.base:Pipeline',
+    'validate_features': 'odin.preprocessing.processor:validate_features',
+    'FeatureProcessor': 'odin.preprocessing.processor:FeatureProcessor',
+    'calculate_pca': 'odin.preprocessing.processor:calculate_pca',
+    'base': 'odin.preprocessing.base',
+    'speech': 'odin.preprocessing.speech',
+    'textgrid': 'odin.preprocessing.textgrid',
+    'signal': 'odin.preprocessing.signal',
+    'sequence': 'odin.preprocessing.sequence',
+    # 'image': 'odin.preprocessing.image',
+    # 'video': 'odin.preprocessing.video',
+    # 'text': 'odin.preprocessing.text',
+})
@@ -88,13 +88,26 @@ class ExtractorSignal(object):
 # ===========================================================================
 # Helper
 # ===========================================================================
-def make_pipeline(steps, debug=False):
+def make_pipeline(steps, debug=False, output_features=None):
   """ NOTE: this method automatically revmove None entries
 
    - Flatten list or dictionary found in steps.
    - Remove any object that not is instance of `Extractor`
 
   during creation of `Pipeline`.
+
+  Parameters
+  ----------
+  steps : list of `Extractor`
+  debug : bool
+    enable debugging mode for all extractors
+  output_features : {None, string, list of string}
+    name of the features requested at the end of the pipeline.
+    If given, a liveness analysis is performed on the steps, every
+    `numpy.ndarray` feature which is not requested and not read
+    by any following extractor is dropped right after the step
+    that makes it dead (no need for hand-placed `DeleteFeatures`).
+    Non-array features (e.g. 'name', 'path', 'sr') are always kept.
   """
   ID = [0]
 
@@ -126,6 +139,9 @@ def make_pipeline(steps, debug=False):
   # ====== set debug mode ====== #
   set_extractor_debug([i[1] for i in steps],
                       debug=bool(debug))
+  # ====== liveness analysis ====== #
+  set_extractor_liveness([i[1] for i in steps],
+                         output_features=output_features)
   # ====== return pipeline ====== #
   ret = Pipeline(steps=steps)
   return ret
@@ -146,6 +162,39 @@ def set_extractor_debug(extractors, debug):
     i._debug = bool(debug)
   return extractors
 
+def set_extractor_liveness(extractors, output_features):
+  """ Backward liveness analysis over a sequence of extractors,
+  after the transformation of the i-th extractor, only the features
+  in `output_features` or read by extractors `i + 1, ...` are kept.
+
+  If `output_features` is None, liveness information is removed and
+  all features are carried to the end of the pipeline.
+  """
+  if isinstance(extractors, Pipeline):
+    extractors = [i[-1] for i in extractors.steps]
+  elif isinstance(extractors, Extractor):
+    extractors = [extractors]
+  extractors = [i for i in flatten_list(extractors)
+                if isinstance(i, Extractor)]
+  # ====== reset ====== #
+  if output_features is None:
+    for e in extractors:
+      e._live_features = None
+    return extractors
+  # ====== backward pass ====== #
+  live = set(str(i).lower()
+             for i in as_tuple(output_features, t=string_types))
+  for e in extractors[::-1]:
+    e._live_features = None if live is None else frozenset(live)
+    if live is not None:
+      required = e.required_features
+      # unknown dependencies, keep everything before this extractor
+      if required is None:
+        live = None
+      else:
+        live.update(required)
+  return extractors
+
 def _equal_inputs_outputs(x, y):
   try:
     if x != y:
@@ -244,6 +293,17 @@ class Extractor(BaseEstimator, TransformerMixin):
   def output_name(self):
     return self._output_name
 
+  @property
+  def required_features(self):
+    """ Name of all features read by this extractor, used by the
+    liveness analysis in `make_pipeline`.
+    `None` means any feature could be accessed (e.g. `input_name=None`),
+    extractors reading features other than `input_name` must
+    override this property. """
+    if self.input_name is None:
+      return None
+    return as_tuple(self.input_name, t=string_types)
+
   @property
   def is_input_layer(self):
     return self._is_input_layer
@@ -256,6 +316,17 @@ class Extractor(BaseEstimator, TransformerMixin):
     self._debug = bool(debug)
     return self
 
+  def _drop_dead_features(self, feat):
+    """ Remove all `numpy.ndarray` features that are not read by
+    any following extractor (see `make_pipeline`) """
+    live = getattr(self, '_live_features', None)
+    if live is None or not isinstance(feat, Mapping):
+      return feat
+    for name in [name for name, val in feat.items()
+                 if name not in live and isinstance(val, np.ndarray)]:
+      del feat[name]
+    return feat
+
   def fit(self, X, y=None):
     # Do nothing here
     return self
@@ -336,6 +407,8 @@ class Extractor(BaseEstimator, TransformerMixin):
           ).set_action('error')
         if name not in y:
           y[name] = _preprocess(feat)
+    # ====== drop dead intermediate features ====== #
+    y = self._drop_dead_features(y)
     # ====== print debug text ====== #
     # maybe someone implement __getstate__ and forget _debug
     if not hasattr(self, '_debug'):
@@ -656,7 +729,7 @@ class RenameFeatures(Extractor):
           X = feat[old_name]
           del feat[old_name]
           feat[new_name] = X
-    return feat
+    return self._drop_dead_features(feat)
 
 class DeleteFeatures(Extractor):
   """ Remove features by name from extracted features dictionary """
@@ -665,6 +738,10 @@ class DeleteFeatures(Extractor):
     super(DeleteFeatures, self).__init__()
     self._name = as_tuple(input_name, t=string_types)
 
+  @property
+  def required_features(self):
+    return ()
+
   def _transform(self, X):
     return X
 
@@ -673,7 +750,7 @@ class DeleteFeatures(Extractor):
       for name in self._name:
         if name in feat: # only remove if it exist
           del feat[name]
-    return feat
+    return self._drop_dead_features(feat)
 
 # ===========================================================================
 # Shape
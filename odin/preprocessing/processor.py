@@ -8,6 +8,7 @@ from __future__ import print_function, division, absolute_import
 import re
 import os
 import sys
+import json
 import wave
 import time
 import random
@@ -19,7 +20,7 @@ from six import add_metaclass, string_types
 from six.moves import zip, zip_longest, range, cPickle
 from abc import ABCMeta, abstractmethod, abstractproperty
 
-from collections import defaultdict, Mapping
+from collections import defaultdict, Mapping, OrderedDict
 
 import numpy as np
 
@@ -388,6 +389,87 @@ def _check_logpath(log_path):
     current_log_index += 1
   return main_path + '.' + str(current_log_index) + ext
 
+def _nbytes(X):
+  if isinstance(X, np.ndarray):
+    return X.nbytes
+  if isinstance(X, Mapping):
+    return sum(i.nbytes for i in X.values() if isinstance(i, np.ndarray))
+  return 0
+
+def _profile_transform(pipeline, X):
+  """ Equal to `Pipeline.transform`, but also return the profile
+  of each step: list of `(step_name, wall_time, output_bytes)` """
+  profile = []
+  for name, extractor in pipeline.steps:
+    start_time = time.time()
+    X = extractor.transform(X)
+    profile.append((name, time.time() - start_time, _nbytes(X)))
+    # the following extractors will only pass the signal
+    if isinstance(X, ExtractorSignal):
+      break
+  return X, profile
+
+def _group_segment_jobs(jobs):
+  """ Group the segment jobs of the same file, i.e. `(path, start, end)`,
+  `(path, start, end, name)` or mapping with 'path' and 'start' or 'end',
+  the groups are ordered by the first appearance of each file, and other
+  jobs stay in their own group.
+
+  Return
+  ------
+  list of list of jobs
+  """
+  groups = OrderedDict()
+  for i, job in enumerate(jobs):
+    key = i
+    if isinstance(job, (tuple, list)) and len(job) in (3, 4) and \
+    is_string(job[0]):
+      key = job[0]
+    elif isinstance(job, Mapping) and 'path' in job and 'raw' not in job and \
+    (job.get('start', None) is not None or job.get('end', None) is not None):
+      key = str(job['path'])
+    groups.setdefault(key, []).append(job)
+  return list(groups.values())
+
+def _profile_report(pipeline, extractor_stats, parent_stats,
+                    n_files, ncpu, total_time):
+  extractors = []
+  total_worker_time = max(sum(i[1] for i in extractor_stats.values()), 1e-8)
+  for name, e in pipeline.steps:
+    calls, wall_time, nbytes = extractor_stats[name]
+    extractors.append(OrderedDict([
+        ('name', name),
+        ('class', e.__class__.__name__),
+        ('calls', calls),
+        ('time', wall_time),
+        ('avg_time', wall_time / max(calls, 1)),
+        ('time_percent', 100. * wall_time / total_worker_time),
+        ('bytes', nbytes),
+        ('avg_bytes', nbytes / max(calls, 1))]))
+  return OrderedDict([
+      ('n_files', n_files),
+      ('ncpu', ncpu),
+      ('total_time', total_time),
+      ('files_per_sec', n_files / max(total_time, 1e-8)),
+      ('extractors', extractors),
+      ('parent', OrderedDict(
+          [(name, wall_time) for name, wall_time in parent_stats.items()]))
+  ])
+
+def _format_profile_report(report):
+  s = 'Profile (worker time is summed over all processes):\n'
+  s += '  %-32s %-24s %8s %12s %12s %8s %12s\n' % \
+  ('Step', 'Extractor', 'Calls', 'Time(s)', 'Avg(ms)', '%', 'Avg(KB)')
+  for e in report['extractors']:
+    s += '  %-32s %-24s %8d %12.2f %12.2f %8.2f %12.2f\n' % \
+    (e['name'][:32], e['class'][:24], e['calls'], e['time'],
+     e['avg_time'] * 1000, e['time_percent'], e['avg_bytes'] / 1024)
+  for name, wall_time in report['parent'].items():
+    s += '  Parent %-25s %.2f(secs)\n' % (name, wall_time)
+  s += '  Total time: %.2f(secs)   Speed: %.2f(files/sec)\n' % \
+  (report['total_time'], report['files_per_sec'])
+  return s
+
 class FeatureProcessor(object):
 
   """ FeatureProcessor
@@ -438,13 +520,21 @@ class FeatureProcessor(object):
 
       if True, terminate the processor if non-handled Exception
       appeared.
+
+  profile : bool (default: True)
+      if True, record wall time, output bytes and number of calls
+      of each extractor (in the worker processes), and the queue
+      waiting and writing time of the main process. The report is
+      written to the log file and saved as JSON at
+      `path/profile.json`, next to the `config`.
   """
 
   def __init__(self, jobs, path, extractor,
                n_cache=0.12, ncpu=1, override=False,
                identifier='name',
                log_path=None,
-               stop_on_failure=False):
+               stop_on_failure=False,
+               profile=True):
     super(FeatureProcessor, self).__init__()
     # ====== check outpath ====== #
     path = os.path.abspath(str(path))
@@ -502,6 +592,8 @@ class FeatureProcessor(object):
     self.config = {}
     self._error_log = []
     self.stop_on_failure = bool(stop_on_failure)
+    self.profile = bool(profile)
+    self._profile_report = {}
 
   @property
   def identifier(self):
@@ -511,6 +603,12 @@ class FeatureProcessor(object):
   def error_log(self):
     return list(self._error_log)
 
+  @property
+  def profile_report(self):
+    """ Structured profile of the last `run`, empty dictionary if
+    `profile=False` """
+    return dict(self._profile_report)
+
   # ==================== debugging ==================== #
   def __str__(self):
     s = ctext('============= FeatureProcessor: %s =============' % self.path, 'yellow') + '\n'
@@ -631,8 +729,12 @@ class FeatureProcessor(object):
 
     # ====== mapping function ====== #
     def _map_func(dat):
+      profile = None
       try:
-        ret = self.extractor.transform(dat)
+        if self.profile:
+          ret, profile = _profile_transform(self.extractor, dat)
+        else:
+          ret = self.extractor.transform(dat)
       except Exception as e: # Non-handled exception
         ret = '\n========\n'
         ret += 'Time  : `%s`\n' % str(get_formatted_datetime(only_number=False))
@@ -643,10 +745,17 @@ class FeatureProcessor(object):
         for line in traceback.TracebackException(
                 type(value), value, tb, limit=None).format(chain=True):
           ret += line
-      return ret
+      # None is ignored by MPI
+      return None if ret is None else (ret, profile)
+
+    def _map_group(jobs):
+      for dat in jobs:
+        yield _map_func(dat)
     # ====== processing ====== #
-    mpi = MPI(jobs=self.jobs,
-              func=_map_func,
+    # all segments of a file are sent to the same process, hence,
+    # the file is decoded once (see `speech._decoded_cache`)
+    mpi = MPI(jobs=_group_segment_jobs(self.jobs),
+              func=_map_group,
               ncpu=self.n_cpu,
               batch=1,
               hwm=self.n_cpu * 3,
@@ -657,6 +766,10 @@ class FeatureProcessor(object):
     start_time = time.time()
     last_time = time.time()
     last_count = 0
+    # step_name -> [n_calls, wall_time, output_bytes]
+    extractor_stats = {name: [0, 0., 0] for name, _ in self.extractor.steps}
+    parent_stats = OrderedDict([('queue_wait', 0.), ('write', 0.),
+                                ('finalize', 0.)])
     with open(self._log_path, 'w') as flog:
       # writing the log head
       flog.write('============================\n')
@@ -670,7 +783,15 @@ class FeatureProcessor(object):
       flog.write('============================\n')
       flog.flush()
       # start processing the file list
-      for count, result in enumerate(mpi):
+      wait_start = time.time()
+      for count, (result, profile) in enumerate(mpi):
+        parent_stats['queue_wait'] += time.time() - wait_start
+        if profile is not None:
+          for name, wall_time, nbytes in profile:
+            stats_ = extractor_stats[name]
+            stats_[0] += 1
+            stats_[1] += wall_time
+            stats_[2] += nbytes
         # Non-handled exception
         if isinstance(result, string_types):
           flog.write(result)
@@ -693,7 +814,9 @@ class FeatureProcessor(object):
           prog['File'] = '%-48s' % result.message[:48]
         # otherwise, no error happened, do post-processing
         else:
+          write_start = time.time()
           name = post_processing(result)
+          parent_stats['write'] += time.time() - write_start
           prog['File'] = '%-48s' % str(name)[:48]
         # update progress
         prog.add(1)
@@ -715,7 +838,9 @@ class FeatureProcessor(object):
           flog.flush()
           last_time = curr_time
           last_count = count + 1
+        wait_start = time.time()
     # ====== end, flush the last time ====== #
+    finalize_start = time.time()
     for feat_name, X_cached in cache.items():
       flush_feature(feat_name, X_cached)
     cache.clear()
@@ -778,6 +903,20 @@ class FeatureProcessor(object):
     config.close()
     prog.add_notification("Saved configuration at: %s" %
                           ctext(config_path, 'yellow'))
+    parent_stats['finalize'] += time.time() - finalize_start
+    # ====== saving the profile ====== #
+    if self.profile:
+      self._profile_report = _profile_report(
+          self.extractor, extractor_stats, parent_stats,
+          n_files=njobs, ncpu=self.n_cpu,
+          total_time=time.time() - start_time)
+      profile_path = os.path.join(dataset.path, 'profile.json')
+      with open(profile_path, 'w') as f:
+        json.dump(self._profile_report, f, indent=2)
+      with open(self._log_path, 'a') as flog:
+        flog.write(_format_profile_report(self._profile_report))
+      prog.add_notification("Saved profile at: %s" %
+                            ctext(profile_path, 'yellow'))
     # ====== final notification ====== #
     prog.add_notification("Closed all dataset.")
     prog.add_notification("Dataset at path: %s" % ctext(dataset.path, 'yellow'))
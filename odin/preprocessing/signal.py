@@ -290,6 +290,143 @@ def set_vad_mode(mode):
     mode = min(max(mode, 1.), 2.4)
     __current_vad_mode = float(mode)
 
+def _gmm_em_1d(X, mask, distrib_nb, nb_train_it,
+               tol=1e-3, reg_covar=1e-6):
+  """ Vectorized EM for 1-D Gaussian mixtures, fitted independently
+  for each row of `X` (same initialization and convergence criterion
+  as `sklearn.mixture.GaussianMixture` formerly used by `vad_energy`)
+
+  Parameters
+  ----------
+  X : (n_utterances, n_frames)
+    padded data
+  mask : (n_utterances, n_frames)
+    boolean, False for padded frames
+
+  Return
+  ------
+  means, variances, weights : (n_utterances, distrib_nb)
+  """
+  eps = 10 * np.finfo(X.dtype).eps
+  mask = mask.astype(X.dtype)
+  n = mask.sum(axis=1)
+  X2 = X ** 2
+  # ====== initialization ====== #
+  n_utt = X.shape[0]
+  weights = np.full((n_utt, distrib_nb), 1. / distrib_nb, dtype=X.dtype)
+  means = np.tile(-2 + 4.0 * np.arange(distrib_nb) / (distrib_nb - 1),
+                  (n_utt, 1)).astype(X.dtype)
+  variances = np.ones((n_utt, distrib_nb), dtype=X.dtype)
+  lower_bound = np.full((n_utt,), -np.inf, dtype=X.dtype)
+  # indices of the models that have not converged
+  active = np.arange(n_utt)
+  # ====== EM ====== #
+  for _ in range(int(nb_train_it)):
+    if len(active) == n_utt:
+      x, x2, m = X, X2, mask
+    else:
+      x, x2, m = X[active], X2[active], mask[active]
+    # parameters: (distrib_nb, n_active)
+    mu, var, w = means[active].T, variances[active].T, weights[active].T
+    # E-step, the components are on the first axis, hence, all
+    # reductions are on contiguous memory
+    # log_prob: (distrib_nb, n_active, n_frames)
+    log_prob = x[None, :, :] - mu[:, :, None]
+    log_prob *= log_prob
+    log_prob *= (-0.5 / var)[:, :, None]
+    log_prob += (np.log(w) - 0.5 * (np.log(2 * np.pi) +
+                                    np.log(var)))[:, :, None]
+    log_prob_norm = log_prob.max(axis=0)
+    log_prob -= log_prob_norm
+    resp = np.exp(log_prob, out=log_prob)
+    norm = resp.sum(axis=0)
+    log_prob_norm += np.log(norm)
+    # padded frames have zero responsibility
+    norm /= m
+    resp /= norm
+    # M-step, resp: (n_active, distrib_nb, n_frames)
+    resp = resp.transpose(1, 0, 2)
+    nk = resp.sum(axis=-1) + eps
+    mu = np.matmul(resp, x[:, :, None])[:, :, 0] / nk
+    means[active] = mu
+    variances[active] = np.matmul(resp, x2[:, :, None])[:, :, 0] / nk - \
+        mu ** 2 + reg_covar
+    weights[active] = nk / n[active][:, None]
+    # convergence
+    log_prob_norm *= m
+    new_lower_bound = log_prob_norm.sum(axis=-1) / n[active]
+    converged = np.abs(new_lower_bound - lower_bound[active]) < tol
+    lower_bound[active] = new_lower_bound
+    active = active[~converged]
+    if len(active) == 0:
+      break
+  return means, variances, weights
+
+def vad_energy_batch(log_energies, distrib_nb=3, nb_train_it=25,
+                     batch_size=64):
+  """ Same as `vad_energy`, but the Gaussian mixtures of many
+  utterances are fitted at once on padded arrays.
+
+  Parameters
+  ----------
+  log_energies : list of 1-D numpy.ndarray
+    log-energy of each utterance
+  batch_size : int
+    maximum number of utterances fitted at once, the utterances
+    are sorted by length to minimize the padding.
+
+  Return
+  ------
+  list of `(vad, threshold)` for each utterance
+  """
+  log_energies = [np.asarray(e, dtype='float64').ravel()
+                  for e in log_energies]
+  results = [None] * len(log_energies)
+  order = sorted(range(len(log_energies)),
+                 key=lambda i: len(log_energies[i]))
+  for start in range(0, len(order), int(batch_size)):
+    indices = order[start:start + int(batch_size)]
+    energies = [log_energies[i] for i in indices]
+    lengths = np.array([len(e) for e in energies])
+    # ====== center and normalize the energy ====== #
+    X = np.zeros(shape=(len(energies), max(lengths.max(), 1)),
+                 dtype='float64')
+    mask = np.arange(X.shape[1])[None, :] < lengths[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      for i, e in enumerate(energies):
+        X[i, :len(e)] = (e - np.mean(e)) / np.std(e)
+    # utterances that cannot be fitted
+    valid = np.logical_and(lengths >= distrib_nb,
+                           np.all(np.isfinite(X), axis=1))
+    # ====== fitting ====== #
+    if np.any(valid):
+      with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        means, variances, _ = _gmm_em_1d(X[valid], mask[valid],
+                                         distrib_nb=distrib_nb,
+                                         nb_train_it=nb_train_it)
+    # ====== thresholding ====== #
+    model_index = 0
+    for i, e in enumerate(energies):
+      fitted = bool(valid[i])
+      if fitted:
+        mu, var = means[model_index], variances[model_index]
+        model_index += 1
+        fitted = np.all(np.isfinite(mu)) and np.all(var > 0)
+      # fallback to fewer components
+      if not fitted:
+        if distrib_nb - 1 >= 2 and len(e) > 0:
+          ret = vad_energy(e, distrib_nb=distrib_nb - 1,
+                           nb_train_it=nb_train_it)
+        else:
+          ret = (np.zeros(shape=(len(e),)), 0)
+      else:
+        # Compute threshold
+        threshold = mu.max() - __current_vad_mode * np.sqrt(var[mu.argmax()])
+        # Apply frame selection with the current threshold
+        ret = (X[i, :len(e)] > threshold, threshold)
+      results[indices[i]] = ret
+  return results
+
 def vad_energy(log_energy, distrib_nb=3, nb_train_it=25):
   """ Fitting Gaussian mixture model on the log-energy and the voice
   activity is the component with highest energy.
@@ -299,36 +436,8 @@ def vad_energy(log_energy, distrib_nb=3, nb_train_it=25):
   vad: array of 0, 1
   threshold: scalar
   """
-  from sklearn.exceptions import ConvergenceWarning
-  from sklearn.mixture import GaussianMixture
-  # center and normalize the energy
-  log_energy = (log_energy - np.mean(log_energy)) / np.std(log_energy)
-  if log_energy.ndim == 1:
-    log_energy = log_energy[:, np.newaxis]
-  # create mixture model: diag, spherical
-  world = GaussianMixture(
-      n_components=distrib_nb, covariance_type='diag',
-      init_params='kmeans', max_iter=nb_train_it,
-      weights_init=np.ones(distrib_nb) / distrib_nb,
-      means_init=(-2 + 4.0 * np.arange(distrib_nb) / (distrib_nb - 1))[:, np.newaxis],
-      precisions_init=np.ones((distrib_nb, 1)),
-  )
-  try:
-    with warnings.catch_warnings():
-      warnings.filterwarnings("ignore", category=ConvergenceWarning)
-      world.fit(log_energy)
-  except (ValueError, IndexError): # index error because of float32 cumsum
-    if distrib_nb - 1 >= 2:
-      return vad_energy(log_energy,
-                        distrib_nb=distrib_nb - 1,
-                        nb_train_it=nb_train_it)
-    return np.zeros(shape=(log_energy.shape[0],)), 0
-  # Compute threshold
-  threshold = world.means_.max() - \
-      __current_vad_mode * np.sqrt(1.0 / world.precisions_[world.means_.argmax(), 0])
-  # Apply frame selection with the current threshold
-  label = log_energy.ravel() > threshold
-  return label, threshold
+  return vad_energy_batch([log_energy], distrib_nb=distrib_nb,
+                          nb_train_it=nb_train_it)[0]
 
 def vad_threshold(frames, threshold=35):
   """
@@ -38,10 +38,12 @@ from __future__ import print_function, division, absolute_import
 import os
 import re
 import six
+import zlib
 import math
 import copy
 import base64
 import shutil
+import hashlib
 import inspect
 import warnings
 from numbers import Number
@@ -57,6 +59,7 @@ from odin.fuel import Dataset, MmapData, MmapDict
 from odin.utils import (is_number, cache_memory, is_string, as_tuple,
                         get_all_files, is_pickleable, Progbar, mpi, ctext,
                         is_fileobj, batching)
+from odin.utils.cache_utils import get_cache_path
 from odin.preprocessing.base import Extractor, ExtractorSignal
 from odin.preprocessing.signal import (smooth, pre_emphasis, get_window, get_energy,
                                        spectra, vad_energy,
@@ -104,8 +107,45 @@ def _read_pcm(path, encode):
   raw = np.memmap(path, dtype=dtype, mode='r')
   return raw, sr
 
-def read(path_or_file, encode=None):
+# the last decoded files by external tools (i.e. cannot seek), mapping:
+# path -> (raw, sr), this cache is local to each process
+_decoded_cache = OrderedDict()
+_MAX_DECODED_CACHE = 2
+
+def _segment_frames(start, end, sr, n_frames):
+  """ Convert `start` and `end` (in second) to frame indices """
+  start = 0 if start is None else int(round(start * sr))
+  end = n_frames if end is None else int(round(end * sr))
+  return min(max(0, start), n_frames), min(max(0, end), n_frames)
+
+def _decode_external(path, encode):
+  if path in _decoded_cache:
+    _decoded_cache.move_to_end(path)
+    return _decoded_cache[path]
+  raw, sr = anything2wav(inpath=path, outpath=None,
+                         codec=encode, return_data=True)
+  _decoded_cache[path] = (raw, sr)
+  while len(_decoded_cache) > _MAX_DECODED_CACHE:
+    _decoded_cache.popitem(last=False)
+  return raw, sr
+
+def read(path_or_file, encode=None, start=None, end=None, sr=None):
   """
+  Parameters
+  ----------
+  path_or_file : {string, file}
+    path to audio file or opened file object
+  encode : {None, string}
+    encoding of raw pcm file (e.g. 'ulaw', 'vast')
+  start : {None, float}
+    starting time (in second) of the segment to read, only the requested
+    frames are read (via seek) if the format support it
+  end : {None, float}
+    ending time (in second) of the segment to read
+  sr : {None, int}
+    sample rate for raw pcm file without header information, only used
+    for converting `start` and `end` to frames
+
   Returns
   -------
   audio_array : [n_samples, nb_channels]
@@ -113,6 +153,7 @@ def read(path_or_file, encode=None):
   sr : {int, None}
     sample rate
   """
+  is_segment = start is not None or end is not None
   # ====== check input ====== #
   if is_fileobj(path_or_file):
     f = path_or_file
@@ -124,28 +165,48 @@ def read(path_or_file, encode=None):
   else:
     raise ValueError("Invalid type of `path_or_file` %s" %
         str(type(path_or_file)))
+
+  def slice_raw(raw, raw_sr):
+    if not is_segment:
+      return raw
+    raw_sr = sr if raw_sr is None else raw_sr
+    if raw_sr is None:
+      raise ValueError("Sample rate is required for reading segment of "
+                       "file: %s" % path)
+    s, e = _segment_frames(start, end, raw_sr, raw.shape[0])
+    return raw[s:e]
   # ====== read the audio ====== #
   if '.pcm' in path.lower():
     f = open(path_or_file, 'rb')
-    raw, sr = _read_pcm(f, encode=encode)
+    raw, sr_ = _read_pcm(f, encode=encode)
+    # memmap, only the slice is read from disk
+    raw = slice_raw(raw, sr_)
   else:
     import soundfile
     try:
       f = open(path_or_file, 'rb')
-      raw, sr = soundfile.read(f)
+      if not is_segment:
+        raw, sr_ = soundfile.read(f)
+      else:
+        with soundfile.SoundFile(f) as sfile:
+          sr_ = sfile.samplerate
+          s, e = _segment_frames(start, end, sr_, sfile.frames)
+          sfile.seek(s)
+          raw = sfile.read(frames=e - s)
     except Exception as e:
       # read special pcm file
       if '.sph' in f.name.lower():
         f = open(path_or_file, 'rb')
-        raw, sr = _read_pcm(f, encode=encode)
+        raw, sr_ = _read_pcm(f, encode=encode)
+        raw = slice_raw(raw, sr_)
       # read using external tools
       else:
-        raw, sr = anything2wav(inpath=path, outpath=None,
-                               codec=encode, return_data=True)
+        raw, sr_ = _decode_external(path, encode)
+        raw = slice_raw(raw, sr_)
   # close file
   if f is not None:
     f.close()
-  return raw, sr
+  return raw, sr_
 
 def save(file_or_path, s, sr, subtype=None):
   '''
@@ -316,9 +377,16 @@ class AudioReader(Extractor):
   -----
   path_or_array: string, tuple, list, mapping
       - string for path
-      - tuple or list for (path-or-raw, sr)
+      - tuple or list for segment (path, start, end) or
+      (path, start, end, name), `start` and `end` in second
       - mapping for provding additional information include:
-      sr, encode (ulaw, vast), 'raw' or 'path'
+      sr, encode (ulaw, vast), 'raw' or 'path', 'start', 'end', 'name'
+
+  Note
+  ----
+  For segment jobs, only the requested frames (plus a short context for
+  resampling) are read from the file, the returned name of the segment
+  is `[path]:[start]:[end]` if not given.
 
   Note
   ----
@@ -341,6 +409,34 @@ class AudioReader(Extractor):
       raise ValueError("dataset can be instance of odin.fuel.Dataset or None")
     self.dataset = dataset
 
+  def _read_segment(self, path, encode, sr, start, end):
+    """ Read the segment with additional context frames on both sides,
+    so the edges are correct after resampling.
+
+    Return
+    ------
+    raw, sr, (left_context_frames, right_context_frames)
+    """
+    if start is None and end is None:
+      raw, sr_ = read(path, encode=encode)
+      return raw, sr if sr_ is None else sr_, (0, 0)
+    # half-length of the resampling filter is 64 zero crossings at the
+    # new sample rate
+    context = 0. if self.sr_new is None else 64. / self.sr_new
+    context_start = None if start is None else max(0., start - context)
+    context_end = None if end is None else end + context
+    raw, sr_ = read(path, encode=encode, start=context_start,
+                    end=context_end, sr=sr if sr is not None else self.sr)
+    sr = sr if sr_ is None else sr_
+    if sr is None or self.sr_new is None:
+      return raw, sr, (0, 0)
+    left = 0 if start is None else \
+        int(round(start * sr)) - int(round(context_start * sr))
+    right = 0 if end is None else \
+        max(0, raw.shape[0] - left - (int(round(end * sr)) -
+                                      int(round((start or 0.) * sr))))
+    return raw, sr, (left, right)
+
   def _transform(self, path_or_array):
     raw = None # raw
     sr = None # by default, we don't know sample rate
@@ -349,6 +445,17 @@ class AudioReader(Extractor):
     duration = None
     encode = None
     channel = None
+    start = None
+    end = None
+    pad = (0, 0)
+    # ====== segment job (path, start, end[, name]) ====== #
+    if isinstance(path_or_array, (tuple, list)):
+      if len(path_or_array) not in (3, 4):
+        raise ValueError("Segment job must be (path, start, end) or "
+                         "(path, start, end, name), but given: %s" %
+                         str(path_or_array))
+      path_or_array = dict(zip(('path', 'start', 'end', 'name'),
+                               path_or_array))
     # ====== check path_or_array ====== #
     # mapping of specific data
     if isinstance(path_or_array, Mapping):
@@ -358,12 +465,20 @@ class AudioReader(Extractor):
         encode = str(path_or_array['encode'])
       if 'channel' in path_or_array:
         channel = int(path_or_array['channel'])
+      if path_or_array.get('start', None) is not None:
+        start = float(path_or_array['start'])
+      if path_or_array.get('end', None) is not None:
+        end = float(path_or_array['end'])
+      if 'name' in path_or_array:
+        name = str(path_or_array['name'])
       # get raw or path out of the Dictionary
       if 'raw' in path_or_array:
         raw = path_or_array['raw']
       elif 'path' in path_or_array:
         path = str(path_or_array['path'])
-        raw, sr = read(path, encode=encode)
+        raw, sr, pad = self._read_segment(path, encode, sr, start, end)
+        if name is None and (start is not None or end is not None):
+          name = '%s:%s:%s' % (path, start, end)
       else:
         raise ValueError('`path_or_array` can be a dictionary, contains '
             'following key: sr, raw, path. One of the key `raw` for '
@@ -376,8 +491,8 @@ class AudioReader(Extractor):
         raw, sr = read(path_or_array, encode=encode)
       # given a dataset
       elif self.dataset is not None:
-        start, end = self.dataset['indices'][path_or_array]
-        raw = self.dataset['raw'][start:end]
+        ids_start, ids_end = self.dataset['indices'][path_or_array]
+        raw = self.dataset['raw'][ids_start:ids_end]
         sr = int(self.dataset['sr'][path_or_array])
         name = path_or_array
         if 'path' in self.dataset:
@@ -409,8 +524,16 @@ class AudioReader(Extractor):
       sr = int(self.sr)
     # resampling if necessary
     if sr is not None and self.sr_new is not None:
+      n = raw.shape[0]
       raw = resample(raw, sr, self.sr_new,
                      best_algorithm=self.best_resample)
+      # remove the context frames of the segment after resampling
+      if start is not None or end is not None:
+        left, right = pad
+        ratio = self.sr_new / sr
+        length = int(round((n - left - right) * ratio))
+        left = int(round(left * ratio))
+        raw = raw[left:left + length]
       sr = int(self.sr_new)
     # ====== remove DC offset ====== #
     if self.remove_dc:
@@ -430,19 +553,299 @@ class AudioReader(Extractor):
       ret['name'] = name
     return ret
 
+def _augment_category(path, root, corpus):
+  """ Category of an augmentation file from its path relative to the
+  `root` of MUSAN corpus ('noise', 'music', 'speech', or None if the
+  file is outside those folders) or RIRS_NOISES corpus ('rir', or
+  'noise' for the point-source and isotropic noises) """
+  root = os.path.normpath(root)
+  parts = [os.path.basename(root)] + \
+      os.path.normpath(os.path.relpath(path, root)).split(os.sep)
+  parts = [i.lower() for i in parts]
+  folders, name = parts[:-1], parts[-1]
+  if corpus == 'musan':
+    for category in ('noise', 'music', 'speech'):
+      if category in folders:
+        return category
+    return None
+  if 'pointsource_noises' in folders or 'noise' in name:
+    return 'noise'
+  return 'rir'
+
+def _write_augment_index(path, index):
+  """ Tab-separated index of the augmentation bank:
+  name category start end """
+  with open(path, 'w') as f:
+    f.write('\t'.join(['name', 'category', 'start', 'end']) + '\n')
+    for name, category, start, end in index:
+      f.write('%s\t%s\t%d\t%d\n' % (name, category, start, end))
+
+def _read_augment_index(path):
+  """ Return a dictionary: category -> [(name, start, end), ...] """
+  index = defaultdict(list)
+  with open(path, 'r') as f:
+    next(f) # header
+    for line in f:
+      line = line.rstrip('\n')
+      if len(line) == 0:
+        continue
+      # bank packed with space-separated index
+      if '\t' not in line:
+        line = '\t'.join(line.rsplit(' ', 3))
+      name, category, start, end = line.split('\t')
+      index[category].append((name, int(start), int(end)))
+  return index
+
+def _overlap_add_convolve(x, H, n_fft, rir_length):
+  """ FFT convolution of `x` and a RIR with precomputed spectrum `H`
+  (i.e. `rfft(rir, n_fft)`), all blocks are transformed at once.
+  Return the full convolution of length `len(x) + rir_length - 1` """
+  n = x.shape[0]
+  block = n_fft - rir_length + 1
+  n_blocks = int(np.ceil(n / block))
+  X = np.zeros(shape=(n_blocks, block), dtype='float64')
+  X.ravel()[:n] = x
+  Y = np.fft.irfft(np.fft.rfft(X, n=n_fft, axis=1) * H, n=n_fft, axis=1)
+  # overlap-add, the overlapped tail is always shorter than a block
+  y = np.zeros(shape=((n_blocks + 1) * block,), dtype='float64')
+  y[:n_blocks * block] += Y[:, :block].ravel()
+  tail = np.zeros(shape=(n_blocks, block), dtype='float64')
+  tail[:, :n_fft - block] = Y[:, block:]
+  y[block:] += tail.ravel()
+  return y[:n + rir_length - 1]
+
+def pack_augmentation_bank(musan_path, rirs_path, outpath, sr=16000,
+                           ncpu=None):
+  """ Pack all MUSAN (noise, music, speech) and RIR files into a single
+  `MmapData` at `[outpath]/raw` (resampled to `sr`), the information
+  of each file is saved at a tab-separated file `[outpath]/index.csv`:
+    name category start end
+
+  The category is inferred from the path relative to `musan_path`
+  (noise, music, speech folders) or `rirs_path` (rir, except the
+  point-source and isotropic noises which are categorized as noise).
+
+  Return
+  ------
+  outpath
+  """
+  index_path = os.path.join(outpath, 'index.csv')
+  if os.path.exists(index_path):
+    return outpath
+  if not os.path.isdir(outpath):
+    os.makedirs(outpath)
+  files = []
+  categories = {}
+  for path, corpus in ((musan_path, 'musan'), (rirs_path, 'rirs')):
+    if path is None:
+      continue
+    for f in get_all_files(path):
+      if os.path.splitext(f)[-1].lower() not in ('.wav', '.flac'):
+        continue
+      category = _augment_category(f, path, corpus)
+      if category is not None:
+        files.append(f)
+        categories[f] = category
+  if len(files) == 0:
+    raise ValueError("No audio files found in MUSAN path: %s, and "
+                     "RIRS path: %s" % (musan_path, rirs_path))
+  reader = AudioReader(sr_new=sr, best_resample=True, remove_dc=False)
+
+  def read_file(f):
+    y = reader.transform(f)
+    if not isinstance(y, Mapping):
+      return f, np.empty(shape=(0,), dtype='float32')
+    raw = y['raw']
+    if raw.ndim > 1:
+      raw = raw[:, 0]
+    return f, raw.astype('float32')
+  # ====== write all files into single memmap ====== #
+  data = None
+  prog = Progbar(target=len(files), print_summary=True, print_report=True,
+                 name='Packing augmentation bank: %s' % outpath)
+  index = []
+  start = 0
+  for f, raw in mpi.MPI(jobs=files, func=read_file,
+                        ncpu=ncpu, batch=1, backend='python'):
+    if raw.shape[0] == 0:
+      prog.add(1)
+      continue
+    end = start + raw.shape[0]
+    if data is None:
+      data = MmapData(os.path.join(outpath, 'raw'), dtype='float32',
+                      shape=(end,), read_only=False)
+    else:
+      data.resize(end)
+    data[start:end] = raw
+    index.append((os.path.splitext(os.path.basename(f))[0],
+                  categories[f], start, end))
+    start = end
+    prog['File'] = f
+    prog.add(1)
+  if data is None:
+    raise RuntimeError("Cannot read any audio file for augmentation bank.")
+  data.flush()
+  data.close()
+  # ====== save the index ====== #
+  _write_augment_index(index_path, index)
+  return outpath
+
 class AudioAugmentor(Extractor):
   """ SREAugmentor
 
-  New name for each utterance is:
-    [utt_name]/[noise1_name]/[noise2_name]...
+  Kaldi's x-vector style augmentation using the MUSAN and RIRS_NOISES
+  corpus, all the files are packed once into a memory-mapped bank
+  (see `pack_augmentation_bank`), then each augmentation type create
+  one augmented copy of the utterance:
+    - 'reverb': convolved with a random RIR using FFT overlap-add
+    - 'noise' : added MUSAN noise at SNR from `noise_snr`
+    - 'music' : added MUSAN music at SNR from `music_snr`
+    - 'babble': added sum of 3-7 MUSAN speech at SNR from `babble_snr`
+
+  The copies are returned with name `[output_name]_[type]`, and the
+  description of each copy is stored at `[output_name]_info`:
+    [type]/[noise1_name]/[noise2_name]...
+
+  Parameters
+  ----------
+  musan_path : {string, None}
+    path to MUSAN corpus
+  rirs_path : {string, None}
+    path to RIRS_NOISES corpus
+  bank_path : {string, None}
+    path to the packed bank, if not exist, the bank is created from
+    `musan_path` and `rirs_path`
+  sr : int
+    sample rate of the bank and the input audio
+  augment_types : tuple of string
+    'reverb', 'noise', 'music', 'babble'
+  fft_size : int
+    minimum FFT size for the overlap-add convolution, the spectra of
+    RIRs are cached per FFT size
+  seed : int
+    the random state for each utterance is seeded by `seed` and the
+    utterance name (or path), hence, the augmentation is deterministic
+    regardless of the number of processes.
   """
 
-  def __init__(self, musan_path, rirs_path):
-    super(AudioAugmentor, self).__init__(is_input_layer=False)
-    # TODO: finish this
+  def __init__(self, musan_path=None, rirs_path=None, bank_path=None,
+               sr=16000, augment_types=('reverb', 'noise', 'music', 'babble'),
+               noise_snr=(0, 15), music_snr=(5, 15), babble_snr=(13, 20),
+               babble_speakers=(3, 7), fft_size=8192, seed=5218,
+               input_name=('raw', 'sr'), output_name='raw'):
+    super(AudioAugmentor, self).__init__(
+        input_name=as_tuple(input_name, t=string_types),
+        output_name=str(output_name))
+    self.sr = int(sr)
+    augment_types = as_tuple(augment_types, t=string_types)
+    for t in augment_types:
+      if t not in ('reverb', 'noise', 'music', 'babble'):
+        raise ValueError("Unsupported augmentation type: %s" % t)
+    self.augment_types = augment_types
+    self.noise_snr = tuple(noise_snr)
+    self.music_snr = tuple(music_snr)
+    self.babble_snr = tuple(babble_snr)
+    self.babble_speakers = tuple(babble_speakers)
+    self.fft_size = int(fft_size)
+    self.seed = int(seed)
+    # ====== create the bank ====== #
+    if bank_path is None:
+      from odin.utils import get_datasetpath
+      bank_path = get_datasetpath('augmentation_bank_%d' % self.sr,
+                                  override=False, is_folder=False)
+    self.musan_path = musan_path
+    self.rirs_path = rirs_path
+    self.bank_path = pack_augmentation_bank(musan_path, rirs_path,
+                                            outpath=bank_path, sr=self.sr)
+    # lazy loaded in each process
+    self._bank = None
+    self._index = None
+    self._rir_spectra = {}
+
+  def _load_bank(self):
+    if self._bank is None:
+      self._bank = MmapData.open_memmap(os.path.join(self.bank_path, 'raw'),
+                                        read_only=True)
+      self._index = _read_augment_index(
+          os.path.join(self.bank_path, 'index.csv'))
+    return self._bank, self._index
+
+  def _rir_spectrum(self, rir_id, start, end):
+    rir_length = end - start
+    n_fft = max(self.fft_size, 2 ** int(np.ceil(np.log2(2 * rir_length))))
+    key = (rir_id, n_fft)
+    if key not in self._rir_spectra:
+      rir = np.array(self._bank[start:end], dtype='float64')
+      rir = rir / np.sqrt(np.sum(rir ** 2))
+      self._rir_spectra[key] = (np.fft.rfft(rir, n=n_fft), n_fft,
+                                int(np.argmax(np.abs(rir))))
+    return self._rir_spectra[key]
+
+  def _noise_segment(self, start, end, n, rand):
+    """ Random segment of length `n` from a noise file, the file is
+    repeated if it is shorter than `n` """
+    length = end - start
+    if length >= n:
+      offset = start + rand.randint(0, length - n + 1)
+      return self._bank[offset:offset + n]
+    return np.resize(self._bank[start:end], n)
 
-  def _transform(self, row):
-    pass
+  def _transform(self, feat):
+    raw, sr = [feat[name] for name in self.input_name]
+    if sr != self.sr:
+      raise ValueError("AudioAugmentor requires sample rate %d, but given "
+                       "audio with sample rate %s" % (self.sr, str(sr)))
+    bank, index = self._load_bank()
+    # ====== deterministic random state for each utterance ====== #
+    name = feat.get('name', feat.get('path', None))
+    name = str(raw.shape[0]) if name is None else str(name)
+    rand = np.random.RandomState(
+        (self.seed + zlib.crc32(name.encode('utf-8'))) % 2**32)
+    n = raw.shape[0]
+    raw = raw.astype('float64')
+    signal_power = np.mean(raw ** 2) + 1e-18
+    ret = {}
+    info = []
+    # ====== reverberation ====== #
+    if 'reverb' in self.augment_types and len(index['rir']) > 0:
+      rir_id = rand.randint(0, len(index['rir']))
+      rir_name, start, end = index['rir'][rir_id]
+      H, n_fft, delay = self._rir_spectrum(rir_id, start, end)
+      y = _overlap_add_convolve(raw, H, n_fft, end - start)[delay:delay + n]
+      # keep the same power as original signal
+      y *= np.sqrt(signal_power / (np.mean(y ** 2) + 1e-18))
+      ret['%s_reverb' % self.output_name] = y.astype('float32')
+      info.append('reverb/' + rir_name)
+    # ====== additive noise, all copies are mixed at once ====== #
+    noises = []
+    snrs = []
+    names = []
+    for t, category, snr in (('noise', 'noise', self.noise_snr),
+                             ('music', 'music', self.music_snr),
+                             ('babble', 'speech', self.babble_snr)):
+      if t not in self.augment_types or len(index[category]) == 0:
+        continue
+      n_files = 1 if t != 'babble' else \
+          rand.randint(self.babble_speakers[0], self.babble_speakers[1] + 1)
+      file_ids = rand.randint(0, len(index[category]), size=n_files)
+      noise = np.zeros(shape=(n,), dtype='float64')
+      for i in file_ids:
+        _, start, end = index[category][i]
+        noise += self._noise_segment(start, end, n, rand)
+      noises.append(noise)
+      snrs.append(rand.uniform(snr[0], snr[1]))
+      info.append('/'.join([t] + [index[category][i][0] for i in file_ids]))
+      names.append('%s_%s' % (self.output_name, t))
+    if len(noises) > 0:
+      noises = np.stack(noises, axis=0)
+      noise_power = np.mean(noises ** 2, axis=1) + 1e-18
+      gains = np.sqrt(signal_power /
+                      (noise_power * 10 ** (np.array(snrs) / 10.)))
+      Y = (raw[None, :] + gains[:, None] * noises).astype('float32')
+      for name, y in zip(names, Y):
+        ret[name] = y
+    ret['%s_info' % self.output_name] = ';'.join(info)
+    return ret
 
 # ===========================================================================
 # Pre-processing raw signal
@@ -912,7 +1315,7 @@ class _BNFExtractorBase(Extractor):
       X = X[sad]
     return X
 
-  def _transform(self, feat):
+  def _get_input(self, feat):
     if self.use_sad:
       X, sad = feat[self.input_name[0]], feat[self.input_name[1]]
       sad = sad.astype('bool')
@@ -922,8 +1325,10 @@ class _BNFExtractorBase(Extractor):
     else:
       X = feat[self.input_name]
       sad = None
-    # ====== transform ====== #
-    X = self._prepare_input(X, sad)
+    return self._prepare_input(X, sad)
+
+  def _transform(self, feat):
+    X = self._get_input(feat)
     y = []
     # make prediction
     for s, e in batching(n=X.shape[0], batch_size=self.batch_size):
@@ -973,6 +1378,15 @@ class BNFExtractorCPU(_BNFExtractorBase):
    - Mean-variance normalization
    => BNFExtractor
 
+  The weights are packed once into a memmap file in
+  `odin.utils.get_cache_path()/bnf` (named by the network and the MD5
+  of its parameters), which is mapped read-only by all workers.
+  The network is evaluated in float32, the outputs are casted back to
+  the type promoted from the parameters and the input features
+  (i.e. `float64` for normalized features), as the previous version did.
+  `transform_batch` packs the frames of multiple utterances into
+  `batch_size` GEMM batches, it must be called explicitly, the
+  `FeatureProcessor` still transforms one utterance at a time.
   """
 
   def _prepare_network(self, network):
@@ -984,36 +1398,188 @@ class BNFExtractorCPU(_BNFExtractorBase):
     % str(network)
     params = network.load_parameters()
     # note: the weights are transposed for column matrix (Matlab format)
-    self.weights = [params[name][:]
+    weights = [params[name][:]
         for name in sorted([key for key in params.keys() if 'w' == key[0]])]
-    self.biases = [params[name][:]
+    biases = [params[name][:]
         for name in sorted([key for key in params.keys() if 'b' == key[0]])]
-    assert len(self.weights) == len(self.biases), \
+    assert len(weights) == len(biases), \
     'Number of weights is: %d; but number of biases is: %s' % \
-    (len(self.weights), len(self.biases))
+    (len(weights), len(biases))
+    # ====== layout of the shared weights file ====== #
+    # (w_offset, w_shape, b_offset, b_size) for each layer
+    layout = []
+    offset = 0
+    # the file is keyed by the parameters, updated weights (even with
+    # the same shapes) are never served from a stale file
+    md5 = hashlib.md5()
+    for w, b in zip(weights, biases):
+      w_size = int(np.prod(w.shape))
+      b_size = int(np.prod(b.shape))
+      layout.append((offset, tuple(w.shape), offset + w_size, b_size))
+      offset += w_size + b_size
+      for x in (w, b):
+        x = np.ascontiguousarray(x, dtype='float32')
+        md5.update(str(x.shape).encode('utf-8'))
+        md5.update(x.tobytes())
+    self._layout = layout
+    # dtype of the parameters, decides the output dtype
+    self._param_dtype = np.result_type(*(weights + biases))
+    # ====== pack all parameters into single memmap file ====== #
+    # all workers map this file read-only, hence, the weights are
+    # loaded once and shared via the OS page cache
+    path = os.path.join(get_cache_path(), 'bnf',
+                        '%s_%s' % (network.__name__, md5.hexdigest()))
+    if not os.path.exists(path):
+      if not os.path.exists(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+      tmp_path = path + '.%d.tmp' % os.getpid()
+      data = MmapData(tmp_path, dtype='float32', shape=(offset,),
+                      read_only=False)
+      for (w_offset, w_shape, b_offset, b_size), w, b in zip(
+          layout, weights, biases):
+        data[w_offset:w_offset + int(np.prod(w_shape))] = \
+            np.ravel(w).astype('float32')
+        data[b_offset:b_offset + b_size] = np.ravel(b).astype('float32')
+      data.flush()
+      data.close()
+      os.rename(tmp_path, path)
+    self._weights_path = path
+    self._weights = None
+    self._biases = None
+    self._buffers = None
+
+  @property
+  def weights(self):
+    """ List of read-only weight matrices, shape: (n_out, n_in) """
+    if self._weights is None:
+      data = MmapData.open_memmap(self._weights_path, read_only=True)
+      self._weights = [
+          data[w_offset:w_offset + int(np.prod(w_shape))].reshape(w_shape)
+          for w_offset, w_shape, _, _ in self._layout]
+      self._biases = [data[b_offset:b_offset + b_size]
+                      for _, _, b_offset, b_size in self._layout]
+    return self._weights
+
+  @property
+  def biases(self):
+    """ List of read-only bias vectors, shape: (n_out,) """
+    if self._biases is None:
+      self.weights
+    return self._biases
 
-  def _renorm_rms(self, x, target_rms=1.0, axis=0):
-    """ scales the data such that RMS is 1.0 """
-    # scale = sqrt(x^t x / (D * target_rms^2)).
-    D = np.sqrt(x.shape[axis])
-    x_rms = np.sqrt(np.sum(x * x, axis=axis, keepdims=True)) / D
-    x_rms[x_rms == 0] = 1.
-    return target_rms * x / x_rms
+  def __getstate__(self):
+    # only the path to the shared weights is pickled
+    states = dict(self.__dict__)
+    states['_weights'] = None
+    states['_biases'] = None
+    states['_buffers'] = None
+    return states
 
-  def _apply_dnn(self, X):
+  def __setstate__(self, states):
+    self.__dict__.update(states)
+
+  def _get_buffers(self):
+    """ Preallocated input and layers' outputs,
+    shape: (batch_size, n_dim) """
+    if self._buffers is None:
+      self._buffers = [np.empty(shape=(self.batch_size, w.shape[1])
+                                if i == 0 else
+                                (self.batch_size, self.weights[i - 1].shape[0]),
+                                dtype='float32')
+                       for i, w in enumerate(self.weights)]
+    return self._buffers
+
+  def _apply_dnn(self, X, out=None):
     assert X.shape[1] == self.weights[0].shape[1], \
     "Input must has dimension (?, %d) but given tensor with shape: %s" % \
-    (self.weights[0].shape[0], str(X.shape))
-    X = X.T
-    for wi, bi in zip(self.weights[:-1], self.biases[:-1]):
-      X = wi.dot(X) + bi
+    (self.weights[0].shape[1], str(X.shape))
+    n = X.shape[0]
+    buffers = self._get_buffers()
+    if n > self.batch_size:
+      raise ValueError("Given %d samples, larger than batch size: %d" %
+                       (n, self.batch_size))
+    if out is None:
+      out = np.empty(shape=(n, self.weights[-1].shape[0]), dtype='float32')
+    # the input is copied to the buffer, and casted to float32
+    if X is not buffers[0] and not np.may_share_memory(X, buffers[0]):
+      buffers[0][:n] = X
+    X = buffers[0][:n]
+    # X: (n, n_in), the weights: (n_out, n_in)
+    for i, (wi, bi) in enumerate(zip(self.weights[:-1], self.biases[:-1])):
+      y = buffers[i + 1][:n]
+      np.dot(X, wi.T, out=y)
+      y += bi
       # relu nonlinearity
-      np.maximum(X, 0, out=X)
+      np.maximum(y, 0, out=y)
       # scale the RMS
-      X = self._renorm_rms(X, axis=0)
+      self._renorm_rms(y, axis=1)
+      X = y
     # last layer, only linear
-    X = self.weights[-1].dot(X) + self.biases[-1]
-    return X.T
+    np.dot(X, self.weights[-1].T, out=out)
+    out += self.biases[-1]
+    return out
+
+  def _renorm_rms(self, x, target_rms=1.0, axis=1):
+    """ scales (inplace) the data such that RMS is 1.0 """
+    # scale = sqrt(x^t x / (D * target_rms^2)).
+    D = np.sqrt(x.shape[axis])
+    x_rms = np.sqrt(np.einsum('ij,ij->i', x, x) if axis == 1 else
+                    np.einsum('ij,ij->j', x, x)) / D
+    x_rms[x_rms == 0] = 1.
+    x_rms = target_rms / x_rms
+    x *= (x_rms[:, None] if axis == 1 else x_rms[None, :])
+    return x
+
+  def _forward(self, inputs):
+    """ Feed list of (prepared) inputs through the network, the
+    frames of all inputs are packed into `batch_size` GEMM batches,
+    return list of outputs of the same lengths """
+    lengths = [x.shape[0] for x in inputs]
+    y = np.empty(shape=(sum(lengths), self.weights[-1].shape[0]),
+                 dtype='float32')
+    X = self._get_buffers()[0]
+    n = 0 # number of frames in the input buffer
+    start = 0 # position of first buffered frame in the output
+    for x in inputs:
+      i = 0
+      while i < x.shape[0]:
+        k = min(self.batch_size - n, x.shape[0] - i)
+        X[n:n + k] = x[i:i + k]
+        n += k
+        i += k
+        if n == self.batch_size:
+          self._apply_dnn(X, out=y[start:start + n])
+          start += n
+          n = 0
+    if n > 0:
+      self._apply_dnn(X[:n], out=y[start:start + n])
+    return [o.astype(np.result_type(self._param_dtype, x.dtype), copy=False)
+            for o, x in zip(np.split(y, np.cumsum(lengths)[:-1], axis=0),
+                            inputs)]
+
+  def _transform(self, feat):
+    return self._forward([self._get_input(feat)])[0]
+
+  def transform_batch(self, feats):
+    """ Extract the bottleneck features for multiple utterances at once,
+    the SAD-filtered frames of all utterances are concatenated into large
+    batches, then the outputs are split back for each utterance.
+
+    Parameters
+    ----------
+    feats : list of dictionary
+      features of each utterance, must contain `input_name`
+
+    Return
+    ------
+    list of `numpy.ndarray` (the bottleneck features of each utterance)
+
+    Note
+    ----
+    `FeatureProcessor` calls `transform` for each job, call this method
+    directly to batch utterances.
+    """
+    return self._forward([self._get_input(f) for f in feats])
 
 class BNFExtractor(_BNFExtractorBase):
   """ Deep bottleneck feature extractor
@@ -1391,6 +1957,12 @@ class AcousticNorm(Extractor):
       raise ValueError("win_length must >= 3")
     self.win_length = win_length
 
+  @property
+  def required_features(self):
+    if self.sad_name is None:
+      return self.input_name
+    return self.input_name + (self.sad_name,)
+
   def _transform(self, feat):
     # ====== check SAD indices ====== #
     sad = None
@@ -1470,6 +2042,10 @@ class Read3ColSAD(Extractor):
       raise ValueError("`path` must be path to folder, or dictionary.")
     self._sad = sad
 
+  @property
+  def required_features(self):
+    return (self.input_name, self.ref_feat, 'sr')
+
   def _transform(self, feat):
     # ====== get ref name ====== #
     name = feat[self.input_name]
@@ -1527,6 +2103,10 @@ class ApplyingSAD(Extractor):
     self.smooth_window = int(smooth_window) if is_number(smooth_window) else None
     self.keep_unvoiced = bool(keep_unvoiced)
 
+  @property
+  def required_features(self):
+    return self.input_name + (self.sad_name,)
+
   def _transform(self, X):
     # ====== threshold sad to index ====== #
     sad = X[self.sad_name]
@@ -11,14 +11,15 @@ from __future__ import print_function, division, absolute_import
 
 import timeit
 import string
-from collections import OrderedDict, Iterator, Iterable, defaultdict, Mapping
+from collections import (OrderedDict, Iterator, Iterable, defaultdict,
+                         Mapping, Counter)
 from abc import abstractmethod, ABCMeta
-from six import add_metaclass, string_types
+from six import add_metaclass, string_types, text_type, PY2
 
 import numpy as np
+from scipy import sparse
 
 from odin.utils import as_tuple, Progbar, is_string, is_number
-from odin.stats import freqcount
 from multiprocessing import Pool, cpu_count
 
 from odin.preprocessing.signal import pad_sequences
@@ -116,16 +117,20 @@ class TransPreprocessor(TextPreprocessor):
   def __init__(self, old='!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n',
                new=' '):
     super(TransPreprocessor, self).__init__()
-    self.__str_trans = string.maketrans(old, new * len(old))
-    new = None if len(new) == 0 else unicode(new)
-    old = unicode(old)
+    if PY2:
+      self.__str_trans = string.maketrans(old, new * len(old))
+    else:
+      self.__str_trans = bytes.maketrans(old.encode('utf-8'),
+                                         (new * len(old)).encode('utf-8'))
+    new = None if len(new) == 0 else text_type(new)
+    old = text_type(old)
     self.__uni_trans = dict((ord(char), new) for char in old)
 
   def preprocess(self, text):
     if isinstance(text, (tuple, list)):
       text = ' '.join(text)
     # ====== translate the text ====== #
-    if isinstance(text, unicode):
+    if isinstance(text, text_type):
       text = text.translate(self.__uni_trans)
     else:
       text = text.translate(self.__str_trans)
@@ -296,6 +301,41 @@ def _preprocess_func(doc):
   return doc_tokens
 
 
+def _fit_func(docs):
+  """ Map step of the map-reduce fitting: tokenize a chunk of
+  documents and return only the partial statistics
+
+  Return
+  ------
+  (nb_docs, word_counts, word_docs, [longest_doc, longest_length])
+  """
+  vocabulary = globals()['__vocabulary']
+  word_counts = Counter()
+  word_docs = Counter()
+  longest = [[], 0]
+  for doc in docs:
+    doc = _preprocess_func(doc)
+    if vocabulary is not None:
+      doc = [token for token in doc if token in vocabulary]
+    word_counts.update(doc)
+    word_docs.update(set(doc))
+    if len(doc) > longest[-1]:
+      longest = [doc, len(doc)]
+  return len(docs), word_counts, word_docs, longest
+
+
+def _chunk_iter(texts, chunk_size):
+  """ Group an iterator of documents into lists of `chunk_size` """
+  chunk = []
+  for t in texts:
+    chunk.append(t)
+    if len(chunk) >= chunk_size:
+      yield chunk
+      chunk = []
+  if len(chunk) > 0:
+    yield chunk
+
+
 class Tokenizer(object):
 
   """
@@ -316,6 +356,11 @@ class Tokenizer(object):
       if 'word', order the dictionary by word frequency
       if 'doc', order the dictionary by docs frequency (i.e. the number
       of documents that the word appears in)
+  map_reduce: bool
+      if True and `engine='odin'`, `fit` is performed in map-reduce
+      fashion: each worker counts the tokens of a chunk of `batch_size`
+      documents, and only the partial counts are returned to the
+      main process for merging.
 
   Note
   ----
@@ -335,6 +380,7 @@ class Tokenizer(object):
                nb_processors=None,
                order='word',
                engine='odin',
+               map_reduce=True,
                print_progress=True):
     # ====== internal states ====== #
     if engine not in ('spacy', 'odin'):
@@ -344,6 +390,7 @@ class Tokenizer(object):
     self.__engine = engine
     self.__order = order
     self.__longest_document = ['', 0]
+    self.map_reduce = bool(map_reduce)
     self.print_progress = print_progress
     # ====== dictionary info ====== #
     self._nb_words = nb_words
@@ -357,6 +404,8 @@ class Tokenizer(object):
     # actual dictionary used for embedding
     self._word_dictionary = OrderedDict()
     self._word_dictionary_info = OrderedDict()
+    # cached inverse document frequency
+    self._idf = None
 
     self.stopwords = stopwords
     self.lemmatization = lemmatization
@@ -377,7 +426,8 @@ class Tokenizer(object):
     word_counts = self._word_counts.items() if self.__order == 'word' \
         else self._word_docs.items()
     # sorted by both attribute for deterministic dictionary
-    word_counts.sort(key=lambda x: (x[1], x[0]), reverse=True)
+    word_counts = sorted(word_counts, key=lambda x: (x[1], x[0]),
+                         reverse=True)
     # create the ordered dictionary
     word_dictionary = OrderedDict()
     word_dictionary_info = OrderedDict()
@@ -392,6 +442,7 @@ class Tokenizer(object):
       word_dictionary_info[i + 1] = (_, self._word_docs[w])
     self._word_dictionary = word_dictionary
     self._word_dictionary_info = word_dictionary_info
+    self._idf = None
     return word_dictionary
 
   def _validate_texts(self, texts):
@@ -403,7 +454,8 @@ class Tokenizer(object):
     if is_string(texts):
       texts = (texts,)
     # convert to unicode
-    texts = (t.decode('utf-8') for t in texts)
+    texts = (t.decode('utf-8') if isinstance(t, bytes) else t
+             for t in texts)
     return texts
 
   # ==================== properties ==================== #
@@ -503,21 +555,26 @@ class Tokenizer(object):
                 doc_tokens.append(char)
       yield nb_docs + 1, doc_tokens
 
-  def _preprocess_docs_odin(self, texts, vocabulary, keep_order):
-    # ====== main processing ====== #
+  def _create_pool(self, vocabulary=None):
     def initializer(filters, preprocessors,
-                    lang, lemma, charlevel, stopwords):
+                    lang, lemma, charlevel, stopwords, vocabulary):
       globals()['__preprocessors'] = preprocessors
       globals()['__filters'] = filters
       globals()['__lang'] = lang
       globals()['__lemma'] = lemma
       globals()['__charlevel'] = charlevel
       globals()['__stopwords'] = stopwords
+      globals()['__vocabulary'] = vocabulary
+    return Pool(processes=self.nb_processors, initializer=initializer,
+                initargs=(self.filters, self.preprocessors, self.language,
+                          self.lemmatization, self.char_level, self.stopwords,
+                          vocabulary))
+
+  def _preprocess_docs_odin(self, texts, vocabulary, keep_order):
+    # ====== main processing ====== #
     # add the index for ordering
     nb_docs = 0
-    pool = Pool(processes=self.nb_processors, initializer=initializer,
-                initargs=(self.filters, self.preprocessors, self.language,
-                          self.lemmatization, self.char_level, self.stopwords))
+    pool = self._create_pool()
     # return the tokenized documents as original order.
     if keep_order:
       it = pool.imap(func=_preprocess_func, iterable=texts,
@@ -535,26 +592,40 @@ class Tokenizer(object):
     pool.close()
     pool.join()
 
-  def fit(self, texts, vocabulary=None):
-    """
-    Parameters
-    ----------
-    texts: iterator of unicode
-        iterator, generator or list (e.g. [u'a', u'b', ...])
-        of unicode documents.
-    """
-    texts = self._validate_texts(texts)
+  def _fit_docs_mapreduce(self, texts, vocabulary, prog):
+    """ Workers count tokens on chunks of documents, then the partial
+    `Counter`s are merged (reduced) in the main process """
     word_counts = self._word_counts
     word_docs = self._word_docs
-    # ====== pick engine ====== #
-    if self.__engine == 'spacy':
-      processor = self._preprocess_docs_spacy
-    elif self.__engine == 'odin':
-      processor = self._preprocess_docs_odin
-    # ====== start processing ====== #
-    prog = Progbar(target=1208, name="Fitting tokenizer",
-                   print_report=True, print_summary=True)
-    start_time = timeit.default_timer()
+    nb_docs = 0
+    pool = self._create_pool(vocabulary)
+    it = pool.imap_unordered(func=_fit_func,
+                             iterable=_chunk_iter(texts, self.batch_size),
+                             chunksize=1)
+    for n, counts, docs, longest in it:
+      nb_docs += n
+      # ====== reduce ====== #
+      for token, c in counts.items():
+        word_counts[token] += c
+      for token, c in docs.items():
+        word_docs[token] += c
+      if longest[-1] > self.__longest_document[-1]:
+        self.__longest_document = longest
+      # print progress
+      prog['#Doc'] = nb_docs
+      prog['#Tok'] = len(word_counts)
+      prog.add(n)
+      while prog.seen_so_far >= 0.8 * prog.target:
+        prog.target = 1.2 * prog.target
+    pool.close()
+    pool.join()
+    return nb_docs
+
+  def _fit_docs(self, processor, texts, vocabulary, prog):
+    """ Tokens are counted one-by-one in the main process """
+    word_counts = self._word_counts
+    word_docs = self._word_docs
+    nb_docs = 0
     for nb_docs, doc in processor(texts, vocabulary, keep_order=False):
       total_docs_tokens = 0
       seen_words = {}
@@ -575,6 +646,32 @@ class Tokenizer(object):
       prog.add(1)
       if prog.seen_so_far >= 0.8 * prog.target:
         prog.target = 1.2 * prog.target
+    return nb_docs
+
+  def fit(self, texts, vocabulary=None):
+    """
+    Parameters
+    ----------
+    texts: iterator of unicode
+        iterator, generator or list (e.g. [u'a', u'b', ...])
+        of unicode documents.
+    """
+    texts = self._validate_texts(texts)
+    word_counts = self._word_counts
+    # ====== start processing ====== #
+    prog = Progbar(target=1208, name="Fitting tokenizer",
+                   print_report=True, print_summary=True)
+    start_time = timeit.default_timer()
+    # ====== pick engine ====== #
+    if self.__engine == 'spacy':
+      nb_docs = self._fit_docs(self._preprocess_docs_spacy,
+                               texts, vocabulary, prog)
+    elif self.__engine == 'odin':
+      if self.map_reduce:
+        nb_docs = self._fit_docs_mapreduce(texts, vocabulary, prog)
+      else:
+        nb_docs = self._fit_docs(self._preprocess_docs_odin,
+                                 texts, vocabulary, prog)
     # ====== print summary of the process ====== #
     # if self.print_progress:
     #     prog.target = nb_docs; prog.update(nb_docs)
@@ -587,27 +684,7 @@ class Tokenizer(object):
     return self
 
   # ==================== transforming odin ==================== #
-  def transform(self, texts, mode='seq', dtype='int32',
-                padding='pre', truncating='pre', value=0.,
-                end_document=None, maxlen=None,
-                token_not_found='ignore'):
-    """
-    Parameters
-    ----------
-    texts: iterator of unicode
-        iterator, generator or list (e.g. [u'a', u'b', ...])
-        of unicode documents.
-    mode: 'binary', 'tfidf', 'count', 'freq', 'seq'
-        'binary', abc
-        'tfidf', abc
-        'count', abc
-        'freq', abc
-        'seq', abc
-    token_not_found: 'ignore', 'raise', a token string, an integer
-        pass
-    """
-    # ====== check arguments ====== #
-    texts = self._validate_texts(texts)
+  def _check_transform_args(self, mode, end_document, token_not_found):
     # ====== check mode ====== #
     mode = str(mode)
     if mode not in ('seq', 'binary', 'count', 'freq', 'tfidf'):
@@ -624,6 +701,16 @@ class Tokenizer(object):
       token_not_found = int(self.dictionary[token_not_found])
     elif is_number(token_not_found):
       token_not_found = int(token_not_found)
+    # ====== preprocess arguments ====== #
+    if isinstance(end_document, str):
+      end_document = self.dictionary.index(end_document)
+    elif is_number(end_document):
+      end_document = int(end_document)
+    return mode, end_document, token_not_found
+
+  def _transform_docs(self, texts, end_document, token_not_found):
+    """ Yield the list of token indices for each document (in the
+    original order of `texts`) """
     # ====== pick engine ====== #
     if self.__engine == 'spacy':
       processor = self._preprocess_docs_spacy
@@ -631,12 +718,6 @@ class Tokenizer(object):
       processor = self._preprocess_docs_odin
     # ====== Initialize variables ====== #
     dictionary = self.dictionary
-    results = []
-    # ====== preprocess arguments ====== #
-    if isinstance(end_document, str):
-      end_document = dictionary.index(end_document)
-    elif is_number(end_document):
-      end_document = int(end_document)
     # ====== processing ====== #
     if hasattr(texts, '__len__'):
       target_len = len(texts)
@@ -662,17 +743,82 @@ class Tokenizer(object):
       # append ending document token
       if end_document is not None:
         vec.append(end_document)
-      # add the final results
-      results.append(vec)
+      # return the final results
+      yield vec
       # print progress
       if self.print_progress:
         prog['#Docs'] = nb_docs
         prog.add(1)
         if auto_adjust_len and prog.seen_so_far >= 0.8 * prog.target:
           prog.target = 1.2 * prog.target
-    # end the process
-    # if self.print_progress and auto_adjust_len:
-    #     prog.target = nb_docs; prog.update(nb_docs)
+
+  @property
+  def idf(self):
+    """ Inverse document frequency vector of shape `[nb_words]`,
+    `idf[i] = log(1 + nb_docs / (1 + docs_freq[i]))` """
+    if self._idf is None or len(self._idf) != self.nb_words:
+      docs_freq = np.zeros(shape=(self.nb_words,), dtype='float64')
+      for tok, (_, n) in self._word_dictionary_info.items():
+        if tok < len(docs_freq):
+          docs_freq[tok] = n
+      self._idf = np.log(1 + self.nb_docs / (1 + docs_freq))
+    return self._idf
+
+  def _bow_matrix(self, results, mode, dtype):
+    """ Convert list of token indices into `scipy.sparse.csr_matrix`
+    of shape `[len(results), nb_words]` """
+    nb_docs = len(results)
+    lengths = np.array([len(seq) for seq in results], dtype='int64')
+    indices = (np.concatenate(results).astype('int64')
+               if lengths.sum() > 0 else
+               np.empty(shape=(0,), dtype='int64'))
+    rows = np.repeat(np.arange(nb_docs, dtype='int64'), lengths)
+    # duplicated (row, column) are summed up during conversion
+    X = sparse.coo_matrix(
+        (np.ones(shape=(len(indices),), dtype='float64'), (rows, indices)),
+        shape=(nb_docs, self.nb_words)).tocsr()
+    X.sum_duplicates()
+    if mode == 'binary':
+      X.data[:] = 1
+    elif mode == 'freq':
+      X.data /= np.repeat(lengths, np.diff(X.indptr))
+    elif mode == 'count':
+      pass
+    elif mode == 'tfidf':
+      X.data = (1 + np.log(X.data)) * self.idf[X.indices]
+    return X.astype(dtype)
+
+  def transform(self, texts, mode='seq', dtype='int32',
+                padding='pre', truncating='pre', value=0.,
+                end_document=None, maxlen=None,
+                token_not_found='ignore', sparse_output=False,
+                matrix_dtype='float64'):
+    """
+    Parameters
+    ----------
+    texts: iterator of unicode
+        iterator, generator or list (e.g. [u'a', u'b', ...])
+        of unicode documents.
+    mode: 'binary', 'tfidf', 'count', 'freq', 'seq'
+        'binary', abc
+        'tfidf', abc
+        'count', abc
+        'freq', abc
+        'seq', abc
+    token_not_found: 'ignore', 'raise', a token string, an integer
+        pass
+    sparse_output: bool
+        only for 'binary', 'tfidf', 'count', 'freq' mode, if True,
+        return `scipy.sparse.csr_matrix`, otherwise, dense `numpy.ndarray`
+    matrix_dtype: numpy dtype
+        dtype of the returned matrix for 'binary', 'tfidf', 'count',
+        'freq' mode
+    """
+    # ====== check arguments ====== #
+    texts = self._validate_texts(texts)
+    mode, end_document, token_not_found = self._check_transform_args(
+        mode, end_document, token_not_found)
+    results = list(self._transform_docs(texts, end_document, token_not_found))
     # ====== pad the sequence ====== #
     # just transform into sequence of tokens
     if mode == 'seq':
@@ -683,29 +829,42 @@ class Tokenizer(object):
                               value=value)
     # transform into one-hot matrix
     else:
-      X = np.zeros(shape=(len(results), self.nb_words))
-      for i, seq in enumerate(results):
-        if mode == 'binary':
-          X[i, seq] = 1
-        elif mode == 'freq':
-          length = len(seq)
-          count = freqcount(seq)
-          for tok, n in count.items():
-            X[i, tok] = n / float(length)
-        elif mode == 'count':
-          count = freqcount(seq)
-          for tok, n in count.items():
-            X[i, tok] = n
-        elif mode == 'tfidf':
-          count = freqcount(seq)
-          for tok, n in count.items():
-            tf = 1 + np.log(n)
-            docs_freq = self._word_dictionary_info.get(tok, (0, 0))[-1]
-            idf = np.log(1 + self.nb_docs / (1 + docs_freq))
-            X[i, tok] = tf * idf
-      results = X
+      results = self._bow_matrix(results, mode, matrix_dtype)
+      if not sparse_output:
+        results = results.toarray()
     return results
 
+  def transform_sparse(self, texts, mode='tfidf', chunk_size=8192,
+                       matrix_dtype='float32', end_document=None,
+                       token_not_found='ignore'):
+    """ Streaming version of `transform` for 'binary', 'tfidf', 'count',
+    'freq' mode, iterate over `texts` and yield
+    `scipy.sparse.csr_matrix` of at most `chunk_size` documents.
+
+    Parameters
+    ----------
+    texts: iterator of unicode
+        iterator, generator or list (e.g. [u'a', u'b', ...])
+        of unicode documents.
+    mode: 'binary', 'tfidf', 'count', 'freq'
+        type of bag-of-words representation
+    chunk_size: int
+        maximum number of documents (i.e. rows) in each returned block
+    matrix_dtype: numpy dtype
+        dtype of the returned matrices
+    """
+    texts = self._validate_texts(texts)
+    mode, end_document, token_not_found = self._check_transform_args(
+        mode, end_document, token_not_found)
+    if mode == 'seq':
+      raise ValueError('`transform_sparse` only support "binary", '
+                       '"count", "freq", or "tfidf" mode.')
+    chunk_size = int(chunk_size)
+    for results in _chunk_iter(
+        self._transform_docs(texts, end_document, token_not_found),
+        chunk_size):
+      yield self._bow_matrix(results, mode, matrix_dtype)
+
   def embed(self, vocabulary, dtype='float32',
             token_not_found='ignore'):
     """Any word not found in the vocabulary will be set to all-zeros"""
@@ -121,6 +121,15 @@ class Callback(object):
     self._log = bool(is_enable)
     return self
 
+  @property
+  def history_keys(self):
+    """ Name of the outputs which all values of each epoch are read by
+    this callback (i.e. from the results of `epoch_end` or `task_end`),
+    `None` means any output could be read. The `Task` only keeps
+    all values of these outputs, the others are summarized by
+    streaming reducers. """
+    return ()
+
   def batch_start(self, task, batch):
     pass
 
@@ -179,6 +188,16 @@ class CallbackList(Callback):
       cb.set_notification(is_enable)
     return self
 
+  @property
+  def history_keys(self):
+    keys = []
+    for cb in self._callbacks:
+      k = cb.history_keys
+      if k is None:
+        return None
+      keys += list(k)
+    return tuple(sorted(set(keys)))
+
   def __str__(self):
     return '<CallbackList: ' + \
     ', '.join([i.__class__.__name__ for i in self._callbacks]) + '>'
@@ -239,6 +258,10 @@ class Debug(Callback):
     if signal is None:
       pass
 
+  @property
+  def history_keys(self):
+    return None
+
   def batch_start(self, task, batch):
     print("Batch Start:", task.name, task.curr_epoch, task.curr_samples,
           [(i.shape, i.dtype, type(i)) for i in batch])
@@ -312,6 +335,13 @@ class LambdaCallback(Callback):
     assert isinstance(signal, TaskSignal)
     self.signal = signal
 
+  @property
+  def history_keys(self):
+    if self.n_args == 2 and \
+    self.signal in (TaskSignal.EpochEnd, TaskSignal.TaskEnd):
+      return None
+    return ()
+
   def _call_fn(self, task, data):
     if self.n_args == 0:
       return self.fn()
@@ -450,6 +480,10 @@ class CheckpointGeneralization(Callback):
     assert self._improvement_margin >= 0
     self._best_score = None
 
+  @property
+  def history_keys(self):
+    return (self._output_name,)
+
   def epoch_end(self, task, epoch_results):
     if task.name != self._task_name:
       return None
@@ -550,6 +584,10 @@ class EarlyStop(Callback):
     # ====== history ====== #
     self._history = []
 
+  @property
+  def history_keys(self):
+    return (self._output_name,)
+
   # ==================== main callback methods ==================== #
   def epoch_end(self, task, epoch_results):
     if self._task_name != task.name:
@@ -752,6 +790,10 @@ class EpochSummary(Callback):
     self.print_plot = bool(print_plot)
     self.save_path = save_path
 
+  @property
+  def history_keys(self):
+    return self.output_name
+
   def epoch_end(self, task, epoch_results):
     output_name = self.output_name
     if len(output_name) == 0: # nothing to do
@@ -5,7 +5,10 @@ import os
 import re
 import shutil
 import pickle
+import threading
+import traceback
 from itertools import chain
+from six.moves.queue import Queue
 from collections import defaultdict, OrderedDict
 from six.moves import range, zip, cPickle
 
@@ -100,15 +103,18 @@ class Task(object):
                verbose=2):
     super(Task, self).__init__()
     self.set_func(func, data)
-    # this Progbar will record the history as well
+    # this Progbar will record the history as well, only the outputs
+    # read by the callbacks keep all values of each epoch
     self._labels = [str(l) for l in labels] \
         if labels is not None else None
     self._progbar = Progbar(target=self.nb_samples, name=name,
                             interval=0.,
-                            print_report=True, print_summary=True)
+                            print_report=True, print_summary=True,
+                            keep_history=False)
     self._progbar.set_labels(self._labels)
     # ====== set callback and verbose ====== #
     self._callback = CallbackList(callbacks)
+    self._set_history_keys()
     self.set_verbose(verbose)
     # ====== assign other arguments ====== #
     self._nb_epoch = epoch
@@ -163,12 +169,23 @@ class Task(object):
 
   def set_callbacks(self, callbacks):
     self._callback.set_callbacks(callbacks)
+    self._set_history_keys()
     if self._verbose == 0:
       self._callback.set_notification(False)
     else:
       self._callback.set_notification(True)
     return self
 
+  def _set_history_keys(self):
+    """ All values of each epoch are kept for the outputs read by the
+    callbacks, the other outputs (e.g. confusion matrices) are
+    summarized by streaming reducers """
+    keys = self._callback.history_keys
+    # unknown, keep everything
+    self._progbar.set_keep_history(keys is None)
+    for key in () if keys is None else keys:
+      self._progbar.set_reducer(key, 'history')
+
   def set_verbose(self, verbose):
     verbose = int(verbose)
     self._verbose = verbose
@@ -530,6 +547,89 @@ class Timer(object):
         return True
     return False
 
+# ===========================================================================
+# Checkpoint
+# ===========================================================================
+def _write_checkpoint(path, nnops, snapshot, history, remove_path):
+  """ Write the same folder structure as `odin.nnet.serialize`,
+  everything is written to a temporary folder, then renamed to `path` """
+  tmp_path = path + '.tmp'
+  if os.path.exists(tmp_path):
+    shutil.rmtree(tmp_path)
+  os.mkdir(tmp_path)
+  with open(os.path.join(tmp_path, 'nnops.ai'), 'wb') as f:
+    f.write(nnops)
+  if snapshot is not None:
+    K.write_snapshot(snapshot, os.path.join(tmp_path, 'variables'))
+  # ====== replace old checkpoint ====== #
+  if os.path.exists(path):
+    old_path = path + '.old'
+    if os.path.exists(old_path):
+      shutil.rmtree(old_path)
+    os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path)
+  else:
+    os.rename(tmp_path, path)
+  # ====== history ====== #
+  if history is not None:
+    with open(path + '.hist.tmp', 'wb') as f:
+      f.write(history)
+    os.rename(path + '.hist.tmp', path + '.hist')
+  # ====== remove outdated checkpoint ====== #
+  if remove_path is not None and os.path.exists(remove_path):
+    shutil.rmtree(remove_path)
+
+class _CheckpointWriter(object):
+  """ Execute the writing jobs in order on a background thread,
+  if `max_pending` jobs are waiting, `submit` blocks the
+  training thread until one is finished. """
+
+  def __init__(self, max_pending=2):
+    self._queue = Queue(maxsize=max(int(max_pending), 1))
+    self._thread = None
+    self._error = None
+
+  def _run(self):
+    while True:
+      job = self._queue.get()
+      try:
+        if job is None:
+          break
+        func, args = job
+        func(*args)
+      except Exception as e:
+        self._error = traceback.format_exc()
+      finally:
+        self._queue.task_done()
+
+  def _check_error(self):
+    if self._error is not None:
+      error, self._error = self._error, None
+      raise RuntimeError("Error writing checkpoint:\n%s" % error)
+
+  def submit(self, func, *args):
+    self._check_error()
+    if self._thread is None or not self._thread.is_alive():
+      self._thread = threading.Thread(target=self._run,
+                                      name='CheckpointWriter')
+      self._thread.daemon = True
+      self._thread.start()
+    self._queue.put((func, args))
+
+  def join(self):
+    """ Wait for all pending checkpoints to be written """
+    if self._thread is not None and self._thread.is_alive():
+      self._queue.join()
+    self._check_error()
+
+  def close(self):
+    self.join()
+    if self._thread is not None and self._thread.is_alive():
+      self._queue.put(None)
+      self._thread.join()
+    self._thread = None
+
 class MainLoop(object):
   """
   Parameters
@@ -583,6 +683,8 @@ class MainLoop(object):
     self._save_variables = []
     self._best_object = None
     self._save_history = True
+    self._checkpoint_writer = _CheckpointWriter(max_pending=2)
+    self._async_checkpoint = True
     # ====== maximum stored checkpoint ====== #
     self._checkpoint_increasing = True
     self._checkpoint_max = -1
@@ -612,7 +714,7 @@ class MainLoop(object):
 
   def set_checkpoint(self, path=None, obj=None, variables=[],
                      increasing=True, max_checkpoint=-1,
-                     save_history=None):
+                     save_history=None, async_write=True, max_pending=2):
     """ If `path` and `obj` given, the `obj` will be pickled
     at `path` for every checkpoint, otherwise, store the
     best values of `variables` in RAM
@@ -634,7 +736,19 @@ class MainLoop(object):
 
     max_checkpoint : int (default: 3)
         pass
+
+    async_write : bool (default: True)
+        if True, the variables are snapshot on the training thread,
+        then written to disk by a background thread, each checkpoint
+        is written to a temporary folder and renamed when finished.
+
+    max_pending : int (default: 2)
+        maximum number of checkpoints waiting to be written,
+        the training is blocked if this limit is reached.
     """
+    self._async_checkpoint = bool(async_write)
+    self._checkpoint_writer.join()
+    self._checkpoint_writer = _CheckpointWriter(max_pending=max_pending)
     self._save_path = path
     self._save_obj = obj
     if variables is not None:
@@ -824,6 +938,16 @@ class MainLoop(object):
     return self
 
   # ==================== logic ==================== #
+  def _get_checkpoint_variables(self):
+    """ Same variables as saved by `odin.nnet.serialize` """
+    variables = []
+    for op in as_tuple(self._save_obj):
+      if hasattr(op, 'variables'):
+        for v in as_tuple(op.variables):
+          if K.is_variable(v):
+            variables.append(v)
+    return list(set(variables + list(self._save_variables)))
+
   def _save(self, is_best):
     is_best = bool(is_best)
     # trigger event for callbacks
@@ -832,47 +956,49 @@ class MainLoop(object):
                          TrainSignal.SAVE)
     # ====== save the model to hard drive ====== #
     if self._save_path is not None:
+      remove_path = None
       # serialize the best model to disk
       if is_best:
         final_save_path = self._save_path
-        N.serialize(nnops=self._save_obj, path=self._save_path,
-                    save_variables=True, variables=self._save_variables,
-                    binary_output=False, override=True)
       # not the best model saved, just periodically saving
       else:
         final_save_path = self._save_path + '.%d' % self._current_checkpoint_count
-        N.serialize(nnops=self._save_obj,
-                    path=final_save_path,
-                    save_variables=True, variables=self._save_variables,
-                    binary_output=False, override=True)
         self._current_checkpoint_count += 1
         if self._checkpoint_max > 1 and self._current_checkpoint_count > self._checkpoint_max:
-          shutil.rmtree(
-              self._save_path + '.%d' %
-              (self._current_checkpoint_count - self._checkpoint_max - 1))
+          remove_path = self._save_path + '.%d' % \
+              (self._current_checkpoint_count - self._checkpoint_max - 1)
+      # only fast in-memory copy on the training thread
+      nnops = cPickle.dumps(self._save_obj, protocol=cPickle.HIGHEST_PROTOCOL)
+      variables = self._get_checkpoint_variables()
+      snapshot = K.snapshot_variables(variables) \
+          if len(variables) > 0 else None
+      history = pickle.dumps(self.history) if self._save_history else None
+      # writing to disk
+      if self._async_checkpoint:
+        self._checkpoint_writer.submit(_write_checkpoint, final_save_path,
+                                       nnops, snapshot, history, remove_path)
+      else:
+        _write_checkpoint(final_save_path, nnops, snapshot, history,
+                          remove_path)
       # print the log
       self._show_noti("[%s] Creating %scheckpoint at: %s" %
                       (ctext('MainLoop', 'red'),
                        ctext('[best]', 'yellow') if is_best else '',
                        final_save_path))
-      # save history
       if self._save_history:
-        with open(final_save_path + '.hist', 'wb') as f:
-          pickle.dump(self.history, f)
         self._show_noti("[%s] Save history at: %s" %
                         (ctext('MainLoop', 'red'),
                          final_save_path + '.hist'))
-    # ====== store the object directly in RAM (only for the best) ====== #
+    # ====== store the variables directly in RAM (only for the best) ====== #
     elif bool(is_best) and \
     (self._save_obj is not None or len(self._save_variables) > 0):
-      del self._best_object
-      self._best_object = N.serialize(
-          self._save_obj, path=None, save_variables=True,
-          variables=self._save_variables, binary_output=True)
-      mem_size = sum(len(v) for k, v in self._best_object.items()) / 1024 / 1024
-      self._show_noti(
-          "[%s] Creating dynamic checkpoint in RAM using %.2f (megabytes)" %
-          (ctext('MainLoop', 'red'), mem_size))
+      variables = self._get_checkpoint_variables()
+      if len(variables) > 0:
+        del self._best_object
+        self._best_object = K.snapshot_variables(variables)
+        self._show_noti(
+            "[%s] Creating dynamic checkpoint in RAM using %.2f (megabytes)" %
+            (ctext('MainLoop', 'red'), self._best_object.nbytes / 1024 / 1024))
 
   def _rollback(self, is_final=False):
     # TODO: update rollback mechanism
@@ -880,6 +1006,8 @@ class MainLoop(object):
       return
     # trigger event for callbacks
     self._callback.event(TrainSignal.ROLLBACK)
+    # all pending checkpoints must be written before restoring
+    self._checkpoint_writer.join()
     # default rollback procedure
     if self._save_path is not None and os.path.exists(self._save_path):
       self._show_noti("[%s] Rollback from: %s" %
@@ -890,8 +1018,7 @@ class MainLoop(object):
     elif self._best_object is not None:
       self._show_noti("[%s] Rollback to the best stored object from RAM" %
                       (ctext('MainLoop', 'red')))
-      N.deserialize(path_or_data=self._best_object,
-                    force_restore_vars=True)
+      K.restore_snapshot(self._best_object)
 
   def _run(self):
     if self._main_task is None and len(self._evaltask) == 0:
@@ -977,6 +1104,7 @@ class MainLoop(object):
     try:
       self._run()
     finally:
+      self._checkpoint_writer.close()
       try:
         import curses
         curses.echo()
@@ -27,10 +27,6 @@ from six.moves import cPickle
 from six.moves.urllib.request import urlopen
 from six.moves.urllib.error import URLError, HTTPError
 
-try:
-  from numba import jit, autojit, vectorize, guvectorize
-except:
-  pass
 import numpy
 
 from odin.utils.progbar import Progbar, add_notification
@@ -38,13 +34,26 @@ from odin.utils.path_utils import *
 from odin.utils.cache_utils import *
 from odin.utils.python_utils import *
 from odin.utils.np_utils import *
-from odin.utils.mpi import segment_list, SharedCounter, async, async_mpi, MPI
-from odin.utils.crypto import md5_checksum
 
-from odin.utils import mpi
 from odin.utils import shape_calculation
 from odin.utils import decorators
-from odin.utils import crypto
+
+# submodules with heavy dependencies (multiprocessing, scipy, numba)
+# are only imported when one of their attributes is first accessed
+lazy_import(__name__, {
+    'mpi': 'odin.utils.mpi',
+    'crypto': 'odin.utils.crypto',
+    'segment_list': 'odin.utils.mpi:segment_list',
+    'SharedCounter': 'odin.utils.mpi:SharedCounter',
+    'async': 'odin.utils.mpi:async',
+    'async_mpi': 'odin.utils.mpi:async_mpi',
+    'MPI': 'odin.utils.mpi:MPI',
+    'md5_checksum': 'odin.utils.crypto:md5_checksum',
+    'jit': 'numba:jit',
+    'autojit': 'numba:autojit',
+    'vectorize': 'numba:vectorize',
+    'guvectorize': 'numba:guvectorize',
+})
 
 def array_size(arr):
   """ Return size of an numpy.ndarray in bytes """
@@ -7,6 +7,8 @@ from __future__ import print_function, division, absolute_import
 import sys
 import time
 import inspect
+import weakref
+import threading
 from numbers import Number
 from datetime import datetime
 from contextlib import contextmanager
@@ -56,12 +58,28 @@ _NUMBERS_CH = {
 # Helper
 # ===========================================================================
 _LAST_UPDATED_PROG = [None]
+# checking these types is much faster than the abstract `Number`
+_SCALARS = (int, float, np.integer, np.floating)
 
 def add_notification(msg):
   msg = _CYAN + "[%s]Notification:" % \
       datetime.now().strftime('%d/%b-%H:%M:%S') + _RESET + msg + ''
   _tqdm.write(msg)
 
+def _background_render(ref, stop, interval):
+  """ Loop of the background renderer, `ref` is a weak reference to
+  the Progbar, hence, the thread never keeps it alive """
+  while not stop.wait(interval):
+    prog = ref()
+    if prog is None:
+      break
+    with prog._render_lock:
+      # the end of epoch is always rendered by the training loop
+      seen_so_far = prog.seen_so_far
+      if seen_so_far < prog.target and prog._should_render(seen_so_far):
+        prog._render()
+    del prog
+
 class _FuncWrap(object):
 
   def __init__(self, func, default_func=lambda x: x):
@@ -86,6 +104,126 @@ class _FuncWrap(object):
 def _default_dict_list_creator():
   return defaultdict(list)
 
+# ===========================================================================
+# Streaming reducers
+# ===========================================================================
+class _StreamingMean(object):
+  """ Running mean and variance (Welford's algorithm), element-wise
+  for arrays, the summary is the mean """
+
+  def __init__(self):
+    self.count = 0
+    self.mean = 0.
+    self.m2 = 0.
+
+  def add(self, value):
+    if not isinstance(value, _SCALARS):
+      value = np.asarray(value, dtype='float64')
+    self.count += 1
+    delta = value - self.mean
+    self.mean = self.mean + delta / self.count
+    self.m2 = self.m2 + delta * (value - self.mean)
+
+  @property
+  def var(self):
+    return self.m2 / max(self.count, 1)
+
+  @property
+  def std(self):
+    return np.sqrt(self.var)
+
+  def summary(self):
+    return self.mean
+
+class _StreamingSum(object):
+  """ Running sum of count-like values (e.g. confusion matrices) """
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0
+
+  def add(self, value):
+    self.count += 1
+    if isinstance(value, np.ndarray) and \
+    isinstance(self.total, np.ndarray) and \
+    np.can_cast(value.dtype, self.total.dtype, casting='same_kind'):
+      self.total += value
+    else: # first value, or need upcasting
+      self.total = self.total + value
+
+  def summary(self):
+    return self.total
+
+class _Reservoir(object):
+  """ Uniform sample of at most `size` numbers (Algorithm R), the
+  summary is the given `percentiles` of the sample """
+
+  def __init__(self, size=1024, percentiles=(5, 50, 95), seed=5218):
+    self.size = int(size)
+    self.percentiles = tuple(percentiles)
+    self.count = 0
+    self.sample = []
+    self._rng = np.random.RandomState(seed)
+
+  def add(self, value):
+    self.count += 1
+    if len(self.sample) < self.size:
+      self.sample.append(float(value))
+    else:
+      i = self._rng.randint(0, self.count)
+      if i < self.size:
+        self.sample[i] = float(value)
+
+  def percentile(self, q):
+    return np.percentile(self.sample, q)
+
+  def summary(self):
+    return self.percentile(self.percentiles)
+
+class _LastValue(object):
+  """ Only keep the last value """
+
+  def __init__(self):
+    self.count = 0
+    self.value = None
+
+  def add(self, value):
+    self.count += 1
+    self.value = value
+
+  def summary(self):
+    return self.value
+
+class _History(object):
+  """ Full retention, every value is appended to the given list """
+
+  def __init__(self, values):
+    self.values = values
+
+  def add(self, value):
+    self.values.append(value)
+
+  @property
+  def count(self):
+    return len(self.values)
+
+  def summary(self):
+    values = self.values
+    # very heuristic way to deal with sequence of numbers
+    if isinstance(values[0], Number):
+      return np.mean(values)
+    # numpy array
+    elif isinstance(values[0], np.ndarray):
+      return sum(v for v in values)
+    return None
+
+_REDUCERS = {
+    'mean': _StreamingMean,
+    'sum': _StreamingSum,
+    'reservoir': _Reservoir,
+    'last': _LastValue,
+}
+
 # ===========================================================================
 # Progress bar
 # ===========================================================================
@@ -103,6 +241,11 @@ class Progbar(object):
   interval: float
       Minimum progress display update interval, in seconds.
 
+  percent: {float, None}
+      Minimum progress (in percentage points) between two display
+      updates, by default, no constraint for terminal, and 10 for
+      non-TTY output.
+
   keep: bool
       whether to keep the progress bar when the epoch finished
 
@@ -127,6 +270,25 @@ class Progbar(object):
   name: str or None
       specific name for the progress bar
 
+  keep_history: bool
+      if True, every reported value of every key is stored in `history`,
+      otherwise, only keys given to `set_summarizer` or
+      `set_reducer(key, 'history')` are fully retained, the other keys
+      are summarized by streaming reducers with constant memory
+      (running mean for numbers, running sum for arrays, and the last
+      value for other objects).
+
+  tty: {bool, None}
+      if False, the progress bar is replaced by periodic single-line
+      log records (without carriage returns), suitable for the log file
+      of nohup or cluster jobs. If None, `isatty` of `Progbar.FP`
+      is checked.
+
+  background: bool
+      if True, the progress bar and the report are rendered by a
+      background thread, `add` only updates the counters, so the
+      formatting never runs on the training loop.
+
   Examples
   --------
   >>> import numpy as np
@@ -137,6 +299,8 @@ class Progbar(object):
 
   Note
   ----
+  The streaming reducers only keep the summary of each epoch, hence,
+  use `keep_history=True` if the callbacks need every batch values.
   Some special case:
       * any report key contain "confusionmatrix" will be printed out using
       `print_confusion`
@@ -147,7 +311,8 @@ class Progbar(object):
   def __init__(self, target, interval=0.08, keep=False,
                print_progress=True, print_report=True, print_summary=False,
                count_func=None, report_func=None, progress_func=None,
-               name=None):
+               name=None, keep_history=False,
+               percent=None, tty=None, background=False):
     self.__pb = None # tqdm object
     if isinstance(target, Number):
       self.target = int(target)
@@ -173,12 +338,29 @@ class Progbar(object):
     self.print_progress = bool(print_progress)
     self.print_report = bool(print_report)
     self.print_summary = bool(print_summary)
+    # ====== rendering ====== #
+    if tty is None:
+      tty = hasattr(Progbar.FP, 'isatty') and Progbar.FP.isatty()
+    self._tty = bool(tty)
+    if percent is None:
+      percent = 0. if self._tty else 10.
+    self._percent = float(percent)
+    self._background = bool(background)
+    self._rendered_so_far = 0 # progress shown by the last rendering
+    self._render_lock = threading.RLock()
+    self._renderer = None # background thread
+    self._renderer_stop = None
     # ====== for history ====== #
     self._report = OrderedDict()
     self._last_report = None
     self._last_print_time = None
     self._epoch_summarizer_func = {}
     # ====== recording history ====== #
+    self._keep_history = bool(keep_history)
+    # mapping: key -> reducer name or factory
+    self._reducers = {}
+    # dictonary: {epoch_id: {key: reducer}}
+    self._epoch_reducers = defaultdict(dict)
     # dictonary: {epoch_id: {key: [value1, value2, ...]}}
     self._epoch_hist = defaultdict(_default_dict_list_creator)
     self._epoch_summary = defaultdict(dict)
@@ -200,14 +382,45 @@ class Progbar(object):
     # ====== other ====== #
     self._labels = None # labels for printing the confusion matrix
 
+  def __getstate__(self):
+    states = dict(self.__dict__)
+    states['_render_lock'] = None
+    states['_renderer'] = None
+    states['_renderer_stop'] = None
+    return states
+
+  def __setstate__(self, states):
+    self.__dict__.update(states)
+    self._render_lock = threading.RLock()
+
   # ==================== History management ==================== #
   def __getitem__(self, key):
     return self._report.__getitem__(key)
 
   def __setitem__(self, key, val):
-    self._epoch_hist[self.epoch_idx][key].append(val)
+    reducers = self._epoch_reducers[self._epoch_idx]
+    if key not in reducers:
+      reducers[key] = self._create_reducer(key, val)
+    reducers[key].add(val)
     return self._report.__setitem__(key, val)
 
+  def _create_reducer(self, key, val):
+    name = self._reducers.get(key, None)
+    if name is None:
+      if self._keep_history or key in self._epoch_summarizer_func:
+        name = 'history'
+      elif isinstance(val, Number):
+        name = 'mean'
+      elif isinstance(val, np.ndarray):
+        name = 'sum'
+      else:
+        name = 'last'
+    if name == 'history':
+      return _History(self._epoch_hist[self._epoch_idx][key])
+    if name in _REDUCERS:
+      return _REDUCERS[name]()
+    return name()
+
   def __delitem__(self, key):
     return self._report.__delitem__(key)
 
@@ -266,10 +479,55 @@ class Progbar(object):
     return self._epoch_hist
 
   def get_report(self, epoch=-1, key=None):
+    """ Return the stored values of given `key`, or the summary of
+    the streaming reducer if the key isn't fully retained """
+    if epoch < 0:
+      epoch = self.nb_epoch + epoch - 1
+    if key is None:
+      return self._epoch_hist[epoch]
+    reducer = self._epoch_reducers[epoch].get(key, None)
+    if reducer is None or isinstance(reducer, _History):
+      return self._epoch_hist[epoch][key]
+    return reducer.summary()
+
+  def get_reducer(self, key, epoch=-1):
+    """ Return the reducer object of given `key`, e.g. the running
+    mean reducer also provides `var` and `std` """
     if epoch < 0:
       epoch = self.nb_epoch + epoch - 1
-    return self._epoch_hist[epoch] if key is None else \
-    self._epoch_hist[epoch][key]
+    return self._epoch_reducers[epoch][key]
+
+  def set_reducer(self, key, reducer):
+    """ Set the reducer for the reported values of given `key`
+
+    Parameters
+    ----------
+    key : str
+        name of the reported values
+    reducer : {'mean', 'sum', 'reservoir', 'last', 'history', call-able}
+        'mean' - running mean and variance (Welford's algorithm)
+        'sum' - running sum, for count-like arrays
+        'reservoir' - uniform sample of 1024 numbers, summarized by
+                      the 5th, 50th and 95th percentiles
+        'last' - only the last value
+        'history' - keep all values, and the values are returned by
+                    `history`
+        call-able - return a new reducer object which has `add(value)`
+                    and `summary()` methods
+    """
+    if reducer not in _REDUCERS and reducer != 'history' and \
+    not hasattr(reducer, '__call__'):
+      raise ValueError("Invalid reducer: %s, support: %s, 'history' or "
+                       "call-able" % (str(reducer), ', '.join(_REDUCERS)))
+    self._reducers[str(key)] = reducer
+    return self
+
+  def set_keep_history(self, keep_history):
+    """ If True, every reported value of every key is stored in
+    `history`, only applied to the keys reported for the first
+    time after this call """
+    self._keep_history = bool(keep_history)
+    return self
 
   def set_summarizer(self, key, fn):
     """ Epoch summarizer is a function, searching in the
@@ -278,6 +536,11 @@ class Progbar(object):
 
     i.e. the input arguments is a list of stored epoch report,
     the output is a string.
+
+    Note
+    ----
+    All values of the key are stored for the summarizer, if no
+    reducer is specified for the key.
     """
     if not hasattr(fn, '__call__'):
       raise ValueError('`fn` must be call-able.')
@@ -334,7 +597,8 @@ class Progbar(object):
                     mininterval=self.__interval, maxinterval=10,
                     miniters=0, position=0)
       self.__pb.clear()
-      self._epoch_start_time = time.time()
+      if self._epoch_start_time is None:
+        self._epoch_start_time = time.time()
     return self.__pb
 
   @property
@@ -355,9 +619,9 @@ class Progbar(object):
       speed = (1. / self._epoch_summary[epoch]['__avg_time__'])
       elapsed = self._epoch_summary[epoch]['__total_time__']
     else: # epoch hasn't finished
-      avg_time = (time.time() - self._epoch_start_time) / self.seen_so_far \
-      if self.progress_bar.avg_time is None else \
-      self.progress_bar.avg_time
+      avg_time = None if self.__pb is None else self.__pb.avg_time
+      if avg_time is None:
+        avg_time = (time.time() - self._epoch_start_time) / self.seen_so_far
       speed = 1. / avg_time
       elapsed = time.time() - self._epoch_start_time
     # ====== counter ====== #
@@ -395,42 +659,41 @@ class Progbar(object):
     return self
 
   def _new_epoch(self):
-    if self.__pb is None:
+    if self._epoch_start_time is None:
       return
-    # calculate number of offset lines from last report
-    if self._last_report is None:
-      nlines = 0
-    else:
-      nlines = len(self._last_report.split('\n'))
-    # ====== reset progress bar (tqdm) ====== #
-    if self.__keep: # keep the last progress on screen
-      self.__pb.moveto(nlines)
-    else: # clear everything
-      for i in range(nlines):
-        Progbar.FP.write('\r')
-        console_width = _environ_cols_wrapper()(Progbar.FP)
-        Progbar.FP.write(' ' * (79 if console_width is None else console_width))
-        Progbar.FP.write('\r')  # place cursor back at the beginning of line
-        self.__pb.moveto(1)
-      self.__pb.moveto(-(nlines * 2))
-    self.__pb.close()
+    if self.__pb is not None:
+      # calculate number of offset lines from last report
+      if self._last_report is None:
+        nlines = 0
+      else:
+        nlines = len(self._last_report.split('\n'))
+      # ====== reset progress bar (tqdm) ====== #
+      if self.__keep: # keep the last progress on screen
+        self.__pb.moveto(nlines)
+      else: # clear everything
+        for i in range(nlines):
+          Progbar.FP.write('\r')
+          console_width = _environ_cols_wrapper()(Progbar.FP)
+          Progbar.FP.write(' ' * (79 if console_width is None else console_width))
+          Progbar.FP.write('\r')  # place cursor back at the beginning of line
+          self.__pb.moveto(1)
+        self.__pb.moveto(-(nlines * 2))
+      self.__pb.close()
     # ====== create epoch summary ====== #
-    for key, values in self._epoch_hist[self._epoch_idx].items():
-      values = [v for v in values]
+    for key, reducer in self._epoch_reducers[self._epoch_idx].items():
       # provided summarizer function
-      if key in self._epoch_summarizer_func:
-        self._epoch_summary[self._epoch_idx][key] = self._epoch_summarizer_func[key](values)
-      # very heuristic way to deal with sequence of numbers
-      elif isinstance(values[0], Number):
-        self._epoch_summary[self._epoch_idx][key] = np.mean(values)
-      # numpy array
-      elif isinstance(values[0], np.ndarray):
-        self._epoch_summary[self._epoch_idx][key] = sum(v for v in values)
+      if isinstance(reducer, _History) and \
+      key in self._epoch_summarizer_func:
+        summary = self._epoch_summarizer_func[key](list(reducer.values))
+      else:
+        summary = reducer.summary()
+      if summary is not None:
+        self._epoch_summary[self._epoch_idx][key] = summary
     # total epoch time
     total_time = time.time() - self._epoch_start_time
     self._epoch_summary[self._epoch_idx]['__total_time__'] = total_time
     # average time for 1 object
-    avg_time = self.__pb.avg_time
+    avg_time = None if self.__pb is None else self.__pb.avg_time
     if avg_time is None:
       avg_time = total_time / self.target
     self._epoch_summary[self._epoch_idx]['__avg_time__'] = avg_time
@@ -438,6 +701,7 @@ class Progbar(object):
     self.__pb = None
     self._last_report = None
     self._last_print_time = None
+    self._rendered_so_far = 0
     self._epoch_start_time = None
     self._epoch_idx += 1
     return self
@@ -454,6 +718,10 @@ class Progbar(object):
     """ Call `pause` if progress is running, hasn't finish, and
     you want to print something else on the scree.
     """
+    with self._render_lock:
+      return self._pause()
+
+  def _pause(self):
     # ====== clear the report ====== #
     if self._last_report is not None:
       nlines = len(self._last_report.split("\n"))
@@ -477,61 +745,130 @@ class Progbar(object):
     self._last_report = None
     return self
 
+  # ==================== rendering ==================== #
+  def _should_render(self, seen_so_far):
+    if seen_so_far >= self.target:
+      return True
+    if self._last_print_time is not None and \
+    time.time() - self._last_print_time < self.__interval:
+      return False
+    return (seen_so_far - self._rendered_so_far) * 100. >= \
+        self._percent * self.target
+
+  def _log_record(self):
+    """ Single-line record of the progress and the report for
+    non-TTY output """
+    seen_so_far = self.seen_so_far
+    elapsed = max(time.time() - self._epoch_start_time, 1e-8)
+    text = "[%s] Epoch %d %6.2f%%%s %.4f(s) %.4f(obj/s)" % \
+        (self.name, self.epoch_idx, seen_so_far / max(self.target, 1) * 100,
+         self._counter_fmt % (seen_so_far, self.target),
+         elapsed, seen_so_far / elapsed)
+    if self.print_report:
+      for key, value in sorted(list(self._report.items()),
+                               key=lambda x: str(x[0])):
+        value = str(value)
+        # multiple lines values (e.g. matrices) are left for the summary
+        if '\n' not in value:
+          text += " %s: %s" % (str(key).replace('\n', ' '), value)
+    return text
+
+  def _render(self):
+    """ Show the report and update the progress bar, the caller must
+    hold `_render_lock` """
+    fp = Progbar.FP
+    seen_so_far = self.seen_so_far
+    n = seen_so_far - self._rendered_so_far
+    self._rendered_so_far = seen_so_far
+    self._last_print_time = time.time()
+    # ====== non-TTY log record ====== #
+    if not self._tty:
+      if self.print_progress or self.print_report:
+        fp.write(self._log_record() + '\n')
+        fp.flush()
+      return
+    # ====== show report ====== #
+    if self.print_report:
+      # move the cursor to last point
+      if self._last_report is not None:
+        nlines = len(self._last_report.split('\n'))
+        self.progress_bar.moveto(-nlines)
+      # snapshot, the report could be updated by the training loop
+      report = self._formatted_report(dict(list(self._report.items())))
+      # clear old report
+      if self._last_report is not None:
+        for i, l in enumerate(self._last_report.split('\n')):
+          fp.write('\r')
+          fp.write(' ' * len(l))
+          fp.write('\r')  # place cursor back at the beginning of line
+          self.progress_bar.moveto(1)
+        self.progress_bar.clear()
+        self.progress_bar.moveto(-i - 1)
+      fp.write(report)
+      fp.flush()
+      self._last_report = report
+      self.progress_bar.moveto(1)
+    # ====== show progress ====== #
+    if self.print_progress:
+      self.progress_bar.update(n=n)
+    else:
+      self.progress_bar
+
+  def _start_renderer(self):
+    if self._renderer is None:
+      self._renderer_stop = threading.Event()
+      self._renderer = threading.Thread(
+          target=_background_render,
+          args=(weakref.ref(self), self._renderer_stop,
+                max(self.__interval, 0.01)),
+          name="ProgbarRenderer")
+      self._renderer.daemon = True
+      self._renderer.start()
+
+  def _stop_renderer(self):
+    if self._renderer is not None:
+      self._renderer_stop.set()
+      self._renderer.join()
+      self._renderer = None
+      self._renderer_stop = None
+
   def add(self, n=1):
-    """ You need to call pause if """
+    """ Update the progress by `n`, the progress bar and the report are
+    rendered at most every `interval` seconds (and `percent` points),
+    by the background thread if `background=True` """
     n = self._progress_func(n)
-    if not isinstance(n, Number):
+    if not isinstance(n, _SCALARS) and not isinstance(n, Number):
       raise RuntimeError(
           "Progress return an object, but not given `progress_func` for post-processing")
     if n <= 0:
       return self
-    fp = Progbar.FP
     # ====== update information ====== #
     seen_so_far = min(self._seen_so_far[self.epoch_idx] + n, self.target)
     self._seen_so_far[self.epoch_idx] = seen_so_far
+    if self._epoch_start_time is None:
+      self._epoch_start_time = time.time()
     # ====== check last updated progress, for automatically pause ====== #
     if _LAST_UPDATED_PROG[0] is None:
       _LAST_UPDATED_PROG[0] = self
     elif _LAST_UPDATED_PROG[0] != self:
       _LAST_UPDATED_PROG[0].pause()
       _LAST_UPDATED_PROG[0] = self
-    # ====== show report ====== #
-    if self.print_report:
-      curr_time = time.time()
-      # update the report
-      if self._last_print_time is None or \
-      time.time() - self._last_print_time > self.__interval or\
-      seen_so_far >= self.target:
-        self._last_print_time = curr_time
-        # move the cursor to last point
-        if self._last_report is not None:
-          nlines = len(self._last_report.split('\n'))
-          self.progress_bar.moveto(-nlines)
-        report = self._formatted_report(self._report)
-        # clear old report
-        if self._last_report is not None:
-          for i, l in enumerate(self._last_report.split('\n')):
-            fp.write('\r')
-            fp.write(' ' * len(l))
-            fp.write('\r')  # place cursor back at the beginning of line
-            self.progress_bar.moveto(1)
-          self.progress_bar.clear()
-          self.progress_bar.moveto(-i - 1)
-        fp.write(report)
-        fp.flush()
-        self._last_report = report
-        self.progress_bar.moveto(1)
-    # ====== show progress ====== #
-    if self.print_progress:
-      self.progress_bar.update(n=n)
-    else:
-      self.progress_bar
+    # ====== rendering ====== #
+    if seen_so_far < self.target:
+      if self._background:
+        self._start_renderer()
+      elif self._should_render(seen_so_far):
+        with self._render_lock:
+          self._render()
+      return self
     # ====== end of epoch ====== #
-    if seen_so_far >= self.target:
+    self._stop_renderer()
+    with self._render_lock:
+      self._render()
       self._new_epoch()
-      # print summary of epoch
-      if self.print_summary:
-        _tqdm.write(self._generate_epoch_summary(self.epoch_idx - 1,
-                                                 inc_name=True,
-                                                 inc_counter=False))
+    # print summary of epoch
+    if self.print_summary:
+      _tqdm.write(self._generate_epoch_summary(self.epoch_idx - 1,
+                                               inc_name=True,
+                                               inc_counter=False))
     return self
@@ -2,8 +2,11 @@ from __future__ import print_function, division, absolute_import
 
 import os
 import re
+import sys
+import types
 import inspect
 import warnings
+import importlib
 from contextlib import contextmanager
 
 from datetime import datetime
@@ -226,3 +229,62 @@ def catch_warnings_ignore(w):
   with warnings.catch_warnings():
     warnings.filterwarnings(action='ignore', category=w)
     yield
+
+# ===========================================================================
+# Lazy import
+# ===========================================================================
+class LazyModule(types.ModuleType):
+  """ Module type that resolves the attributes registered by
+  `lazy_import` on first access, then caches them in the module
+  `__dict__` so the next lookup is a plain attribute access.
+  """
+
+  def __getattr__(self, name):
+    # only called when the normal lookup failed
+    lazy_attributes = self.__dict__.get('_lazy_attributes', {})
+    if name not in lazy_attributes:
+      raise AttributeError("module '%s' has no attribute '%s'" %
+                           (self.__name__, name))
+    module_name, attr_name = lazy_attributes[name]
+    try:
+      obj = importlib.import_module(module_name)
+      if attr_name is not None:
+        obj = getattr(obj, attr_name)
+    except ImportError as e:
+      raise AttributeError("module '%s' cannot load lazy attribute '%s': %s" %
+                           (self.__name__, name, str(e)))
+    setattr(self, name, obj)
+    return obj
+
+  def __dir__(self):
+    return sorted(set(self.__dict__) |
+                  set(self.__dict__.get('_lazy_attributes', {})))
+
+def lazy_import(module_name, attributes):
+  """ Defer the import of submodules and attributes of the (package)
+  module `module_name` until they are first accessed.
+
+  Parameters
+  ----------
+  module_name : str
+    name of the module, normally `__name__` of the calling module
+  attributes : Mapping
+    mapping from attribute name to its source, either a module path
+    (e.g. 'odin.utils.mpi') or a 'module:attribute' string
+    (e.g. 'odin.utils.mpi:MPI')
+
+  Example
+  -------
+  >>> lazy_import(__name__, {'mpi': 'odin.utils.mpi',
+  ...                        'MPI': 'odin.utils.mpi:MPI'})
+  """
+  module = sys.modules[module_name]
+  lazy_attributes = dict(module.__dict__.get('_lazy_attributes', {}))
+  for name, source in attributes.items():
+    source = source.split(':')
+    lazy_attributes[name] = (source[0],
+                             source[1] if len(source) > 1 else None)
+  module._lazy_attributes = lazy_attributes
+  if not isinstance(module, LazyModule):
+    module.__class__ = LazyModule
+  return module
@@ -20,7 +20,6 @@ from contextlib import contextmanager
 from collections import Mapping, OrderedDict, defaultdict
 
 import numpy as np
-from scipy import stats
 
 from odin.visual.stats_plot import *
 # try:
@@ -595,6 +594,7 @@ def plot_histogram(x, bins=80, ax=None,
   if kde:
     if not normalize:
       raise ValueError("KDE plot only applicable for normalized-to-1 histogram.")
+    from scipy import stats
     density = stats.gaussian_kde(x)
     if isinstance(covariance_factor, Number):
       density.covariance_factor = lambda: float(covariance_factor)
@@ -657,6 +657,7 @@ def plot_histogram_layers(Xs, bins=50, ax=None,
     if kde:
       if not normalize:
         raise ValueError("KDE plot only applicable for normalized-to-1 histogram.")
+      from scipy import stats
       density = stats.gaussian_kde(x)
       if isinstance(covariance_factor, Number):
         density.covariance_factor = lambda: float(covariance_factor)
@@ -417,5 +417,94 @@ class BackendTest(unittest.TestCase):
                      1200.)
     # print(K.eval(K.upsample(X, 2, axes=(1, 2), method='pad')).sum())
 
+  def test_function_feed_plan(self):
+    x = K.placeholder(shape=(None, 8), name='x_feedplan')
+    y = K.placeholder(shape=(None, 3), name='y_feedplan')
+    z = K.placeholder(shape=(None,), name='z_feedplan')
+    f = K.function([x, y, z], [tf.reduce_sum(x, axis=1) + tf.reduce_sum(y, axis=1) + z])
+    fbatch = K.function([x, y, z], tf.reduce_sum(x, axis=1) + tf.reduce_sum(y, axis=1) + z,
+                        batch_size=7)
+    X = np.random.rand(25, 8).astype('float32')
+    Y = np.random.rand(25, 3).astype('float32')
+    Z = np.random.rand(25).astype('float32')
+    W = np.random.rand(25, 5).astype('float32')
+    true = X.sum(1) + Y.sum(1) + Z
+    for i in range(3):
+      # exact inputs, and mismatch input which is skipped
+      self.assertTrue(np.allclose(f(X, Y, Z)[0], true))
+      self.assertTrue(np.allclose(f(X, W, Y, Z)[0], true))
+      self.assertTrue(np.allclose(f(X[:4], Y[:4], Z[:4])[0], true[:4]))
+      self.assertTrue(np.allclose(fbatch(X, Y, Z), true))
+    # one plan per input signature, the batch size is not part of it
+    self.assertEqual(len(f._feed_plans), 2)
+    self.assertRaises(ValueError, f, X, Z)
+
+  def test_function_minibatch_outputs(self):
+    import os
+    from odin.fuel import MmapData
+    from odin.utils import get_tempdir
+    x = K.placeholder(shape=(None, 8), name='x_minibatch')
+    f = K.function(x, [x * 2, tf.transpose(x), tf.reduce_sum(x)],
+                   batch_size=6)
+    X = np.random.rand(20, 8).astype('float32')
+    for prefetch in (False, True):
+      y1, y2, y3 = f(X, prefetch=prefetch)
+      self.assertTrue(np.allclose(y1, X * 2))
+      self.assertTrue(np.allclose(y2, X.T))
+      self.assertEqual(y3.shape, (4,))
+    # writing to preallocated arrays and MmapData
+    path = os.path.join(get_tempdir(), 'function_minibatch_out')
+    if os.path.exists(path):
+      os.remove(path)
+    out = [np.empty((20, 8), 'float32'), path, np.empty((4,), 'float32')]
+    y1, y2, y3 = f(X, out=out)
+    self.assertTrue(y1 is out[0] and y3 is out[2])
+    self.assertTrue(isinstance(y2, MmapData))
+    self.assertTrue(np.allclose(y2[:], X.T))
+    y2.close()
+    os.remove(path)
+    # other dimension has the size of the first mini-batch
+    x = K.placeholder(shape=(None, 6), name='x_square')
+    f = K.function(x, [tf.matmul(x, tf.ones((6, 6))), tf.transpose(x)],
+                   batch_size=6)
+    X = np.random.rand(20, 6).astype('float32')
+    y1, y2 = f(X)
+    self.assertTrue(np.allclose(y1, np.dot(X, np.ones((6, 6)))))
+    self.assertTrue(np.allclose(y2, X.T))
+    # the static shape decides the batch axis from the first mini-batch,
+    # no results are kept until the last mini-batch
+    find_batch_axes = f._find_batch_axes
+    resolved = []
+    def spy(pending, *args, **kwargs):
+      axes = find_batch_axes(pending, *args, **kwargs)
+      resolved.append((len(pending), axes))
+      return axes
+    f._find_batch_axes = spy
+    try:
+      f(X)
+    finally:
+      f._find_batch_axes = find_batch_axes
+    self.assertEqual(resolved, [(1, [0, 1])])
+    # unknown static shape falls back to the size of the mini-batches
+    y = K.function(x, tf.reshape(x, tf.stack([tf.shape(x)[0], -1])),
+                   batch_size=6)(X)
+    self.assertTrue(np.allclose(y, X))
+    # all mini-batches have the same size, given `out` decides the axis
+    y1, y2 = f(X[:18], out=[np.empty((18, 6), 'float32'),
+                            np.empty((6, 18), 'float32')])
+    self.assertTrue(np.allclose(y1, np.dot(X[:18], np.ones((6, 6)))))
+    self.assertTrue(np.allclose(y2, X[:18].T))
+    # `out` without mini-batches
+    f = K.function(x, x * 2)
+    out = np.empty((20, 6), 'float32')
+    y = f(X, out=out)
+    self.assertTrue(y is out and np.allclose(out, X * 2))
+    self.assertRaises(ValueError, f, X, out=np.empty((6, 20), 'float32'))
+    # empty inputs with `out`
+    f = K.function(x, [x * 2, tf.transpose(x)], batch_size=6)
+    out = [np.empty((0, 6), 'float32'), np.empty((6, 0), 'float32')]
+    y1, y2 = f(X[:0], out=out)
+    self.assertTrue(y1 is out[0] and y2 is out[1])
+
 if __name__ == '__main__':
   print(' odin.tests.run() to run these tests ')
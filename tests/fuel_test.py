@@ -5,7 +5,9 @@ from __future__ import print_function, division
 
 import os
 import unittest
-from six.moves import zip, range
+import warnings
+from multiprocessing import cpu_count
+from six.moves import zip, range, cPickle
 
 import numpy as np
 
@@ -240,6 +242,243 @@ class FuelTest(unittest.TestCase):
     def test_dataset(self):
         pass
 
+    def test_bucket_grouping(self):
+        from odin.fuel.feeder import _bucket_grouping
+        rng = np.random.RandomState(5218)
+        lengths = rng.randint(5, 80, size=40)
+        batch = [('utt%d' % i, [rng.rand(n, 3), np.full((n,), i)])
+                 for i, n in enumerate(lengths)]
+        n_files = 0
+        padded_frames = 0
+        for X, y, seq_len in _bucket_grouping(list(batch), 8, rng,
+                                              lambda x: x):
+            self.assertEqual(X.shape[:2], (len(seq_len), seq_len.max()))
+            self.assertEqual(y.shape, X.shape[:2])
+            for x, i, n in zip(X, y[:, 0], seq_len):
+                self.assertTrue(np.all(x[:n] == batch[i][1][0]))
+                self.assertTrue(np.all(x[n:] == 0))
+            n_files += len(seq_len)
+            padded_frames += X.shape[0] * X.shape[1]
+        self.assertEqual(n_files, len(batch))
+        # sorted buckets need far less padding than random batches
+        self.assertTrue(padded_frames < 1.2 * np.sum(lengths))
+
+    def test_sqlite_dict(self):
+        import sys
+        import sqlite3
+        import marshal
+        import subprocess
+        from odin.fuel.utils import SQLiteDict
+        path = '/tmp/odin_test_sqlite.db'
+        for f in (path, path + '-wal', path + '-shm'):
+            if os.path.exists(f):
+                os.remove(f)
+        rng = np.random.RandomState(5218)
+        data = {'a%d' % i: rng.rand(i + 1, 3).astype('float32')
+                for i in range(20)}
+        data['int'] = np.arange(12, dtype='int16').reshape(3, 2, 2)
+        data['scalar'] = np.array(8.)
+        data['str'] = 'hello'
+        data['list'] = [1, 2, 3]
+        db = SQLiteDict(path, cache_size=5)
+        for key in ('int', 'scalar', 'str', 'list'):
+            db[key] = data[key]
+        db.set_many([(k, v) for k, v in data.items() if k[0] == 'a'])
+        db.flush()
+        # concurrent readers while the writer is opened
+        code = ("from odin.fuel.utils import SQLiteDict;"
+                "print(len(SQLiteDict('%s', read_only=True)))" % path)
+        root = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(F.__file__))))
+        readers = [subprocess.Popen([sys.executable, '-c', code],
+                                    stdout=subprocess.PIPE, cwd=root)
+                   for _ in range(2)]
+        for r in readers:
+            self.assertEqual(int(r.communicate()[0].decode().split()[-1]),
+                             len(data))
+        keys = sorted(data.keys())
+        for key, val in zip(keys, db.get_many(keys)):
+            self.assertEqual(type(val), type(data[key]))
+            if isinstance(val, np.ndarray):
+                self.assertEqual(val.dtype, data[key].dtype)
+                self.assertTrue(np.all(val == data[key]))
+            else:
+                self.assertEqual(val, data[key])
+        self.assertTrue(np.all(db['a3'] == data['a3']))
+        db.close()
+        # table written by the older (key, value) format
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE legacy (key text NOT NULL, "
+                     "value text NOT NULL, PRIMARY KEY (key));")
+        conn.execute("INSERT INTO legacy VALUES (?, ?)",
+                     ('x', marshal.dumps([1., 2.])))
+        conn.commit()
+        conn.close()
+        db = SQLiteDict(path, read_only=True)
+        db.set_table('legacy')
+        self.assertEqual(db['x'], [1., 2.])
+        db.close()
+        db = SQLiteDict(path)
+        db.set_table('legacy')
+        db['y'] = np.ones((2,))
+        db.flush()
+        self.assertEqual(db.get_many(['y', 'x'])[1], [1., 2.])
+        # keys are always bound as query parameters
+        db.set_table(None)
+        for key in ('x"y', "x'y", 'a1, a2'):
+            db[key] = 1
+        db.flush()
+        self.assertTrue('x"y' in db and "x'y" in db and 'a1, a2' in db)
+        self.assertFalse('a1' not in db or 'x"' in db)
+        del db['x"y']
+        del db[["x'y", 'a1', 'a2']]
+        self.assertFalse('x"y' in db or "x'y" in db or 'a1' in db)
+        self.assertTrue('a1, a2' in db and 'a3' in db)
+        db.close()
+        # unpickled read-only handle never alters the legacy table
+        os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE _default_ (key text NOT NULL, "
+                     "value text NOT NULL, PRIMARY KEY (key));")
+        conn.execute("INSERT INTO _default_ VALUES (?, ?)",
+                     ('x', marshal.dumps([1., 2.])))
+        conn.commit()
+        db = SQLiteDict(path, read_only=True)
+        dumped = cPickle.dumps(db, protocol=cPickle.HIGHEST_PROTOCOL)
+        db.close()
+        db = cPickle.loads(dumped)
+        self.assertTrue(db.read_only)
+        self.assertEqual(db['x'], [1., 2.])
+        self.assertEqual([i[1] for i in conn.execute(
+            "PRAGMA table_info(_default_);")], ['key', 'value'])
+        db.close()
+        conn.close()
+
+    def test_mmap_handle_pool(self):
+        import shutil
+        from odin.fuel.data import MmapData, MAX_OPEN_MMAP
+        path = '/tmp/odin_test_mmap_pool'
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        n_files = 2 * MAX_OPEN_MMAP
+        ds = F.Dataset(path)
+        for i in range(n_files):
+            ds['X%d' % i] = np.full((8, 3), i, dtype='float32')
+        ds.flush()
+        ds.close()
+        info = MmapData.pool_info()
+        self.assertTrue(info['opened'] <= MAX_OPEN_MMAP)
+        # random access across all files, evicted memmaps are reopened
+        ds = F.Dataset(path, read_only=True)
+        rng = np.random.RandomState(5218)
+        for i in np.concatenate([rng.permutation(n_files)] * 2):
+            x = ds['X%d' % i]
+            self.assertTrue(np.all(x[rng.randint(0, 8)] == i))
+            self.assertTrue(np.all(x[:] == i))
+        new_info = MmapData.pool_info()
+        self.assertTrue(new_info['opened'] <= MAX_OPEN_MMAP)
+        self.assertTrue(new_info['evictions'] > info['evictions'])
+        self.assertTrue(new_info['hits'] > info['hits'])
+        ds.close()
+        shutil.rmtree(path)
+
+    def test_data_iterator_distribution(self):
+        from odin.fuel.data import DataIterator, NdarrayData
+        sizes = [100, 300, 600]
+        data = [NdarrayData(np.stack([np.full((n,), i), np.arange(n)],
+                                     axis=1))
+                for i, n in enumerate(sizes)]
+        it = DataIterator(data)
+        distribution = [1., 0.5, 0.2]
+        expected = [int(round(p * n)) for p, n in zip(distribution, sizes)]
+        for seed, shuffle_level in ((None, 0), (5218, 1), (5218, 2)):
+            it.set_mode(distribution=distribution, sequential=False)
+            it.set_batch(batch_size=32, seed=seed, shuffle_level=shuffle_level)
+            batches = [x for x in it]
+            X = np.concatenate(batches)
+            self.assertEqual(len(X), len(it))
+            self.assertEqual(np.bincount(X[:, 0]).tolist(), expected)
+            # every batch follows the distribution
+            for x in batches[:-1]:
+                counts = np.bincount(x[:, 0], minlength=len(sizes))
+                self.assertTrue(np.all(
+                    np.abs(counts - 32 * np.array(expected) / sum(expected))
+                    <= 1.5))
+            # no duplicated sample within a pass over each source
+            for i in range(len(sizes)):
+                rows = X[X[:, 0] == i, 1]
+                self.assertEqual(len(np.unique(rows)), len(rows))
+        # over-sampling, sequential
+        it.set_mode(distribution='up', sequential=True)
+        it.set_batch(batch_size=64, seed=None)
+        batches = [x for x in it]
+        X = np.concatenate(batches)
+        self.assertEqual(np.bincount(X[:, 0]).tolist(), [600, 600, 600])
+        self.assertTrue(all(len(np.unique(x[:, 0])) == 1 for x in batches))
+        self.assertEqual(np.bincount(X[X[:, 0] == 0, 1]).tolist(), [6] * 100)
+
+    @unittest.skipIf(cpu_count() < 2, "MPI needs more than one CPU")
+    def test_feeder_bucket(self):
+        rng = np.random.RandomState(5218)
+        lengths = rng.randint(5, 80, size=64)
+        ends = np.cumsum(lengths)
+        X = F.as_data(rng.rand(ends[-1], 3))
+        indices = {'utt%02d' % i: (e - n, e)
+                   for i, (n, e) in enumerate(zip(lengths, ends))}
+        feeder = F.Feeder(F.IndexedData(X, indices), batch_mode='bucket',
+                          ncpu=1, buffer_size=8)
+        # `batch_size` counts files, the pool of each process is enlarged
+        feeder.set_batch(16, seed=None)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            batches = list(feeder)
+        self.assertTrue(any('bucket' in str(i.message) for i in w))
+        self.assertEqual([len(seq_len) for x, seq_len in batches], [16] * 4)
+        self.assertEqual(sorted(np.concatenate([seq_len for x, seq_len
+                                                in batches]).tolist()),
+                         sorted(lengths.tolist()))
+        # large enough pool, no warning
+        feeder.set_multiprocessing(ncpu=1, buffer_size=64)
+        feeder.set_batch(16, seed=None)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            batches = list(feeder)
+        self.assertFalse(any('bucket' in str(i.message) for i in w))
+        self.assertEqual([len(seq_len) for x, seq_len in batches], [16] * 4)
+
+    @unittest.skipIf(cpu_count() < 2, "MPI needs more than one CPU")
+    def test_feeder_dtype(self):
+        with utils.TemporaryDirectory() as temppath:
+            ds = F.Dataset(os.path.join(temppath, 'ds'))
+            ds['X'] = np.random.rand(1000, 3)
+            np.savetxt(os.path.join(ds.path, 'indices.csv'),
+                       [['name_%d' % i, j, j + 20]
+                        for i, j in enumerate(range(0, 1000, 20))],
+                       fmt='%s', delimiter=' ')
+            ds.flush()
+            ds.close()
+            ds = F.Dataset(os.path.join(temppath, 'ds'), read_only=True)
+            X = ds['X'][:]
+            # convert once on disk
+            ds32 = ds.copy(os.path.join(temppath, 'ds32'), dtype='float32')
+            self.assertEqual(ds32['X'].dtype, np.dtype('float32'))
+            self.assertTrue(np.allclose(ds32['X'][:], X.astype('float32')))
+            # stored dtype is kept if no dtype given
+            for d, dtype, expected in ((ds, 'float32', 'float32'),
+                                       (ds32, None, 'float32'),
+                                       (ds32, 'float32', 'float32'),
+                                       (ds, None, 'float64')):
+                feeder = F.Feeder(F.IndexedData(d['X'], d['indices']),
+                                  dtype=dtype, ncpu=1)
+                feeder.set_batch(64, seed=None)
+                Y = np.concatenate([x[0] if isinstance(x, (tuple, list))
+                                    else x for x in feeder])
+                self.assertEqual(Y.dtype, np.dtype(expected))
+                self.assertTrue(np.allclose(np.sort(Y, axis=0),
+                                            np.sort(X, axis=0), atol=1e-6))
+            ds32.close()
+            ds.close()
+
 
 if __name__ == '__main__':
     print(' odin.tests.run() to run these tests ')
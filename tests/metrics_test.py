@@ -0,0 +1,125 @@
+# ======================================================================
+# Author: TrungNT
+# ======================================================================
+from __future__ import print_function, division
+
+import timeit
+import unittest
+from six.moves import zip, range
+
+import numpy as np
+
+from odin.backend.metrics import compute_Cavg, compute_Cnorm
+
+
+# ===========================================================================
+# Reference loop implementations
+# ===========================================================================
+def _loop_Cavg(y_llr, y_true, cluster_idx=None, Ptrue=0.5, Cfa=1., Cmiss=1.):
+    if cluster_idx is None:
+        cluster_idx = [list(range(0, y_llr.shape[-1]))]
+    thresh = np.log(Cfa / Cmiss) - np.log(Ptrue / (1 - Ptrue))
+    cluster_cost = np.zeros(len(cluster_idx))
+    for k, cluster in enumerate(cluster_idx):
+        L = len(cluster)
+        fa = 0
+        fr = 0
+        for lang_i in cluster:
+            N = np.sum(y_true == lang_i, dtype='float32')
+            N = max(N, 1.)
+            for lang_j in cluster:
+                if lang_i == lang_j:
+                    fr += np.sum(y_llr[y_true == lang_i, lang_i] < thresh) / N
+                else:
+                    fa += np.sum(y_llr[y_true == lang_i, lang_j] >= thresh) / N
+        cluster_cost[k] = 100 * (Cmiss * Ptrue * fr +
+                                 Cfa * (1 - Ptrue) * fa / (L - 1)) / L
+    return cluster_cost, np.mean(cluster_cost)
+
+
+def _loop_Cnorm(y_true, y_score, Ptrue=[0.1, 0.5], Cfa=1., Cmiss=1.):
+    nb_classes = y_score[0].shape[1]
+    Ptrue = np.asarray(Ptrue, dtype=float)
+    beta = (Cfa / Cmiss) * ((1 - Ptrue) / Ptrue)
+    global_cm_array = np.zeros(shape=(len(Ptrue), nb_classes, nb_classes))
+    for scores, labels in zip(y_score, y_true):
+        actual_TP_per_class = np.unique(labels, return_counts=True)[1]
+        for theta_ix, theta in enumerate(np.log(beta)):
+            thresholded_scores = (scores > theta).astype(int)
+            cm = np.zeros(shape=(nb_classes, nb_classes), dtype=np.int64)
+            for trial, target in zip(thresholded_scores, labels):
+                cm[target, :] += trial
+            cm[np.diag_indices_from(cm)] = actual_TP_per_class - cm.diagonal()
+            global_cm_array[theta_ix] += cm / actual_TP_per_class[:, None]
+    global_cm_array /= len(y_true)
+    p_miss_arr = global_cm_array.diagonal(0, 1, 2)
+    p_false_alarm_arr = (global_cm_array.sum(1) - p_miss_arr) / (nb_classes - 1)
+    C_Norm_arr = p_miss_arr + beta[:, None] * p_false_alarm_arr
+    C_Norm = p_miss_arr.mean(1) + beta * p_false_alarm_arr.mean(1)
+    return C_Norm, C_Norm_arr
+
+
+def _synthetic_trials(nb_classes, nb_samples, seed):
+    rng = np.random.RandomState(seed)
+    y_true = np.concatenate([np.arange(nb_classes),
+                             rng.randint(0, nb_classes,
+                                         size=nb_samples - nb_classes)])
+    y_score = rng.randn(nb_samples, nb_classes).astype('float32')
+    y_score[np.arange(nb_samples), y_true] += 2.
+    return y_true, y_score
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_Cavg_equivalence(self):
+        y_true, y_llr = _synthetic_trials(nb_classes=12, nb_samples=3000,
+                                          seed=5218)
+        for Ptrue in (0.5, 0.1):
+            for cluster_idx in (None, [[0, 1, 2, 3], [4, 5, 6, 7, 8, 9, 10, 11]]):
+                cost1, total1 = compute_Cavg(y_llr, y_true,
+                                             cluster_idx=cluster_idx,
+                                             Ptrue=Ptrue)
+                cost2, total2 = _loop_Cavg(y_llr, y_true,
+                                           cluster_idx=cluster_idx,
+                                           Ptrue=Ptrue)
+                self.assertTrue(np.allclose(cost1, cost2))
+                self.assertTrue(np.allclose(total1, total2))
+        # missing language in the trials
+        cost1, total1 = compute_Cavg(y_llr[y_true != 3], y_true[y_true != 3])
+        cost2, total2 = _loop_Cavg(y_llr[y_true != 3], y_true[y_true != 3])
+        self.assertTrue(np.allclose(total1, total2))
+
+    def test_Cnorm_equivalence(self):
+        y_true1, y_score1 = _synthetic_trials(nb_classes=12, nb_samples=3000,
+                                              seed=5218)
+        y_true2, y_score2 = _synthetic_trials(nb_classes=12, nb_samples=1000,
+                                              seed=1234)
+        for y_true, y_score in (((y_true1,), (y_score1,)),
+                                ((y_true1, y_true2), (y_score1, y_score2))):
+            C1, C_arr1 = compute_Cnorm(y_true, y_score,
+                                       Ptrue=[0.1, 0.5, 0.8])
+            C2, C_arr2 = _loop_Cnorm(y_true, y_score, Ptrue=[0.1, 0.5, 0.8])
+            self.assertTrue(np.allclose(C1, C2))
+            self.assertTrue(np.allclose(C_arr1, C_arr2))
+
+    def test_cost_timing(self):
+        # synthetic 50-language trial set
+        y_true, y_score = _synthetic_trials(nb_classes=50, nb_samples=50000,
+                                            seed=5218)
+        fast = timeit.timeit(lambda: compute_Cavg(y_score, y_true), number=1)
+        slow = timeit.timeit(lambda: _loop_Cavg(y_score, y_true), number=1)
+        self.assertLess(fast, slow)
+        fast = timeit.timeit(lambda: compute_Cnorm(y_true, y_score), number=1)
+        slow = timeit.timeit(lambda: _loop_Cnorm((y_true,), (y_score,)),
+                             number=1)
+        self.assertLess(fast, slow)
+
+
+if __name__ == '__main__':
+    print(' odin.tests.run() to run these tests ')
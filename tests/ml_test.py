@@ -0,0 +1,184 @@
+# ======================================================================
+# Author: TrungNT
+# ======================================================================
+from __future__ import print_function, division
+
+import os
+import shutil
+import importlib
+import tempfile
+import warnings
+import unittest
+from multiprocessing import cpu_count
+from six.moves import zip, range
+
+import numpy as np
+
+from odin.ml.decompositions import RandomizedPCA, MiniBatchPCA
+
+
+def _low_rank_data(n_samples, n_features, rank, seed):
+    rng = np.random.RandomState(seed)
+    X = np.dot(rng.randn(n_samples, rank) * np.linspace(10, 1, rank),
+               rng.randn(rank, n_features))
+    return X + 0.1 * rng.randn(n_samples, n_features) + rng.rand(n_features)
+
+
+class MLTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_randomized_pca_blocked(self):
+        from sklearn.decomposition import PCA
+        X = _low_rank_data(n_samples=2000, n_features=60, rank=8, seed=5218)
+        pca = PCA(n_components=5, svd_solver='full').fit(X)
+        for iterated_power in (0, 2):
+            in_memory = RandomizedPCA(n_components=5,
+                                      iterated_power=iterated_power,
+                                      random_state=1234).fit(X)
+            blocked = RandomizedPCA(n_components=5,
+                                    iterated_power=iterated_power,
+                                    block_size=128, random_state=1234).fit(X)
+            # at least as accurate as the in-memory path
+            self.assertTrue(np.all(blocked.explained_variance_ >=
+                                   in_memory.explained_variance_ * (1 - 1e-8)))
+            # close to the exact solution, with the same sign convention
+            self.assertTrue(np.allclose(blocked.components_,
+                                        pca.components_, atol=1e-3))
+            self.assertTrue(np.allclose(blocked.explained_variance_,
+                                        pca.explained_variance_, rtol=1e-3))
+            self.assertTrue(np.allclose(blocked.explained_variance_ratio_,
+                                        pca.explained_variance_ratio_,
+                                        rtol=1e-3))
+            if iterated_power > 0:
+                self.assertTrue(np.allclose(blocked.components_,
+                                            in_memory.components_))
+                self.assertTrue(np.allclose(blocked.transform(X[:10]),
+                                            in_memory.transform(X[:10])))
+
+    def test_fast_tsne_cache(self):
+        # `odin.ml.fast_tsne` is shadowed by the function of same name
+        T = importlib.import_module('odin.ml.fast_tsne')
+        path = tempfile.mkdtemp()
+        warm_start_init = T._warm_start_init
+        try:
+            rng = np.random.RandomState(5218)
+            x = rng.randn(120, 8).astype('float32')
+            # prefix fingerprints in a single pass
+            for mode in ('md5', 'fast'):
+                fps = T._fingerprints(x, [60, 120, 120, 500], mode)
+                self.assertEqual(sorted(fps.keys()), [60, 120])
+                self.assertEqual(fps[60],
+                                 T._fingerprints(x[:60], [60], mode)[60])
+                self.assertNotEqual(
+                    fps[60], T._fingerprints(x[1:61], [60], mode)[60])
+            # the fingerprint of `x[:n]` does not depend on the other
+            # lengths (float64 column sums are sensitive to the cut points)
+            x64 = rng.randn(5000, 30)
+            for mode in ('md5', 'fast'):
+                fp = T._fingerprints(x64, [5000], mode)[5000]
+                for lengths in ([5000, 1234], [5000, 1024, 2048, 4999],
+                                [5000, 1, 3333]):
+                    self.assertEqual(
+                        T._fingerprints(x64, lengths, mode)[5000], fp)
+                self.assertEqual(
+                    T._fingerprints(x64, [5000, 1234], mode)[1234],
+                    T._fingerprints(x64[:1234], [1234], mode)[1234])
+            # ====== miss, then hit from the disk ====== #
+            kwargs = dict(n_iter=250, n_jobs=1, cache_dir=path,
+                          fingerprint='fast')
+            T._cached_values.clear()
+            y = T.fast_tsne(x, **kwargs)
+            self.assertEqual(y.shape, (120, 2))
+            files = os.listdir(path)
+            self.assertEqual(len(files), 1)
+            self.assertEqual(files[0].split('_')[1], '120')
+            # replace the cached embedding, the next call must return it
+            cached = np.arange(240, dtype='float32').reshape(120, 2)
+            np.save(os.path.join(path, files[0]), cached)
+            T._cached_values.clear()
+            self.assertTrue(np.all(T.fast_tsne(x, **kwargs) == cached))
+            # ====== warm start from the cached prefix ====== #
+            inits = []
+
+            def record_init(x, y_old, random_state):
+                inits.append(y_old)
+                return warm_start_init(x, y_old, random_state)
+            T._warm_start_init = record_init
+            x_new = np.concatenate([x, rng.randn(30, 8).astype('float32')])
+            self.assertEqual(T.fast_tsne(x_new, **kwargs).shape, (150, 2))
+            self.assertEqual(len(inits), 1)
+            self.assertTrue(np.all(inits[0] == cached))
+            # not a prefix of the cached data
+            x_new[0] += 1
+            T.fast_tsne(x_new, **kwargs)
+            self.assertEqual(len(inits), 1)
+            init = warm_start_init(x_new, cached, random_state=5218)
+            self.assertTrue(np.all(init[:120] == cached))
+            # ====== LRU eviction by size ====== #
+            cache = T._DiskCache(os.path.join(path, 'lru'), max_size=0.05)
+            for i in range(3): # ~20KB for each embedding
+                cache.put('params', 2500, 'fp%d' % i,
+                          np.full((2500, 2), i, dtype='float32'))
+                os.utime(cache._path('params', 2500, 'fp%d' % i),
+                         (1000 + i, 1000 + i))
+            self.assertEqual(sorted(cache.cached('params')[2500]),
+                             ['fp0', 'fp1', 'fp2'])
+            # accessing the oldest embedding makes it the most recent
+            self.assertTrue(np.all(cache.get('params', 2500, 'fp0') == 0))
+            cache.evict()
+            self.assertEqual(sorted(cache.cached('params')[2500]),
+                             ['fp0', 'fp2'])
+        finally:
+            T._warm_start_init = warm_start_init
+            shutil.rmtree(path)
+
+    @unittest.skipIf(cpu_count() < 2, "MPI needs more than one CPU")
+    def test_minibatch_pca_transform_mpi(self):
+        from odin.fuel import MmapData
+        X = _low_rank_data(n_samples=1500, n_features=20, rank=6, seed=5218)
+        pca = MiniBatchPCA(n_components=10, batch_size=128).fit(X)
+        y = pca.transform(X, n_components=4)
+        # new output array
+        y_mpi = pca.transform_mpi(X, ncpu=2, n_components=4)
+        self.assertTrue(np.allclose(y_mpi, y))
+        # preallocated numpy.ndarray
+        out = np.empty(shape=(1500, 4), dtype=y.dtype)
+        self.assertTrue(pca.transform_mpi(X, ncpu=2, n_components=4,
+                                          output=out) is out)
+        self.assertTrue(np.allclose(out, y))
+        # `keep_order` is deprecated, the order is always preserved
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            y_mpi = pca.transform_mpi(X, keep_order=False, ncpu=2,
+                                      n_components=4)
+        self.assertTrue(any(issubclass(i.category, DeprecationWarning)
+                            for i in w))
+        self.assertTrue(np.allclose(y_mpi, y))
+        self.assertRaises(ValueError, pca.transform_mpi, X, ncpu=2,
+                          n_components=4, output=np.empty((1500, 5)))
+        # MmapData input and output
+        path = tempfile.mkdtemp()
+        try:
+            X_mmap = MmapData(os.path.join(path, 'X'), dtype=X.dtype,
+                              shape=X.shape, read_only=False)
+            X_mmap[:] = X
+            X_mmap.flush()
+            out = MmapData(os.path.join(path, 'y'), dtype=y.dtype,
+                           shape=(1500, 4), read_only=False)
+            pca.transform_mpi(X_mmap, ncpu=2, n_components=4, output=out)
+            self.assertTrue(np.allclose(out[:], y))
+            y_iter = np.concatenate(list(pca.transform_mpi_iter(
+                X_mmap, ncpu=2, n_components=4)), axis=0)
+            self.assertTrue(np.allclose(y_iter, y))
+            X_mmap.close()
+            out.close()
+        finally:
+            shutil.rmtree(path)
+
+if __name__ == '__main__':
+    print(' odin.tests.run() to run these tests ')
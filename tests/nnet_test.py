@@ -38,6 +38,35 @@ class NNetTest(unittest.TestCase):
         self.assertEquals(x.shape, (12, 10))
         self.assertEquals(y.shape.as_list(), [None, 10])
 
+    def test_time_delayed_dense(self):
+        np.random.seed(5218)
+        X = K.placeholder(shape=(None, 30, 12), name='X_tdnn')
+        x = np.random.rand(5, 30, 12).astype('float32')
+        for pool in ('none', 'max', 'min', 'sum', 'avg', 'stat'):
+            op = N.TimeDelayedDense(n_new_features=(16, 8), n_time_context=4,
+                                    time_pool=pool, backward=pool == 'max',
+                                    activation=(K.relu, K.linear))
+            y_unrolled = op(X)
+            op.use_scan = True
+            y_scan = op._apply(X)
+            K.initialize_all_variables()
+            y1, y2 = K.eval([y_unrolled, y_scan], feed_dict={X: x})
+            self.assertEqual(y1.shape, y2.shape)
+            self.assertEqual(y_unrolled.shape.as_list()[1:], list(y1.shape[1:]))
+            self.assertTrue(np.allclose(y1, y2, rtol=1e-5, atol=1e-6))
+
+    def test_stats_pool_masked(self):
+        np.random.seed(5218)
+        X = K.placeholder(shape=(None, None, 6), name='X_statspool')
+        L = K.placeholder(shape=(None,), dtype='int32', name='L_statspool')
+        x = np.random.rand(3, 10, 6).astype('float32')
+        lengths = np.array([10, 4, 7], dtype='int32')
+        y = K.eval(N.StatsPool(axes=1)(X, seq_len=L),
+                   feed_dict={X: x, L: lengths})
+        true = np.stack([np.stack([x[i, :n].mean(0), x[i, :n].std(0)])
+                         for i, n in enumerate(lengths)])
+        self.assertTrue(np.allclose(y, true, atol=1e-6))
+
     def test_pool_depool(self):
         X1 = K.placeholder(shape=(None, 12, 8, 25), name='X1')
         X2 = K.placeholder(shape=(None, 12, 8, 25, 18), name='X2')
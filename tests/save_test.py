@@ -4,10 +4,13 @@
 from __future__ import print_function, division
 
 import os
+import shutil
+import tempfile
 import unittest
 from six.moves import zip, range, cPickle
 
 import numpy as np
+import tensorflow as tf
 
 from odin import backend as K
 from odin import nnet as N
@@ -86,3 +89,98 @@ class SaveTest(unittest.TestCase):
 
         x = np.random.rand(32, 28, 28)
         self.assertEqual(np.sum(f1(x) - f2(x)), 0.)
+
+    def test_variables_snapshot(self):
+        W = K.variable(np.random.rand(8, 12), dtype='float32',
+                       name='W_snapshot', initialize=True)
+        b = K.variable(np.random.rand(12), dtype='float64',
+                       name='b_snapshot', initialize=True)
+        W0, b0 = K.eval([W, b])
+        path = tempfile.mkdtemp()
+        try:
+            # the Saver is cached, no new Ops for every checkpoint
+            K.save_variables([W, b], os.path.join(path, 'vars1'))
+            n_ops = len(W.graph.get_operations())
+            K.save_variables([b, W], os.path.join(path, 'vars1'))
+            self.assertEqual(len(W.graph.get_operations()), n_ops)
+            # snapshot is a copy, not affected by later updates
+            snapshot = K.snapshot_variables([W, b])
+            self.assertEqual(snapshot.nbytes, W0.nbytes + b0.nbytes)
+            K.set_value(W, np.zeros_like(W0))
+            K.set_value(b, np.zeros_like(b0))
+            K.restore_snapshot(snapshot)
+            self.assertTrue(np.all(K.eval(W) == W0))
+            self.assertTrue(np.all(K.eval(b) == b0))
+            # written checkpoint is loadable by restore_variables
+            K.write_snapshot(snapshot, os.path.join(path, 'vars2'))
+            K.set_value(W, np.zeros_like(W0))
+            K.set_value(b, np.zeros_like(b0))
+            K.restore_variables(os.path.join(path, 'vars2'))
+            self.assertTrue(np.all(K.eval(W) == W0))
+            self.assertTrue(np.all(K.eval(b) == b0))
+            # same checkpoint written by save_variables
+            reader1 = tf.train.NewCheckpointReader(os.path.join(path, 'vars1'))
+            reader2 = tf.train.NewCheckpointReader(os.path.join(path, 'vars2'))
+            self.assertEqual(reader1.get_variable_to_shape_map(),
+                             reader2.get_variable_to_shape_map())
+            for name in reader1.get_variable_to_shape_map():
+                self.assertTrue(np.all(reader1.get_tensor(name) ==
+                                       reader2.get_tensor(name)))
+        finally:
+            shutil.rmtree(path)
+
+    def test_mainloop_checkpoint(self):
+        from odin.training.trainer import MainLoop
+        W = K.variable(np.random.rand(8, 12), dtype='float32',
+                       name='W_checkpoint', initialize=True)
+        W0 = K.eval(W)
+        path = tempfile.mkdtemp()
+        try:
+            # ====== asynchronous writing to disk ====== #
+            save_path = os.path.join(path, 'model')
+            loop = MainLoop(verbose=0)
+            loop.set_checkpoint(path=save_path, obj=None, variables=[W],
+                                max_checkpoint=2)
+            loop._save(is_best=True)
+            # the variables are copied when the checkpoint is created
+            K.set_value(W, np.zeros_like(W0))
+            loop._rollback(is_final=True)
+            self.assertTrue(np.all(K.eval(W) == W0))
+            with open(save_path + '.hist', 'rb') as f:
+                self.assertTrue(isinstance(cPickle.load(f), dict))
+            # restore the written checkpoint
+            K.set_value(W, np.zeros_like(W0))
+            N.deserialize(save_path, force_restore_vars=True)
+            self.assertTrue(np.all(K.eval(W) == W0))
+            # only the latest `max_checkpoint` are kept
+            for i in range(4):
+                K.set_value(W, W0 + (i + 1))
+                loop._save(is_best=False)
+            loop._checkpoint_writer.close()
+            self.assertEqual(
+                sorted(i for i in os.listdir(path)
+                       if os.path.isdir(os.path.join(path, i))),
+                ['model', 'model.3', 'model.4'])
+            self.assertFalse(any('.tmp' in i or '.old' in i
+                                 for i in os.listdir(path)))
+            K.set_value(W, np.zeros_like(W0))
+            N.deserialize(save_path + '.4', force_restore_vars=True)
+            self.assertTrue(np.all(K.eval(W) == W0 + 4))
+            # errors of the writing thread are raised on the training thread
+            loop._checkpoint_writer.submit(os.mkdir, save_path)
+            self.assertRaises(RuntimeError, loop._checkpoint_writer.join)
+            # ====== synchronous writing ====== #
+            loop = MainLoop(verbose=0)
+            loop.set_checkpoint(path=os.path.join(path, 'sync'), obj=None,
+                                variables=[W], async_write=False)
+            self.assertTrue(os.path.isdir(os.path.join(path, 'sync.0')))
+            # ====== best checkpoint in RAM ====== #
+            loop = MainLoop(verbose=0)
+            loop.set_checkpoint(path=None, variables=[W])
+            K.set_value(W, W0)
+            loop._save(is_best=True)
+            K.set_value(W, np.zeros_like(W0))
+            loop._rollback(is_final=True)
+            self.assertTrue(np.all(K.eval(W) == W0))
+        finally:
+            shutil.rmtree(path)
@@ -4,7 +4,11 @@
 from __future__ import print_function, division
 
 import os
+import json
+import shutil
+import tempfile
 import unittest
+from multiprocessing import cpu_count
 from six.moves import zip, range, cPickle
 
 import numpy as np
@@ -39,3 +43,428 @@ class SignalTest(unittest.TestCase):
             self.assertTrue(np.allclose(y1, y2))
         except ImportError:
             print("test_stft_istft require librosa.")
+
+    def test_vad_energy_closed_form(self):
+        import warnings
+        from sklearn.mixture import GaussianMixture
+        np.random.seed(5218)
+        energies = [np.concatenate([np.random.randn(np.random.randint(20, 800)) * s + m
+                                    for m, s in ((0, 1), (5, 2), (12, 1.5))])
+                    for _ in range(12)]
+        alpha = signal.__dict__['__current_vad_mode']
+        for e, (vad, threshold) in zip(energies,
+                                       signal.vad_energy_batch(energies, batch_size=5)):
+            # reference: sklearn GaussianMixture with the same initialization
+            x = ((e - e.mean()) / e.std())[:, None]
+            gmm = GaussianMixture(
+                n_components=3, covariance_type='diag', max_iter=25,
+                weights_init=np.ones(3) / 3,
+                means_init=np.array([[-2.], [0.], [2.]]),
+                precisions_init=np.ones((3, 1)))
+            with warnings.catch_warnings():
+                warnings.filterwarnings("ignore")
+                gmm.fit(x)
+            t = gmm.means_.max() - \
+                alpha * np.sqrt(1. / gmm.precisions_[gmm.means_.argmax(), 0])
+            self.assertTrue(np.isclose(threshold, t))
+            self.assertTrue(np.all(vad == (x.ravel() > t)))
+            # single utterance gives the same results
+            vad1, threshold1 = signal.vad_energy(e)
+            self.assertTrue(np.isclose(threshold, threshold1))
+        # degenerated inputs
+        vad, threshold = signal.vad_energy(np.ones(12))
+        self.assertEqual(threshold, 0)
+        self.assertTrue(np.all(vad == 0))
+
+    def test_overlap_add_convolve(self):
+        from odin.preprocessing.speech import _overlap_add_convolve
+        rng = np.random.RandomState(5218)
+        for n, rir_length, n_fft in ((16000, 800, 2048), (100, 800, 2048),
+                                     (5000, 1025, 4096)):
+            x = rng.randn(n)
+            rir = rng.randn(rir_length)
+            H = np.fft.rfft(rir, n=n_fft)
+            y = _overlap_add_convolve(x, H, n_fft, rir_length)
+            self.assertTrue(np.allclose(y, np.convolve(x, rir)))
+
+    def test_audio_augmentor(self):
+        from odin.fuel import MmapData
+        from odin.preprocessing.speech import (_augment_category,
+            _write_augment_index, _read_augment_index)
+        # categories are relative to the corpus root
+        root = os.path.join('/data', 'noise', 'musan')
+        self.assertEqual(_augment_category(
+            os.path.join(root, 'music', 'a.wav'), root, 'musan'), 'music')
+        self.assertEqual(_augment_category(
+            os.path.join(root, 'README.wav'), root, 'musan'), None)
+        root = os.path.join('/data', 'speech', 'RIRS_NOISES')
+        for path, category in (
+                (('simulated_rirs', 'smallroom', 'Room001-00001.wav'), 'rir'),
+                (('pointsource_noises', 'noise-free-sound-0001.wav'), 'noise'),
+                (('real_rirs_isotropic_noises',
+                  'RVB2014_type1_noise_largeroom1_1.wav'), 'noise')):
+            self.assertEqual(_augment_category(
+                os.path.join(root, *path), root, 'rirs'), category)
+        # packed bank with file names contain spaces
+        path = tempfile.mkdtemp()
+        try:
+            rng = np.random.RandomState(5218)
+            files = [('rir 1', 'rir', 400), ('rir 2', 'rir', 600),
+                     ('noise 1', 'noise', 8000), ('music 1', 'music', 20000)] + \
+                [('speech %d' % i, 'speech', 3000 + i * 1000)
+                 for i in range(8)]
+            index = []
+            start = 0
+            for name, category, length in files:
+                index.append((name, category, start, start + length))
+                start += length
+            data = MmapData(os.path.join(path, 'raw'), dtype='float32',
+                            shape=(start,), read_only=False)
+            data[:] = rng.randn(start).astype('float32')
+            data.flush()
+            data.close()
+            _write_augment_index(os.path.join(path, 'index.csv'), index)
+            self.assertEqual(
+                sorted((name, category, start, end)
+                       for category, files in _read_augment_index(
+                           os.path.join(path, 'index.csv')).items()
+                       for name, start, end in files),
+                sorted(index))
+            # same name (crc32 seed) gives the same augmentation
+            raw = rng.randn(12000).astype('float32')
+            outputs = []
+            for name in ('utt1', 'utt1', 'utt2'):
+                augmentor = speech.AudioAugmentor(bank_path=path, sr=8000,
+                                                  fft_size=1024)
+                outputs.append(augmentor.transform(
+                    {'raw': raw, 'sr': 8000, 'name': name}))
+            for t in ('reverb', 'noise', 'music', 'babble'):
+                y1, y2, y3 = [o['raw_%s' % t] for o in outputs]
+                self.assertEqual(y1.shape, raw.shape)
+                self.assertTrue(np.all(y1 == y2))
+            self.assertEqual(outputs[0]['raw_info'], outputs[1]['raw_info'])
+            self.assertNotEqual(outputs[0]['raw_info'], outputs[2]['raw_info'])
+        finally:
+            shutil.rmtree(path)
+
+    def test_bnf_extractor_cpu(self):
+        from odin.nnet.models.bnf import _BNFbase
+
+        class TestBNF(_BNFbase):
+            nb_layers = 3
+            params = {}
+
+            @classmethod
+            def load_parameters(clazz):
+                return clazz.params
+
+        def apply_dnn(X, params):
+            # reference per-utterance implementation, float64 inputs
+            # with the weights stored as float32
+            X = X.T
+            for i in range(TestBNF.nb_layers):
+                X = params['w%d' % i].dot(X) + params['b%d' % i]
+                if i < TestBNF.nb_layers - 1:
+                    np.maximum(X, 0, out=X)
+                    X_rms = np.sqrt(np.sum(X * X, axis=0, keepdims=True)) / \
+                        np.sqrt(X.shape[0])
+                    X_rms[X_rms == 0] = 1.
+                    X = X / X_rms
+            return X.T
+
+        rng = np.random.RandomState(5218)
+        feats = []
+        for n in (80, 3, 250, 1):
+            sad = rng.rand(n) > 0.3
+            sad[0] = True
+            feats.append({'mfcc': rng.randn(n, 4),
+                          'sad': sad.astype('uint8')})
+        for seed in (1, 2): # same shapes, different weights
+            rng = np.random.RandomState(seed)
+            TestBNF.params = {
+                'w0': rng.randn(16, 20).astype('float32'),
+                'b0': rng.randn(16, 1).astype('float32'),
+                'w1': rng.randn(16, 16).astype('float32'),
+                'b1': rng.randn(16, 1).astype('float32'),
+                'w2': rng.randn(5, 16).astype('float32'),
+                'b2': rng.randn(5, 1).astype('float32')}
+            bnf = speech.BNFExtractorCPU(input_name='mfcc', network=TestBNF,
+                                         sad_name='sad', stack_context=2,
+                                         batch_size=64)
+            bnf = cPickle.loads(cPickle.dumps(bnf))
+            outputs = bnf.transform_batch(feats)
+            for f, y in zip(feats, outputs):
+                y_ref = apply_dnn(bnf._get_input(f), TestBNF.params)
+                # same dtype as the previous (float64) implementation
+                self.assertEqual(y.dtype, y_ref.dtype)
+                self.assertEqual(y.dtype, np.float64)
+                self.assertEqual(y.shape, (f['sad'].sum(), 5))
+                self.assertTrue(np.allclose(y, y_ref, rtol=1e-4, atol=1e-4))
+                self.assertTrue(np.allclose(bnf.transform(f)['bnf'], y))
+
+    def test_read_segment(self):
+        path = tempfile.mkdtemp()
+        try:
+            rand = np.random.RandomState(5218)
+            pcm = os.path.join(path, 'utt.pcm')
+            (rand.randn(16000 * 3) * 3000).astype('int16').tofile(pcm)
+            full, sr = speech.read(pcm)
+            self.assertTrue(sr is None)
+            for start, end in [(0.5, 1.75), (None, 1.), (2.25, None),
+                               (2.5, 10.), (0., 3.)]:
+                s = 0 if start is None else int(round(start * 16000))
+                e = None if end is None else int(round(end * 16000))
+                seg, _ = speech.read(pcm, start=start, end=end, sr=16000)
+                self.assertTrue(np.all(np.asarray(seg) == full[s:e]))
+            # sample rate of raw pcm is required to locate the segment
+            self.assertRaises(ValueError, speech.read, pcm, start=0.5)
+            # ulaw encoded pcm carries its own sample rate
+            ulaw = os.path.join(path, 'utt_ulaw.pcm')
+            rand.randint(-128, 128, size=8000 * 2).astype('int8').tofile(ulaw)
+            full, sr = speech.read(ulaw, encode='ulaw')
+            seg, sr_seg = speech.read(ulaw, encode='ulaw', start=0.25, end=1.)
+            self.assertEqual(sr_seg, 8000)
+            self.assertTrue(np.all(np.asarray(seg) == full[2000:8000]))
+            # soundfile formats seek to the segment
+            try:
+                import soundfile
+            except ImportError:
+                return
+            wav = os.path.join(path, 'utt.wav')
+            soundfile.write(wav, np.asarray(full, 'int16'), 8000,
+                            subtype='PCM_16')
+            full, sr = speech.read(wav)
+            seg, sr_seg = speech.read(wav, start=0.25, end=1.)
+            self.assertEqual(sr_seg, sr)
+            self.assertTrue(np.all(seg == full[2000:8000]))
+        finally:
+            shutil.rmtree(path)
+
+    def test_audio_reader_segment(self):
+        path = tempfile.mkdtemp()
+        try:
+            rand = np.random.RandomState(5218)
+            pcm = os.path.join(path, 'utt.pcm')
+            (rand.randn(16000 * 3) * 3000).astype('int16').tofile(pcm)
+            reader = speech.AudioReader(sr=16000, remove_dc=False)
+            full = reader.transform(pcm)['raw']
+            seg = reader.transform((pcm, 0.5, 1.75))
+            self.assertEqual(seg['name'], '%s:0.5:1.75' % pcm)
+            self.assertEqual(seg['sr'], 16000)
+            self.assertAlmostEqual(seg['duration'], 1.25)
+            self.assertTrue(np.all(seg['raw'] == full[8000:28000]))
+            seg = reader.transform({'path': pcm, 'start': 1., 'end': 2.,
+                                    'name': 'utt_1'})
+            self.assertEqual(seg['name'], 'utt_1')
+            self.assertTrue(np.all(seg['raw'] == full[16000:32000]))
+            self.assertRaises(ValueError, reader.transform, (pcm, 0.5))
+            # DC removal only uses the segment
+            reader = speech.AudioReader(sr=16000, remove_dc=True)
+            seg = reader.transform((pcm, 0.5, 1.75))['raw']
+            ref = full[8000:28000]
+            self.assertTrue(np.allclose(seg, ref - ref.mean(), atol=1e-2))
+        finally:
+            shutil.rmtree(path)
+
+    def test_audio_reader_segment_resample(self):
+        try:
+            import resampy
+        except ImportError:
+            self.skipTest("resampy is not installed")
+        path = tempfile.mkdtemp()
+        try:
+            rand = np.random.RandomState(5218)
+            pcm = os.path.join(path, 'utt.pcm')
+            (rand.randn(16000 * 3) * 3000).astype('int16').tofile(pcm)
+            reader = speech.AudioReader(sr=16000, sr_new=8000,
+                                        remove_dc=False)
+            full = reader.transform(pcm)['raw']
+            seg = reader.transform((pcm, 0.5, 1.75))['raw']
+            ref = full[4000:14000]
+            self.assertEqual(seg.shape, ref.shape)
+            # the context frames make the edges match the full resampling
+            self.assertTrue(np.allclose(seg, ref, rtol=1e-3,
+                                        atol=1e-3 * np.abs(ref).max()))
+        finally:
+            shutil.rmtree(path)
+
+    def test_pipeline_liveness(self):
+        from odin.preprocessing import make_pipeline, set_extractor_liveness
+        from odin.preprocessing.base import Extractor, DeltaExtractor
+
+        class Peek(Extractor):
+            """ Unknown dependencies, could read any feature """
+
+            def _transform(self, feat):
+                return {'n_features': len(feat)}
+
+        def steps(*extra):
+            return [speech.AudioReader(sr=16000, remove_dc=False),
+                    speech.STFTExtractor(frame_length=0.025,
+                                         step_length=0.01),
+                    speech.PowerSpecExtractor(),
+                    speech.Power2Db(input_name='spec', output_name='db')] + \
+                list(extra) + [DeltaExtractor(input_name='db', order=(0, 1))]
+        x = np.random.RandomState(5218).randn(16000).astype('float32')
+        inputs = lambda: {'raw': x, 'sr': 16000}
+        # all features are carried to the end without output_features
+        ref = make_pipeline(steps()).transform(inputs())
+        self.assertEqual(
+            sorted(ref.keys()),
+            ['db', 'duration', 'raw', 'spec', 'sr', 'stft', 'stft_energy'])
+        # only the requested arrays survive, non-array values are kept
+        pipe = make_pipeline(steps(), output_features=('db', 'stft_energy'))
+        y = pipe.transform(inputs())
+        self.assertEqual(sorted(y.keys()),
+                         ['db', 'duration', 'sr', 'stft_energy'])
+        for name in ('db', 'stft_energy'):
+            self.assertTrue(np.all(y[name] == ref[name]))
+        # each intermediate is dropped right after its last reader
+        feat = inputs()
+        alive = []
+        for _, e in pipe.steps:
+            feat = e.transform(feat)
+            alive.append(sorted(k for k, v in feat.items()
+                                if isinstance(v, np.ndarray)))
+        self.assertEqual(alive, [['raw'], ['stft', 'stft_energy'],
+                                 ['spec', 'stft_energy'],
+                                 ['db', 'stft_energy'],
+                                 ['db', 'stft_energy']])
+        # an extractor with unknown dependencies keeps everything before it
+        y = make_pipeline(steps(Peek()),
+                          output_features='db').transform(inputs())
+        self.assertEqual(y['n_features'], len(ref))
+        self.assertEqual(sorted(k for k, v in y.items()
+                                if isinstance(v, np.ndarray)), ['db'])
+        # removing the liveness information
+        set_extractor_liveness(pipe, output_features=None)
+        self.assertEqual(sorted(pipe.transform(inputs()).keys()),
+                         sorted(ref.keys()))
+
+    @unittest.skipIf(cpu_count() < 2, "MPI needs more than one CPU")
+    def test_feature_processor_profile(self):
+        from odin.preprocessing import make_pipeline, FeatureProcessor
+        rand = np.random.RandomState(5218)
+        jobs = [{'raw': rand.randn(8000 + i * 160).astype('float32'),
+                 'sr': 16000, 'name': 'utt%d' % i}
+                for i in range(6)]
+        pipe = make_pipeline([
+            speech.AudioReader(sr=16000, remove_dc=False),
+            speech.STFTExtractor(frame_length=0.025, step_length=0.01),
+            speech.PowerSpecExtractor()])
+        path = tempfile.mkdtemp()
+        try:
+            # ====== profile enabled ====== #
+            processor = FeatureProcessor(
+                jobs, path=os.path.join(path, 'ds'), extractor=pipe,
+                ncpu=2, log_path=os.path.join(path, 'log.txt'))
+            processor.run()
+            report = processor.profile_report
+            self.assertEqual(
+                sorted(report.keys()),
+                ['extractors', 'files_per_sec', 'n_files', 'ncpu',
+                 'parent', 'total_time'])
+            self.assertEqual(report['n_files'], len(jobs))
+            self.assertEqual(sorted(report['parent'].keys()),
+                             ['finalize', 'queue_wait', 'write'])
+            self.assertEqual([e['name'] for e in report['extractors']],
+                             [name for name, _ in pipe.steps])
+            # output bytes accumulated over all calls of each step
+            feat = [{} for _ in jobs]
+            for e in report['extractors']:
+                self.assertEqual(
+                    sorted(e.keys()),
+                    ['avg_bytes', 'avg_time', 'bytes', 'calls', 'class',
+                     'name', 'time', 'time_percent'])
+                self.assertEqual(e['calls'], len(jobs))
+                step = dict(pipe.steps)[e['name']]
+                self.assertEqual(e['class'], step.__class__.__name__)
+                feat = [step.transform(dict(j) if i == {} else i)
+                        for i, j in zip(feat, jobs)]
+                self.assertEqual(
+                    e['bytes'], sum(v.nbytes for f in feat
+                                    for v in f.values()
+                                    if isinstance(v, np.ndarray)))
+            self.assertAlmostEqual(
+                sum(e['time_percent'] for e in report['extractors']), 100.)
+            # saved next to the config, and written to the log
+            ds_path = os.path.join(path, 'ds')
+            with open(os.path.join(ds_path, 'profile.json'), 'r') as f:
+                self.assertEqual(json.load(f), json.loads(json.dumps(report)))
+            with open(processor._log_path, 'r') as f:
+                self.assertTrue('Profile' in f.read())
+            ds = F.Dataset(ds_path, read_only=True)
+            self.assertTrue('spec' in ds)
+            ds.close()
+            # ====== profile disabled ====== #
+            processor = FeatureProcessor(
+                jobs, path=os.path.join(path, 'ds_noprof'), extractor=pipe,
+                ncpu=2, log_path=os.path.join(path, 'log_noprof.txt'),
+                profile=False)
+            processor.run()
+            self.assertEqual(processor.profile_report, {})
+            self.assertFalse(os.path.exists(
+                os.path.join(path, 'ds_noprof', 'profile.json')))
+        finally:
+            shutil.rmtree(path)
+
+    def test_group_segment_jobs(self):
+        from odin.preprocessing.processor import _group_segment_jobs
+        jobs = [('a.sph', 0., 1.), 'b.wav', ('c.sph', 0., 1., 'c_0'),
+                {'path': 'a.sph', 'start': 1., 'end': 2.},
+                ('c.sph', 1., 2., 'c_1'), {'path': 'b.wav'},
+                ('a.sph', 2., 3.)]
+        self.assertEqual(
+            _group_segment_jobs(jobs),
+            [[jobs[0], jobs[3], jobs[6]], [jobs[1]], [jobs[2], jobs[4]],
+             [jobs[5]]])
+
+    @unittest.skipIf(cpu_count() < 2, "MPI needs more than one CPU")
+    def test_feature_processor_segment_decoding(self):
+        try: # the external decoder is only used if soundfile fails
+            import soundfile
+        except ImportError:
+            return
+        from odin.preprocessing import FeatureProcessor
+        path = tempfile.mkdtemp()
+        log = os.path.join(path, 'decoded.txt')
+        rand = np.random.RandomState(5218)
+        audio = {}
+        for i in range(4):
+            f = os.path.join(path, 'utt%d.mp3' % i)
+            with open(f, 'wb') as fout: # not readable by soundfile
+                fout.write(b'\x00' * 128)
+            audio[f] = (rand.randn(8000 * 2) * 3000).astype('int16')
+
+        def anything2wav(inpath, outpath=None, codec=None, return_data=False):
+            with open(log, 'a') as f:
+                f.write(inpath + '\n')
+            return audio[inpath], 8000
+        anything2wav_ = speech.anything2wav
+        speech.anything2wav = anything2wav
+        try:
+            # the segments of each file are interleaved, more files than
+            # the number of decoded files cached by each process
+            jobs = [(f, start, start + 0.5)
+                    for start in (0., 0.5, 1., 1.5)
+                    for f in sorted(audio.keys())]
+            processor = FeatureProcessor(
+                jobs, path=os.path.join(path, 'ds'),
+                extractor=speech.AudioReader(remove_dc=False),
+                ncpu=2, log_path=os.path.join(path, 'log.txt'))
+            processor.run()
+            # each file is decoded once
+            with open(log, 'r') as f:
+                decoded = f.read().split()
+            self.assertEqual(sorted(decoded), sorted(audio.keys()))
+            ds = F.Dataset(os.path.join(path, 'ds'), read_only=True)
+            for f, start, end in jobs:
+                name = '%s:%s:%s' % (f, start, end)
+                s, e = ds['indices_raw'][name]
+                self.assertTrue(np.allclose(
+                    ds['raw'][s:e],
+                    audio[f][int(start * 8000):int(end * 8000)]))
+            ds.close()
+        finally:
+            speech.anything2wav = anything2wav_
+            shutil.rmtree(path)
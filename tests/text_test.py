@@ -0,0 +1,96 @@
+# ======================================================================
+# Author: TrungNT
+# ======================================================================
+from __future__ import print_function, division
+
+import unittest
+from collections import Counter
+from six.moves import zip, range
+
+import numpy as np
+
+from odin.preprocessing.text import Tokenizer
+
+
+def _random_documents(nb_docs, seed):
+    rng = np.random.RandomState(seed)
+    words = ['w%d' % i for i in range(120)]
+    # zipf-like word distribution
+    p = 1. / np.arange(1, len(words) + 1)
+    p /= p.sum()
+    return [' '.join(rng.choice(words, size=rng.randint(1, 40), p=p))
+            for _ in range(nb_docs)]
+
+
+def _dense_bow(tokenizer, seqs, mode):
+    """ Reference implementation: fill the dense matrix row by row """
+    X = np.zeros(shape=(len(seqs), tokenizer.nb_words))
+    for i, seq in enumerate(seqs):
+        count = Counter(seq)
+        for tok, n in count.items():
+            if mode == 'binary':
+                X[i, tok] = 1
+            elif mode == 'count':
+                X[i, tok] = n
+            elif mode == 'freq':
+                X[i, tok] = n / float(len(seq))
+            elif mode == 'tfidf':
+                docs_freq = tokenizer._word_dictionary_info.get(
+                    tok, (0, 0))[-1]
+                X[i, tok] = (1 + np.log(n)) * \
+                    np.log(1 + tokenizer.nb_docs / (1 + docs_freq))
+    return X
+
+
+class TextTest(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_tokenizer_map_reduce(self):
+        docs = _random_documents(nb_docs=500, seed=5218)
+        tokenizers = [Tokenizer(stopwords=True, map_reduce=map_reduce,
+                                batch_size=32, nb_processors=2,
+                                print_progress=False).fit(docs)
+                      for map_reduce in (True, False)]
+        t1, t2 = tokenizers
+        self.assertEqual(list(t1.dictionary.items()),
+                         list(t2.dictionary.items()))
+        self.assertEqual(dict(t1._word_counts), dict(t2._word_counts))
+        self.assertEqual(dict(t1._word_docs), dict(t2._word_docs))
+        self.assertEqual(t1.nb_docs, t2.nb_docs)
+        self.assertEqual(t1.longest_document_length,
+                         t2.longest_document_length)
+
+
+    def test_tokenizer_transform_sparse(self):
+        from scipy import sparse
+        docs = _random_documents(nb_docs=300, seed=5218)
+        tokenizer = Tokenizer(nb_words=80, stopwords=True, batch_size=32,
+                              nb_processors=2, print_progress=False)
+        tokenizer.fit(docs[:200])
+        seqs = [[tok for tok in seq if tok > 0] for seq in
+                tokenizer.transform(docs, mode='seq', padding='post',
+                                    maxlen=40)]
+        for mode in ('binary', 'count', 'freq', 'tfidf'):
+            X = tokenizer.transform(docs, mode=mode, matrix_dtype='float32')
+            X_sparse = tokenizer.transform(docs, mode=mode, sparse_output=True,
+                                           matrix_dtype='float32')
+            blocks = list(tokenizer.transform_sparse(
+                docs, mode=mode, chunk_size=64, matrix_dtype='float32'))
+            self.assertEqual(len(blocks), 5)
+            self.assertTrue(all(sparse.isspmatrix_csr(b) for b in blocks))
+            X_blocks = sparse.vstack(blocks).toarray()
+            self.assertEqual(X.shape, (300, tokenizer.nb_words))
+            self.assertEqual(X_blocks.dtype, X.dtype)
+            self.assertTrue(np.allclose(X, _dense_bow(tokenizer, seqs, mode)))
+            self.assertTrue(np.allclose(X_blocks, X))
+            self.assertTrue(np.allclose(X_sparse.toarray(), X))
+        self.assertRaises(ValueError, lambda: list(
+            tokenizer.transform_sparse(docs, mode='seq')))
+
+if __name__ == '__main__':
+    print(' odin.tests.run() to run these tests ')
@@ -3,13 +3,21 @@
 # ======================================================================
 from __future__ import print_function, division
 
+import os
+import sys
+import json
 import unittest
+import subprocess
+from six import StringIO
+from six.moves import cPickle
 
 import numpy as np
 
+import odin
 from odin.utils.mpi import MPI
 from odin.utils import batching
-from odin.utils import async, async_mpi, UnitTimer
+from odin.utils import async, async_mpi, UnitTimer, Progbar
+from odin import maths
 
 
 class UtilsTest(unittest.TestCase):
@@ -64,5 +72,174 @@ class UtilsTest(unittest.TestCase):
         sorted(Y, key=lambda x: x[0])
     )))
 
+  def test_edit_distance_batch(self):
+    rng = np.random.RandomState(5218)
+    y_true = [rng.randint(0, 8, size=rng.randint(1, 25)) for _ in range(300)]
+    y_pred = [rng.randint(0, 8, size=rng.randint(0, 25)) for _ in range(300)]
+    reference = [maths._LevenshteinDistance(list(i), list(j))
+                 for i, j in zip(y_true, y_pred)]
+    strings = ['kitten', 'sitting', '', 'flaw', 'lawn']
+    batch, compiled = maths._levenshtein_batch, maths._levenshtein_compiled
+    try:
+      for implementation, is_compiled in ((batch, compiled),
+                                          (maths._levenshtein_numpy, False)):
+        maths._levenshtein_batch = implementation
+        maths._levenshtein_compiled = is_compiled
+        distances = maths.edit_distance_batch(y_true, y_pred, batch_size=64)
+        self.assertEqual(distances.tolist(), reference)
+        # padded labels and lengths
+        true_padded, true_length = maths._pad_labels(y_true, None)
+        pred_padded, pred_length = maths._pad_labels(y_pred, None)
+        distances = maths.edit_distance_batch(true_padded, pred_padded,
+                                              true_length, pred_length)
+        self.assertEqual(distances.tolist(), reference)
+        # characters
+        distances = maths.edit_distance_batch(strings, strings[::-1])
+        self.assertEqual(distances.tolist(),
+                         [maths._LevenshteinDistance(i, j)
+                          for i, j in zip(strings, strings[::-1])])
+        # empty inputs
+        distances = maths.edit_distance_batch([], [])
+        self.assertEqual(distances.shape, (0,))
+        self.assertEqual(distances.dtype, np.int64)
+    finally:
+      maths._levenshtein_batch = batch
+      maths._levenshtein_compiled = compiled
+    self.assertTrue(np.allclose(
+        maths.LER(y_true, y_pred, return_mean=False),
+        [d / len(i) for d, i in zip(reference, y_true)]))
+
+  def test_progbar_streaming_history(self):
+    rng = np.random.RandomState(5218)
+    losses = rng.rand(2, 40)
+    cm = rng.randint(0, 20, size=(2, 40, 5, 5))
+    prog = Progbar(target=40, print_progress=False, print_report=False)
+    prog.set_reducer('p', 'reservoir')
+    prog.set_summarizer('last', fn=lambda x: x[-1])
+    for epoch in range(2):
+      for i in range(40):
+        prog['loss'] = losses[epoch, i]
+        prog['p'] = losses[epoch, i]
+        prog['confusionmatrix'] = cm[epoch, i]
+        prog['last'] = i
+        prog.add(1)
+      summary = prog._epoch_summary[epoch]
+      self.assertTrue(np.allclose(summary['loss'], np.mean(losses[epoch])))
+      self.assertTrue(np.allclose(prog.get_reducer('loss', epoch).var,
+                                  np.var(losses[epoch])))
+      self.assertTrue(np.allclose(summary['p'],
+                                  np.percentile(losses[epoch], (5, 50, 95))))
+      self.assertTrue(np.all(summary['confusionmatrix'] == cm[epoch].sum(0)))
+      self.assertEqual(summary['last'], 39)
+    # only the summarized key is fully retained
+    self.assertEqual(sorted(prog.history[0].keys()), ['last'])
+    self.assertEqual(prog.history[1]['last'], list(range(40)))
+    # full retention for all keys
+    prog = Progbar(target=40, print_progress=False, print_report=False,
+                   keep_history=True)
+    for i in range(40):
+      prog['loss'] = losses[0, i]
+      prog.add(1)
+    self.assertEqual(prog.history[0]['loss'], losses[0].tolist())
+    self.assertTrue(np.allclose(prog._epoch_summary[0]['loss'],
+                                np.mean(losses[0])))
+
+  def test_task_history_keys(self):
+    import tensorflow as tf
+    from odin import backend as K
+    from odin.training.trainer import Task
+    from odin.training.callbacks import (CallbackList, EarlyStopPatience,
+                                         EpochSummary, Debug, LambdaCallback,
+                                         NaNDetector, TaskSignal)
+    x = K.placeholder(shape=(None, 4), name='x_task_history')
+    cost = tf.identity(tf.reduce_mean(x), name='cost_task_history')
+    cm = tf.identity(tf.matmul(tf.transpose(x), x), name='cm_task_history')
+    f = K.function(x, [cost, cm])
+    X = np.random.RandomState(5218).rand(64, 4).astype('float32')
+    # the callbacks declare the outputs they read
+    early_stop = EarlyStopPatience('Train', cost, threshold=5)
+    self.assertEqual(early_stop.history_keys, (cost.name,))
+    self.assertEqual(NaNDetector().history_keys, ())
+    self.assertEqual(
+        CallbackList([early_stop, EpochSummary('Train', [cost, cm])]
+                     ).history_keys, tuple(sorted([cost.name, cm.name])))
+    self.assertTrue(CallbackList([early_stop, Debug()]).history_keys is None)
+    self.assertTrue(LambdaCallback(lambda t, r: None, 'Train').history_keys
+                    is None)
+    self.assertEqual(LambdaCallback(lambda t: None, 'Train').history_keys, ())
+    # only the outputs read by the callbacks keep every batch value
+    task = Task(f, X, epoch=2, batch_size=8, callbacks=[early_stop],
+                name='Train', verbose=0)
+    for _ in task:
+      pass
+    for epoch in range(2):
+      self.assertEqual(sorted(task.history[epoch].keys()), [cost.name])
+      self.assertEqual(len(task.history[epoch][cost.name]), 8)
+      self.assertTrue(np.allclose(task.progbar.get_report(epoch, cm.name),
+                                  np.dot(X.T, X), rtol=1e-4))
+    # unknown dependencies, everything is kept
+    task.set_callbacks([early_stop, Debug()])
+    self.assertTrue(task.progbar._keep_history)
+    task.set_callbacks([early_stop])
+    self.assertFalse(task.progbar._keep_history)
+
+  def test_progbar_renderer(self):
+    fp = Progbar.FP
+    try:
+      # non-TTY output: single-line records every 10 percent
+      Progbar.FP = StringIO()
+      prog = Progbar(target=1000, print_report=True, name='log',
+                     interval=0.)
+      for i in range(1000):
+        prog['loss'] = i
+        prog.add(1)
+      log = Progbar.FP.getvalue()
+      self.assertNotIn('\r', log)
+      lines = log.strip().split('\n')
+      self.assertEqual(len(lines), 10)
+      self.assertTrue(all(l.startswith('[log] Epoch 0') for l in lines))
+      self.assertIn('loss: 999', lines[-1])
+      # background rendering
+      Progbar.FP = StringIO()
+      prog = Progbar(target=1000, print_report=True, tty=True,
+                     background=True, interval=0.01)
+      for epoch in range(2):
+        for i in range(1000):
+          prog['loss'] = i
+          prog.add(1)
+        self.assertTrue(prog._renderer is None)
+        self.assertEqual(prog._epoch_summary[epoch]['loss'], 499.5)
+      self.assertEqual(prog.nb_epoch, 3)
+      prog = cPickle.loads(cPickle.dumps(prog))
+      self.assertEqual(prog._epoch_summary[1]['loss'], 499.5)
+    finally:
+      Progbar.FP = fp
+
+  def test_config_gpu_visibility(self):
+    code = """
+import os, json
+from odin import config
+config._query_gpu_info = lambda: dict(ngpu=%d, dev0=['gpu', None, None])
+config.auto_config()
+visible = [os.environ.get('CUDA_VISIBLE_DEVICES')]
+config.get_ngpu()
+visible.append(os.environ.get('CUDA_VISIBLE_DEVICES'))
+print(json.dumps(visible))
+"""
+    for flags, found, visible in (('gpu=1', 1, [None, None]),
+                                  ('gpu=1', 0, [None, '']),
+                                  ('gpu=0', 1, ['', ''])):
+      env = dict(os.environ)
+      env.pop('CUDA_VISIBLE_DEVICES', None)
+      env['ODIN'] = flags
+      # run next to the `odin` package, other tests may change the cwd
+      output = subprocess.check_output(
+          [sys.executable, '-c', code % found], env=env,
+          cwd=os.path.dirname(os.path.dirname(os.path.abspath(
+              odin.__file__))),
+          stderr=subprocess.DEVNULL)
+      output = output.decode('utf-8').strip().split('\n')[-1]
+      self.assertEqual(json.loads(output), visible)
+
 if __name__ == '__main__':
   print(' odin.tests.run() to run these tests ')